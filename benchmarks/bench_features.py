@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+from indicators import Indicators
+from feature_engine import FEATURES, compute_features, prepare_features
+
+
+def legacy_prepare_features(df):
+    # Column-by-column pandas path that MLModelManager.prepare_features used before feature_engine
+    df['return'] = df['close'].pct_change()
+    df['ma_fast'] = df['close'].rolling(9).mean()
+    df['ma_slow'] = df['close'].rolling(21).mean()
+    df['rsi'] = Indicators.compute_rsi(df['close'])
+    df['atr'] = Indicators.compute_atr(df)
+    df['macd'], df['macd_signal'] = Indicators.compute_macd(df['close'])
+    df['volatility'] = df['high'] - df['low']
+    df['spread'] = df['open'] - df['close'].shift(1)
+    df.dropna(inplace=True)
+    df['target'] = (df['close'].shift(-1) > df['close']).astype(int)
+    return df
+
+
+def synthetic_bars(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 5e-4, n))
+    open_ = np.r_[close[0], close[:-1]] + rng.normal(0, 1e-4, n)
+    high = np.maximum(open_, close) + rng.uniform(0, 5e-4, n)
+    low = np.minimum(open_, close) - rng.uniform(0, 5e-4, n)
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close})
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    for n in (2_000, 200_000):
+        df = synthetic_bars(n)
+        repeat = 20 if n <= 10_000 else 3
+
+        expected = legacy_prepare_features(df.copy())
+        actual = prepare_features(df)
+        assert np.allclose(expected[FEATURES].to_numpy(), actual[FEATURES].to_numpy(), rtol=1e-9, atol=1e-12)
+
+        legacy = best_of(lambda: legacy_prepare_features(df.copy()), repeat)
+        wrapper = best_of(lambda: prepare_features(df), repeat)
+        arrays = [df[col].to_numpy() for col in ('open', 'high', 'low', 'close')]
+        out = np.empty((n, len(FEATURES)))
+        engine = best_of(lambda: compute_features(*arrays, out=out), repeat)
+        print(f"{n:>8} bars  legacy pandas {legacy * 1e3:9.2f} ms  "
+              f"prepare_features {wrapper * 1e3:9.2f} ms ({legacy / wrapper:5.1f}x)  "
+              f"compute_features {engine * 1e3:9.2f} ms ({legacy / engine:5.1f}x)")
+
+    symbols = 50
+    stacked = [np.stack([synthetic_bars(2_000, seed)[col].to_numpy() for seed in range(symbols)])
+               for col in ('open', 'high', 'low', 'close')]
+    batch = best_of(lambda: compute_features(*stacked), 10)
+    print(f"{symbols} symbols x 2000 bars stacked: {batch * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
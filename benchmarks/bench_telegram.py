@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import threading
+import requests
+import numpy as np
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+from fake_telegram import FakeTelegram
+import telegram_notifier
+from telegram_notifier import TelegramNotifier
+
+# Round-trip command latency (user message -> bot reply) against a local fake Bot API
+
+
+class SlowManager:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def positions_get(self):
+        time.sleep(self.delay)
+        return ()
+
+
+def fake_bot(positions_delay=0.0):
+    return SimpleNamespace(trading_enabled=True, current_risk=0.01, mt5_manager=SlowManager(positions_delay))
+
+
+CHAT_ID = 1
+
+
+def round_trip(fake, text, expect, chat_id=CHAT_ID):
+    start = len(fake.messages)
+    sent = time.monotonic()
+    fake.push(text, chat_id)
+    reply = fake.wait_for_message(lambda m: expect in m['text'], start)
+    return reply['time'] - sent if reply else float('nan')
+
+
+def legacy_listener(notifier, api_url):
+    # The previous listener: short getUpdates requests every 3 s, commands handled inline
+    while True:
+        try:
+            response = requests.get(f"{api_url}/getUpdates?offset={notifier.last_update_id + 1}", timeout=10)
+            for update in response.json().get('result', []):
+                notifier.last_update_id = update['update_id']
+                notifier.process_command(update['message'])
+        except Exception:
+            pass
+        time.sleep(3)
+
+
+def report(label, samples):
+    samples = np.array(samples) * 1000
+    print(f"{label:<34} n={len(samples):<3} p50 {np.median(samples):8.1f} ms  "
+          f"p95 {np.percentile(samples, 95):8.1f} ms  max {samples.max():8.1f} ms")
+
+
+def main():
+    # /pause only answers the configured chat; switch off its one-message-per-second pacing so
+    # that does not show up as command latency
+    telegram_notifier.TELEGRAM_CHAT_INTERVAL = 0
+    fake = FakeTelegram().start()
+    notifier = TelegramNotifier('TOKEN', CHAT_ID, fake_bot(positions_delay=2.0), api_url=fake.url)
+    time.sleep(0.2)
+
+    report("long poll: /pause", [round_trip(fake, '/pause', 'PAUSED') for _ in range(50)])
+
+    # A slow command must not hold up /pause
+    samples = []
+    for _ in range(5):
+        fake.push('/positions', CHAT_ID)
+        time.sleep(0.05)
+        samples.append(round_trip(fake, '/pause', 'PAUSED'))
+    report("long poll: /pause behind /positions", samples)
+
+    legacy_fake = FakeTelegram().start()
+    legacy = TelegramNotifier('TOKEN', CHAT_ID, api_url=legacy_fake.url)
+    legacy.bot_instance = fake_bot()
+    threading.Thread(target=legacy_listener, args=(legacy, legacy.api_url), daemon=True).start()
+    time.sleep(0.2)
+    samples = []
+    for _ in range(8):
+        # Arrive at a random point in the poll interval, like a real user
+        time.sleep(np.random.uniform(0, 3))
+        samples.append(round_trip(legacy_fake, '/pause', 'PAUSED'))
+    report("legacy 3 s polling: /pause", samples)
+
+    fake.stop()
+    legacy_fake.stop()
+
+
+if __name__ == '__main__':
+    main()
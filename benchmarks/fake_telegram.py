@@ -0,0 +1,112 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeTelegram:
+    # Local stand-in for the Bot API: getUpdates (with long polling) and sendMessage.
+    # Point TelegramNotifier at it with api_url=fake.url (or TELEGRAM_API_URL).
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.latency = latency
+        self.updates = []
+        self.messages = []
+        self.cond = threading.Condition()
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def push(self, text, chat_id=1):
+        # Queue an incoming user message; returns its update_id
+        with self.cond:
+            update_id = len(self.updates) + 1
+            self.updates.append({'update_id': update_id,
+                                 'message': {'message_id': update_id, 'text': text, 'chat': {'id': chat_id},
+                                             'date': int(time.time())}})
+            self.cond.notify_all()
+            return update_id
+
+    def wait_for_message(self, predicate, start=0, timeout=10):
+        # First sent message at index >= start matching predicate(message); None on timeout
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                for message in self.messages[start:]:
+                    if predicate(message):
+                        return message
+                start = len(self.messages)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def get_updates(self, offset, timeout):
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                pending = [u for u in self.updates if u['update_id'] >= offset]
+                remaining = deadline - time.monotonic()
+                if pending or remaining <= 0:
+                    return pending
+                self.cond.wait(remaining)
+
+    def send_message(self, params):
+        with self.cond:
+            self.messages.append({'chat_id': params.get('chat_id'), 'text': params.get('text', ''),
+                                  'time': time.monotonic()})
+            self.cond.notify_all()
+            return {'message_id': len(self.messages)}
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def respond(self, params):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                method = urlparse(self.path).path.rsplit('/', 1)[-1]
+                if method == 'getUpdates':
+                    result = fake.get_updates(int(params.get('offset', 0)), float(params.get('timeout', 0)))
+                elif method == 'sendMessage':
+                    result = fake.send_message(params)
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = json.dumps({'ok': True, 'result': result}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                self.respond({key: values[-1] for key, values in query.items()})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                query = parse_qs(urlparse(self.path).query)
+                params = {key: values[-1] for key, values in {**query, **form}.items()}
+                self.respond(params)
+
+        return Handler
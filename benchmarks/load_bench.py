@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import tempfile
+
+# Full trading loop against the in-process simulator:
+#   python benchmarks/load_bench.py --symbols 300 --cycles 5
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test TradingBot cycles on the simulator backend")
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="simulated terminal round-trip per call")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--profile', action='store_true', help="dump collapsed stacks of the last cycle")
+    return parser.parse_args(argv)
+
+
+def configure(args, symbols, workdir):
+    # bot.py reads its configuration at import time, so this runs before it is imported
+    calendar_file = os.path.join(workdir, 'calendar.json')
+    with open(calendar_file, 'w') as f:
+        json.dump([], f)
+    os.environ.update({
+        'BROKER_BACKEND': 'simulator',
+        'SIM_SPEED': '0',
+        'SIM_SEED': str(args.seed),
+        'SIM_LATENCY_MS': str(args.latency_ms),
+        'SIM_HISTORY_BARS': '5000',
+        'SYMBOLS': ','.join(symbols),
+        'MT5_WORKERS': str(args.workers),
+        'ECONOMIC_CALENDAR_FILE': calendar_file,
+        'DASHBOARD_PORT': '0',
+        'STAGE_TIMEOUT': '60',
+        'SENTIMENT_SCORER': 'lexicon',
+    })
+    sys.path.insert(0, ROOT)
+    os.chdir(workdir)
+
+
+def train_shared_model(backend, symbol):
+    from sklearn.ensemble import RandomForestClassifier
+    from feature_engine import WARMUP_BARS, compute_features
+    import mt5_constants as mt5
+
+    # One small model shared by every symbol; the load test measures the loop, not the model
+    bars = backend.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M15, 0, 1000)
+    features = compute_features(bars['open'], bars['high'], bars['low'], bars['close'])[WARMUP_BARS:-1]
+    target = (bars['close'][WARMUP_BARS + 1:] > bars['close'][WARMUP_BARS:-1]).astype(int)
+    return RandomForestClassifier(n_estimators=20, max_depth=5, random_state=0).fit(features, target)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    symbols = [f"SIM{i:03d}USD" for i in range(args.symbols)]
+    workdir = tempfile.mkdtemp(prefix='load_bench_')
+    configure(args, symbols, workdir)
+    import numpy as np
+    from bot import TradingBot
+    from instrumentation import SamplingProfiler
+
+    logging.basicConfig(level=logging.WARNING)
+    bot = TradingBot()
+    backend = bot.mt5_manager.backend
+    # Telegram is outside the measured loop (and unreachable without a token)
+    bot.notifier.send_message = lambda *args, **kwargs: None
+    model = bot.strategy.inference_model(train_shared_model(backend, symbols[0]))
+    for symbol in symbols:
+        bot.strategy.models.put(symbol, model)
+
+    latencies = []
+    for cycle in range(args.cycles):
+        profiler = SamplingProfiler().start() if args.profile and cycle == args.cycles - 1 else None
+        latencies.append(asyncio.run(bot.run_cycle()))
+        if profiler:
+            profile_file = profiler.stop().dump(os.path.join(workdir, 'last_cycle.folded'))
+        backend.advance(15 * 60)
+
+    latencies = np.array(latencies)
+    positions = backend.positions_get() or ()
+    print(f"{len(symbols)} symbols x {args.cycles} cycles, {args.workers} workers, "
+          f"{args.latency_ms} ms simulated latency")
+    print(f"  cycle seconds: mean {latencies.mean():.3f}  p50 {np.median(latencies):.3f}  max {latencies.max():.3f}")
+    print(f"  throughput:    {len(symbols) / latencies.mean():.0f} symbols/s")
+    print(f"  orders filled: {len(bot.trade_history)}  open positions: {len(positions)}  "
+          f"closed deals logged: {len(bot.trade_logger.store)}")
+    for stage, stats in sorted(bot.performance_metrics['stage_latency'].items()):
+        print(f"  {stage:<9} n={stats['count']:<6} p50 {stats['p50'] * 1000:8.2f} ms  "
+              f"p99 {stats['p99'] * 1000:8.2f} ms  max {stats['max'] * 1000:8.2f} ms")
+    if args.profile:
+        print(f"  profile: {profile_file}")
+    bot.io_pool.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import itertools
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# Benchmark suite for the hot paths, on synthetic data and the simulator backend (no terminal needed):
+#   python benchmarks/run_benchmarks.py --save          # record benchmarks/baseline.json
+#   python benchmarks/run_benchmarks.py                 # compare, exit 1 on regressions
+#   python benchmarks/run_benchmarks.py -k sizing --threshold 0.5
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+sys.path.insert(0, os.path.join(ROOT, 'modules'))
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+import mt5_constants as mt5
+from broker_simulator import SimulatorBackend, TradeDeal
+from mt5_manager import MT5Manager
+from m1_model_manager import MLModelManager
+from trade_executor import TradeExecutor
+from trade_logger import TradeLogger
+from economic_calendar import EconomicCalendar
+from indicators import Indicators, StreamingRSI, StreamingATR, StreamingMACD
+from feature_engine import FEATURES, compute_features_batch, prepare_features
+from tick_stream import TickStream
+
+BENCHMARKS = []
+TEMP_DIRS = []
+Account = namedtuple('Account', ['balance'])
+
+
+def benchmark(name, **grid):
+    # setup(**params) -> (func, ops): func is timed, ops is how many operations one call performs
+    def decorator(setup):
+        for values in itertools.product(*grid.values()):
+            params = dict(zip(grid, values))
+            label = ",".join(f"{key}={value}" for key, value in params.items())
+            BENCHMARKS.append((f"{name}[{label}]" if label else name, setup, params))
+        return setup
+    return decorator
+
+
+# Synthetic data
+
+def synthetic_bars(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 5e-4, n))
+    open_ = np.r_[close[0], close[:-1]] + rng.normal(0, 1e-4, n)
+    high = np.maximum(open_, close) + rng.uniform(0, 5e-4, n)
+    low = np.minimum(open_, close) - rng.uniform(0, 5e-4, n)
+    time_ = 1_700_000_000 + np.arange(n) * 900
+    return pd.DataFrame({'time': time_, 'open': open_, 'high': high, 'low': low, 'close': close,
+                         'tick_volume': rng.integers(50, 500, n)})
+
+
+def synthetic_ticks(n, seed=0, start_msc=1_700_000_000_000):
+    rng = np.random.default_rng(seed)
+    ticks = np.zeros(n, dtype=[('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'),
+                               ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8')])
+    ticks['time_msc'] = start_msc + np.cumsum(rng.integers(0, 400, n))
+    ticks['time'] = ticks['time_msc'] // 1000
+    ticks['bid'] = 1.1 + np.cumsum(rng.normal(0, 2e-5, n))
+    ticks['ask'] = ticks['bid'] + 1e-4
+    return ticks
+
+
+def synthetic_deals(n, first_ticket, seed=0, when=1_700_000_000):
+    rng = np.random.default_rng(seed)
+    profits = rng.normal(5, 50, n)
+    return [TradeDeal(first_ticket + i, first_ticket + i, when + i, (when + i) * 1000, i % 2, 1, 234000,
+                      first_ticket + i, 3, 0.1, 1.1, 0.0, 0.0, float(profits[i]), 0.0, f"SYM{i % 20:02d}USD", '', '')
+            for i in range(n)]
+
+
+def synthetic_model(n_estimators, seed=0):
+    df = prepare_features(synthetic_bars(3000, seed))
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=8, random_state=seed, n_jobs=1)
+    return model.fit(df[FEATURES].to_numpy(), df['target'].to_numpy()), df
+
+
+def simulator_manager():
+    return MT5Manager(0, '', '', backend=SimulatorBackend(speed=0, history_bars=5000))
+
+
+class DealFeed:
+    # Stands in for MT5Manager in TradeLogger: a fixed balance and a scripted deal history
+    def __init__(self):
+        self.deals = []
+
+    def get_account_info(self):
+        return Account(10_000.0)
+
+    def history_deals_get(self, from_time, to_time, symbol=None):
+        return self.deals
+
+
+# Features and inference
+
+@benchmark('features.prepare_features', bars=[2_000, 20_000])
+def bench_prepare_features(bars):
+    manager = MLModelManager(None)
+    df = synthetic_bars(bars)
+    return lambda: manager.prepare_features(df), 1
+
+
+@benchmark('features.compute_features_batch', symbols=[10, 100])
+def bench_features_batch(symbols):
+    # The live cycle's shape: the last 100 bars of every symbol
+    bars = [synthetic_bars(100, seed).to_records(index=False) for seed in range(symbols)]
+    return lambda: compute_features_batch(bars), 1
+
+
+@benchmark('inference.predict_direction', trees=[20, 100])
+def bench_predict_direction(trees):
+    manager = MLModelManager(None)
+    model, df = synthetic_model(trees)
+    manager.models.put('EURUSD', model)
+    row = df.iloc[-1]
+    return lambda: manager.predict_direction('EURUSD', row), 1
+
+
+@benchmark('inference.predict_many', symbols=[10, 100])
+def bench_predict_many(symbols):
+    manager = MLModelManager(None)
+    manager.models.max_size = symbols
+    model, df = synthetic_model(100)
+    rows = {}
+    for i in range(symbols):
+        manager.models.put(f"SYM{i:03d}", model)
+        rows[f"SYM{i:03d}"] = df[FEATURES].iloc[-1 - i]
+    return lambda: manager.predict_many(rows), symbols
+
+
+# Indicators
+
+@benchmark('indicators.pandas', bars=[2_000, 200_000])
+def bench_indicators(bars):
+    df = synthetic_bars(bars)
+
+    def run():
+        Indicators.compute_rsi(df['close'])
+        Indicators.compute_atr(df)
+        Indicators.compute_macd(df['close'])
+    return run, 1
+
+
+@benchmark('indicators.streaming_update', bars=[10_000])
+def bench_streaming(bars):
+    df = synthetic_bars(bars)
+    high, low, close = df['high'].tolist(), df['low'].tolist(), df['close'].tolist()
+
+    def run():
+        rsi, atr, macd = StreamingRSI(), StreamingATR(), StreamingMACD()
+        for h, l, c in zip(high, low, close):
+            rsi.update(c)
+            atr.update(h, l, c)
+            macd.update(c)
+    return run, bars
+
+
+# Order path
+
+def warm_executor(symbols):
+    manager = simulator_manager()
+    calendar = EconomicCalendar(auto_refresh=False)
+    executor = TradeExecutor(manager, None, calendar)
+    manager.refresh_account()
+    quotes = {}
+    for symbol in symbols:
+        tick = manager.get_symbol_tick(symbol)
+        quotes[symbol] = tick
+        manager.get_symbol_spec(symbol)
+    manager.precompute_margins((mt5.ORDER_TYPE_BUY, symbol, quotes[symbol].ask) for symbol in symbols)
+    return manager, executor, quotes
+
+
+@benchmark('sizing.calculate_lot_size', symbols=[10])
+def bench_lot_size(symbols):
+    names = [f"SIM{i:03d}USD" for i in range(symbols)]
+    manager, executor, quotes = warm_executor(names)
+    orders = [(name, quotes[name].ask, quotes[name].ask - 200 * manager.get_symbol_spec(name).point) for name in names]
+
+    def run():
+        for name, entry, stop in orders:
+            executor.calculate_lot_size(name, entry, stop, 0.01)
+    return run, len(orders)
+
+
+@benchmark('sizing.calculate_dynamic_stops', symbols=[10])
+def bench_dynamic_stops(symbols):
+    names = [f"SIM{i:03d}USD" for i in range(symbols)]
+    manager, executor, quotes = warm_executor(names)
+
+    def run():
+        for name in names:
+            tick = quotes[name]
+            executor.calculate_dynamic_stops(name, tick.ask, "BUY", 150.0, tick.bid, tick.ask)
+    return run, len(names)
+
+
+# Ticks and trade logging
+
+@benchmark('ticks.update', new_ticks=[10, 1_000])
+def bench_tick_update(new_ticks):
+    # The terminal side keeps the last few batches; every call adds `new_ticks` fresh ticks
+    batch = synthetic_ticks(new_ticks)
+    terminal = [synthetic_ticks(5_000)]
+
+    def fetch(symbol, date_from, count):
+        ticks = terminal[0]
+        return ticks[np.searchsorted(ticks['time_msc'], date_from * 1000, side='left'):][:count]
+
+    stream = TickStream(fetch, clock=lambda symbol: int(terminal[0]['time'][-1]))
+    stream.update('EURUSD')
+
+    def run():
+        ticks = terminal[0]
+        fresh = batch.copy()
+        fresh['time_msc'] += ticks['time_msc'][-1] + 1 - batch['time_msc'][0]
+        fresh['time'] = fresh['time_msc'] // 1000
+        terminal[0] = np.concatenate([ticks[-max(new_ticks, 1_000):], fresh])
+        stream.update('EURUSD')
+    return run, 1
+
+
+@benchmark('logging.log_closed_trades', deals=[100, 5_000], fresh=[True, False])
+def bench_log_closed_trades(deals, fresh):
+    # fresh: every call brings new deals; otherwise the steady state of re-reading the overlap window
+    directory = tempfile.mkdtemp(prefix='bench_trades_')
+    TEMP_DIRS.append(directory)
+    feed = DealFeed()
+    trade_logger = TradeLogger(feed, log_dir=os.path.join(directory, 'trades'), legacy_log_file=None)
+    trade_logger.store.compact_threshold = 10**9
+    next_ticket = [1]
+    feed.deals = synthetic_deals(deals, next_ticket[0])
+
+    def run():
+        if fresh:
+            feed.deals = synthetic_deals(deals, next_ticket[0])
+            next_ticket[0] += deals
+        trade_logger.log_closed_trades()
+    if not fresh:
+        trade_logger.log_closed_trades()
+    return run, 1
+
+
+# Runner
+
+def measure(func, repeat, min_sample):
+    # timeit-style: scale the loop count until one sample takes min_sample, then take `repeat` samples
+    func()
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_sample or loops >= 1_000_000:
+            break
+        loops *= 2 if elapsed > min_sample / 10 else 10
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops)
+    return samples
+
+
+def machine():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()}
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.2f} ns"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare against a JSON baseline")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help="write this run's results into the baseline")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed slowdown of the best time, e.g. 0.25 = 25%%")
+    parser.add_argument('-k', '--filter', default=None, help="only run benchmarks whose name matches this regex")
+    parser.add_argument('--repeat', type=int, default=7, help="timed samples per benchmark")
+    parser.add_argument('--min-sample', type=float, default=0.05, help="seconds per sample, loops are scaled to fit")
+    parser.add_argument('--json', default=None, help="also write this run's results here")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    pattern = re.compile(args.filter) if args.filter else None
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('machine') != machine():
+            print(f"warning: baseline was recorded on a different machine/runtime: {baseline.get('machine')}")
+    reference = baseline.get('results', {})
+
+    results = {}
+    regressions = []
+    # Regressions are judged on the best sample: on a shared machine noise only ever adds time
+    print(f"{'benchmark':<52} {'median/op':>11} {'min/op':>11} {'baseline':>11} {'change':>8}")
+    try:
+        for name, setup, params in BENCHMARKS:
+            if pattern and not pattern.search(name):
+                continue
+            func, ops = setup(**params)
+            samples = np.array(measure(func, args.repeat, args.min_sample)) / ops
+            median, best = float(np.median(samples)), float(samples.min())
+            results[name] = {'median': median, 'min': best, 'ops': ops, 'samples': len(samples)}
+
+            line = f"{name:<52} {format_time(median):>11} {format_time(best):>11}"
+            previous = reference.get(name)
+            if previous:
+                change = best / previous['min'] - 1
+                flag = ''
+                if change > args.threshold:
+                    flag = '  REGRESSION'
+                    regressions.append((name, change))
+                line += f" {format_time(previous['min']):>11} {change:+8.1%}{flag}"
+            else:
+                line += f" {'new':>11}"
+            print(line, flush=True)
+    finally:
+        for directory in TEMP_DIRS:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    run = {'machine': machine(), 'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+           'threshold': args.threshold, 'results': results}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(run, f, indent=2)
+    if args.save:
+        # A filtered run only replaces the benchmarks it ran
+        run['results'] = dict(reference, **results)
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Saved {len(results)} result(s) to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+        for name, change in regressions:
+            print(f"  {name}: {change:+.1%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
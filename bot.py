@@ -1,28 +1,53 @@
 import os
+import sys
+import json
+import time
 import asyncio
 import logging
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
+
+# Modules import their siblings by bare name (e.g. `from utils import retry`); import shared
+# ones the same way so exception classes are the same objects the modules raise
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "modules"))
+
+import mt5_constants as mt5
+from utils import CallError, retry_metrics
+from instrumentation import METRICS, PROFILE_DIR, SamplingProfiler, timer
 from modules.mt5_manager import MT5Manager
-from modules.ml_model_manager import MLModelManager
+from modules.m1_model_manager import MLModelManager
 from modules.telegram_notifier import TelegramNotifier
 from modules.trade_executor import TradeExecutor
 from modules.trade_logger import TradeLogger
 from modules.economic_calendar import EconomicCalendar
 from modules.news_sentiment import NewsSentiment
-from flask import Flask, jsonify, render_template_string
+from modules.timeseries_store import EquityCurve
+from flask import Flask, Response, jsonify, render_template_string, request, stream_with_context
 import threading
 
 # Load environment variables
 load_dotenv()
 
 # Configuration constants
-MT5_LOGIN = int(os.getenv("MT5_LOGIN"))
+MT5_LOGIN = int(os.getenv("MT5_LOGIN", 0))
 MT5_PASSWORD = os.getenv("MT5_PASSWORD")
 MT5_SERVER = os.getenv("MT5_SERVER")
 SYMBOLS = os.getenv("SYMBOLS", "EURUSD,GBPUSD,USDJPY").split(",")
 BASE_RISK_PERCENT = float(os.getenv("BASE_RISK_PERCENT", 0.01))
 MAX_RISK_PERCENT = float(os.getenv("MAX_RISK_PERCENT", 0.03))
+CYCLE_INTERVAL = float(os.getenv("CYCLE_INTERVAL", 60))
+STAGE_TIMEOUT = float(os.getenv("STAGE_TIMEOUT", 10))  # per call, counted from when a worker starts it
+STAGE_QUEUE_TIMEOUT = float(os.getenv("STAGE_QUEUE_TIMEOUT", CYCLE_INTERVAL))  # max wait for a free worker
+MT5_WORKERS = int(os.getenv("MT5_WORKERS", 4))
+FEATURE_BARS = int(os.getenv("FEATURE_BARS", 100))
+DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", 500))
+TRADE_HISTORY_LIMIT = int(os.getenv("TRADE_HISTORY_LIMIT", 1000))
+SSE_INTERVAL = float(os.getenv("SSE_INTERVAL", 5))
+DASHBOARD_PORT = int(os.getenv("DASHBOARD_PORT", 5000))
+PROFILE_CYCLES = int(os.getenv("PROFILE_CYCLES", 0))  # profile the first N cycles
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
@@ -32,24 +57,34 @@ class TradingBot:
         self.mt5_manager = MT5Manager(MT5_LOGIN, MT5_PASSWORD, MT5_SERVER)
         self.strategy = MLModelManager(self.mt5_manager)
         self.notifier = TelegramNotifier(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, self)
-        self.executor = TradeExecutor(self.mt5_manager, self.notifier)
-        self.trade_logger = TradeLogger(self.mt5_manager)
         self.economic_calendar = EconomicCalendar()
+        self.executor = TradeExecutor(self.mt5_manager, self.notifier, self.economic_calendar)
+        self.trade_logger = TradeLogger(self.mt5_manager)
         self.news_sentiment = NewsSentiment(os.getenv("NEWS_API_KEY"))
         self.trading_enabled = True
         self.current_risk = BASE_RISK_PERCENT
+        # Bounded: the equity curve lives in fixed-size rings, trade history in a capped deque
+        self.equity_curve = EquityCurve()
+        self.trade_history = deque(maxlen=TRADE_HISTORY_LIMIT)
+        self.metrics_version = 0
         self.performance_metrics = {
-            'equity_curve': [],
-            'trade_history': [],
             'max_drawdown': 0,
-            'start_balance': 0
+            'start_balance': 0,
+            'cycle_latency': {}
         }
+        self.cycle_count = 0
+        self.profile_cycles = PROFILE_CYCLES
+        self.io_pool = ThreadPoolExecutor(max_workers=MT5_WORKERS, thread_name_prefix="mt5")
+        # Calls that timed out while running; their workers stay busy until the call returns
+        self.abandoned_calls = 0
+        self.abandoned_lock = threading.Lock()
+        METRICS.collectors.append(self.stage_samples)
         self.config_mtime = os.path.getmtime('.env') if os.path.exists('.env') else 0
 
         # Setup Flask dashboard
         self.app = Flask(__name__)
         self.setup_dashboard()
-        threading.Thread(target=lambda: self.app.run(host='0.0.0.0', port=5000), daemon=True).start()
+        threading.Thread(target=lambda: self.app.run(host='0.0.0.0', port=DASHBOARD_PORT), daemon=True).start()
 
     def setup_dashboard(self):
         @self.app.route('/')
@@ -60,15 +95,26 @@ class TradingBot:
             <head><title>Trading Bot Dashboard</title></head>
             <body>
                 <h1>Trading Bot Dashboard</h1>
-                <div id="metrics"></div>
+                <div id="equity"></div>
+                <pre id="metrics"></pre>
                 <script>
-                    async function fetchData() {
-                        const res = await fetch('/data');
-                        const data = await res.json();
-                        document.getElementById('metrics').innerText = JSON.stringify(data, null, 2);
+                    const equity = new Map();
+                    function render(summary, points) {
+                        for (const [t, v] of points) equity.set(t, v);
+                        const times = [...equity.keys()].sort((a, b) => a - b);
+                        const last = times.length ? equity.get(times[times.length - 1]) : null;
+                        document.getElementById('equity').innerText =
+                            `Equity: ${last === null ? 'n/a' : last.toFixed(2)} (${times.length} points, 1m)`;
+                        document.getElementById('metrics').innerText = JSON.stringify(summary, null, 2);
                     }
-                    setInterval(fetchData, 5000);
-                    fetchData();
+                    fetch('/data?resolution=1m').then(res => res.json()).then(data => {
+                        render(data.summary, data.equity.points);
+                        const source = new EventSource('/stream?resolution=1m');
+                        source.onmessage = event => {
+                            const update = JSON.parse(event.data);
+                            render(update.summary, update.points);
+                        };
+                    });
                 </script>
             </body>
             </html>
@@ -76,7 +122,62 @@ class TradingBot:
 
         @self.app.route('/data')
         def data():
-            return jsonify(self.performance_metrics)
+            # Paged: ?resolution=raw|1m|1h&since=<unix time>&limit=N; conditional on ETag.
+            # `since` includes a point at that time; `after` excludes it and is what next_after pages with.
+            resolution = request.args.get('resolution', '1m')
+            after = request.args.get('after', type=float)
+            since = after if after is not None else request.args.get('since', type=float)
+            limit = max(min(request.args.get('limit', DASHBOARD_PAGE_SIZE, type=int), DASHBOARD_PAGE_SIZE), 1)
+            try:
+                points = self.equity_curve.points(resolution, since, limit, inclusive=after is None)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            response = jsonify({
+                'summary': self.performance_metrics,
+                'equity': {
+                    'resolution': resolution,
+                    'points': points,
+                    'next_after': points[-1][0] if points else since
+                },
+                'trade_history': list(self.trade_history)[-limit:]
+            })
+            response.set_etag(f"{self.equity_curve.version}-{self.metrics_version}")
+            return response.make_conditional(request)
+
+        @self.app.route('/stream')
+        def stream():
+            resolution = request.args.get('resolution', '1m')
+            if resolution not in EquityCurve.RESOLUTIONS:
+                return jsonify({'error': f"Unknown resolution {resolution!r}"}), 400
+
+            def events():
+                # Pushes only points newer than the last ones sent, and only when something changed
+                since = time.time()
+                seen = None
+                while True:
+                    version = (self.equity_curve.version, self.metrics_version)
+                    if version != seen:
+                        seen = version
+                        points = self.equity_curve.points(resolution, since, DASHBOARD_PAGE_SIZE)
+                        if points:
+                            since = points[-1][0]
+                        yield f"data: {json.dumps({'summary': self.performance_metrics, 'points': points})}\n\n"
+                    else:
+                        yield ": keep-alive\n\n"
+                    time.sleep(SSE_INTERVAL)
+
+            return Response(stream_with_context(events()), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache'})
+
+        @self.app.route('/metrics')
+        def metrics():
+            return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+        @self.app.route('/profile', methods=['POST'])
+        def profile():
+            # Sample the next N cycles; collapsed stacks land in PROFILE_DIR for flamegraph.pl/speedscope
+            self.profile_cycles = max(request.args.get('cycles', 1, type=int), 0)
+            return jsonify({'profile_cycles': self.profile_cycles, 'directory': PROFILE_DIR})
 
     async def config_reloader(self):
         while True:
@@ -90,26 +191,239 @@ class TradingBot:
                 self.config_mtime = current_mtime
                 self.current_risk = float(os.getenv("BASE_RISK_PERCENT", BASE_RISK_PERCENT))
 
+    async def run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_pool, functools.partial(func, *args))
+
+    async def run_stage(self, symbol, stage, func, *args):
+        # Timed as the cycle sees it, including any wait for a free worker. STAGE_TIMEOUT only
+        # starts once a worker runs the call, so a busy pool does not time out queued stages;
+        # a call still queued after STAGE_QUEUE_TIMEOUT is cancelled and never runs.
+        started = []
+
+        def call():
+            started.append(time.monotonic())
+            return func(*args)
+
+        with timer('stage_seconds', stage=stage, symbol=symbol):
+            future = self.io_pool.submit(call)
+            waiter = asyncio.wrap_future(future)
+            queued_until = time.monotonic() + STAGE_QUEUE_TIMEOUT
+            while True:
+                deadline = started[0] + STAGE_TIMEOUT if started else queued_until
+                done, _ = await asyncio.wait({waiter}, timeout=max(deadline - time.monotonic(), 0))
+                if done:
+                    return waiter.result()
+                if not started and future.cancel():
+                    raise TimeoutError(f"{symbol} stage '{stage}' waited {STAGE_QUEUE_TIMEOUT}s for a worker")
+                if started and time.monotonic() >= started[0] + STAGE_TIMEOUT:
+                    waiter.cancel()
+                    self.abandon(future, symbol, stage)
+                    raise TimeoutError(f"{symbol} stage '{stage}' timed out after {STAGE_TIMEOUT}s")
+
+    def abandon(self, future, symbol, stage):
+        with self.abandoned_lock:
+            self.abandoned_calls += 1
+            running = self.abandoned_calls
+        METRICS.inc('abandoned_calls_total', stage=stage)
+        logging.warning(f"Abandoned {symbol} stage '{stage}'; abandoned calls now hold {running} of "
+                        f"{MT5_WORKERS} worker(s)")
+        future.add_done_callback(self.abandoned_done)
+
+    def abandoned_done(self, future):
+        with self.abandoned_lock:
+            self.abandoned_calls -= 1
+
+    def stage_samples(self):
+        yield 'abandoned_calls', 'gauge', {}, self.abandoned_calls
+
+    async def prepare_symbol(self, symbol):
+        # fetch -> features; returns the latest feature row for the cycle's batched predict
+        df = await self.run_stage(symbol, 'fetch', self.mt5_manager.copy_rates, symbol, mt5.TIMEFRAME_M15, FEATURE_BARS)
+        if df.empty:
+            return None
+
+        df = await self.run_stage(symbol, 'features', self.strategy.prepare_features, df)
+        if df.empty:
+            return None
+        return df.iloc[-1]
+
+    async def gate_symbol(self, symbol, latest, prediction):
+        # gate; returns an entry signal, executed by run_cycle
+        direction = "BUY" if prediction['label'] == 1 else "SELL"
+        tick = await self.run_stage(symbol, 'gate', self.check_entry, symbol, direction)
+        if tick is None:
+            return None
+        entry_price = tick.ask if direction == "BUY" else tick.bid
+        return {'symbol': symbol, 'direction': direction, 'price': entry_price,
+                'bid': tick.bid, 'ask': tick.ask, 'atr': latest['atr']}
+
+    async def predict_all(self, rows):
+        # One predict stage for every symbol; symbols sharing a model are scored together
+        if not rows:
+            return {}
+        try:
+            return await self.run_stage('models', 'predict', self.strategy.predict_many, rows)
+        except Exception as e:
+            logging.error(f"Batch prediction failed: {e}")
+            return {}
+
+    def check_entry(self, symbol, direction):
+        if self.mt5_manager.positions_get(symbol=symbol):
+            return None
+        tick = self.mt5_manager.get_symbol_tick(symbol)
+        entry_price = tick.ask if direction == "BUY" else tick.bid
+        if not self.executor.should_enter_trade(symbol, direction, entry_price):
+            return None
+        return tick
+
+    def prepare_orders(self, signals):
+        # Specs and per-lot margin for every candidate up front, so each order path only
+        # talks to the terminal to send the order
+        for signal in signals:
+            self.mt5_manager.get_symbol_spec(signal['symbol'])
+        self.mt5_manager.precompute_margins(
+            (mt5.ORDER_TYPE_BUY if s['direction'] == "BUY" else mt5.ORDER_TYPE_SELL, s['symbol'], s['price'])
+            for s in signals)
+
+    def execute_batch(self, signals):
+        # calculate_dynamic_stops scales ATR by the symbol's point, so it takes ATR in points
+        try:
+            self.prepare_orders(signals)
+        except CallError as e:
+            # Orders still go through; sizing falls back to live margin queries
+            logging.warning(f"Order snapshot preparation failed: {e}")
+        intents = []
+        for signal in signals:
+            symbol, direction, entry_price = signal['symbol'], signal['direction'], signal['price']
+            intent = {'symbol': symbol, 'direction': direction, 'price': entry_price}
+            try:
+                point = self.mt5_manager.get_symbol_spec(symbol).point
+                intent['sl'], intent['tp'] = self.executor.calculate_dynamic_stops(
+                    symbol, entry_price, direction, signal['atr'] / point, signal['bid'], signal['ask'])
+            except CallError as e:
+                # Only this signal is lost; it shows up as rejected in the batch report
+                logging.warning(f"Skipping {symbol} order: {e}")
+                intent['error'] = str(e)
+            intents.append(intent)
+        return self.executor.submit_batch(intents, risk_percent=self.current_risk)
+
+    async def guarded(self, symbol, coro):
+        try:
+            return await coro
+        except CallError as e:
+            # Broker call failed or its circuit is open; only this symbol's cycle is skipped
+            logging.warning(f"Skipping {symbol} this cycle: {e}")
+        except Exception as e:
+            logging.error(f"Pipeline error for {symbol}: {e}")
+        return None
+
+    async def timed_symbol(self, symbol, coro):
+        start = time.perf_counter()
+        result = await self.guarded(symbol, coro)
+        return time.perf_counter() - start, result
+
+    async def execute_signals(self, signals):
+        # One batch per cycle: sized together, sent concurrently, reconciled, reported once
+        try:
+            reports = await self.run_stage('orders', 'execute', self.execute_batch, signals)
+        except Exception as e:
+            logging.error(f"Order batch failed: {e}")
+            return
+        for signal, report in zip(signals, reports):
+            if report['status'] in ('filled', 'unconfirmed'):
+                self.trade_history.append({
+                    'time': time.time(),
+                    'symbol': signal['symbol'],
+                    'direction': signal['direction'],
+                    'price': report['price'],
+                    'volume': report['volume']
+                })
+
+    def update_equity(self):
+        account_info = self.mt5_manager.get_account_info()
+        self.equity_curve.append(time.time(), account_info.equity)
+
+    async def run_cycle(self):
+        start = time.perf_counter()
+        try:
+            await self.run_stage('account', 'snapshot', self.mt5_manager.refresh_account)
+        except Exception as e:
+            logging.warning(f"Account snapshot refresh failed: {e}")
+        # fetch -> features per symbol, one batched predict, then gate per symbol
+        prepared = await asyncio.gather(*(self.timed_symbol(symbol, self.prepare_symbol(symbol)) for symbol in SYMBOLS))
+        rows = {symbol: latest for symbol, (_, latest) in zip(SYMBOLS, prepared) if latest is not None}
+        predictions = await self.predict_all(rows)
+        predicted = [symbol for symbol in SYMBOLS if symbol in predictions]
+        gated = await asyncio.gather(*(self.timed_symbol(symbol, self.gate_symbol(symbol, rows[symbol], predictions[symbol]))
+                                       for symbol in predicted))
+        gate_seconds = {symbol: elapsed for symbol, (elapsed, _) in zip(predicted, gated)}
+        symbol_latencies = [elapsed + gate_seconds.get(symbol, 0.0) for symbol, (elapsed, _) in zip(SYMBOLS, prepared)]
+        for symbol, elapsed in zip(SYMBOLS, symbol_latencies):
+            METRICS.observe('symbol_seconds', elapsed, symbol=symbol)
+        signals = [signal for _, signal in gated if signal]
+        if signals:
+            await self.execute_signals(signals)
+        try:
+            await self.run_stage('account', 'equity', self.update_equity)
+            await self.run_stage('account', 'trades', self.trade_logger.log_closed_trades)
+        except Exception as e:
+            logging.error(f"Account update failed: {e}")
+        trade_metrics = self.trade_logger.calculate_performance_metrics(breakdown=True)
+        if trade_metrics:
+            self.performance_metrics['trade_metrics'] = trade_metrics
+            self.performance_metrics['max_drawdown'] = trade_metrics['max_drawdown']
+        self.performance_metrics['broker_calls'] = retry_metrics()
+        self.performance_metrics['stage_latency'] = METRICS.summary('stage_seconds', by='stage')
+        self.performance_metrics['abandoned_calls'] = self.abandoned_calls
+        cycle_latency = time.perf_counter() - start
+        METRICS.observe('cycle_seconds', cycle_latency)
+
+        slowest = max(range(len(SYMBOLS)), key=symbol_latencies.__getitem__) if SYMBOLS else None
+        self.performance_metrics['cycle_latency'] = {
+            'symbols': len(SYMBOLS),
+            'cycle_seconds': round(cycle_latency, 4),
+            'max_symbol_seconds': round(symbol_latencies[slowest], 4) if slowest is not None else 0,
+            'slowest_symbol': SYMBOLS[slowest] if slowest is not None else None
+        }
+        self.metrics_version += 1
+        logging.info(f"Cycle processed {len(SYMBOLS)} symbols in {cycle_latency:.3f}s "
+                     f"(slowest: {self.performance_metrics['cycle_latency']['slowest_symbol']})")
+        return cycle_latency
+
     async def run(self):
         logging.info("Starting trading bot...")
-        account_info = self.mt5_manager.get_account_info()
-        if account_info:
+        try:
+            account_info = await self.run_blocking(self.mt5_manager.get_account_info)
             self.performance_metrics['start_balance'] = account_info.balance
+        except CallError as e:
+            logging.warning(f"Could not read starting balance: {e}")
 
         asyncio.create_task(self.config_reloader())
 
+        # Cycles start on a fixed grid so slow cycles do not push later ones back
+        loop = asyncio.get_running_loop()
+        next_run = loop.time()
         while self.trading_enabled:
+            self.cycle_count += 1
+            profiler = SamplingProfiler().start() if self.profile_cycles > 0 else None
             try:
-                for symbol in SYMBOLS:
-                    # Fetch data, generate signals, predict, execute trades
-                    # (Implement your trading logic here or call methods)
-                    pass
-
-                # Update performance metrics, log trades, etc.
-
-                await asyncio.sleep(60)  # Run every minute
+                await self.run_cycle()
             except Exception as e:
                 logging.error(f"Error in main loop: {e}")
+            if profiler:
+                self.profile_cycles -= 1
+                profiler.stop().dump(os.path.join(PROFILE_DIR, f"cycle-{self.cycle_count}-{int(time.time())}.folded"))
+
+            next_run += CYCLE_INTERVAL
+            now = loop.time()
+            if now > next_run:
+                missed = int((now - next_run) // CYCLE_INTERVAL) + 1
+                logging.warning(f"Cycle overran its {CYCLE_INTERVAL}s slot, skipping {missed} slot(s)")
+                next_run += missed * CYCLE_INTERVAL
+            await asyncio.sleep(next_run - now)
+
+        self.io_pool.shutdown(wait=False)
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,258 @@
+import os
+import time
+import zlib
+import logging
+import itertools
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from feature_engine import FEATURES, WARMUP_BARS, compute_features
+from risk import MIN_LOT, risk_lot_size, dynamic_stops
+from performance_metrics import MetricsAccumulator
+
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", os.cpu_count() or 1))
+
+# Static contract spec per symbol, with MT5 SymbolInfo attribute names so risk.py can use it
+SymbolSpec = namedtuple('SymbolSpec', ['point', 'trade_tick_value', 'trade_tick_size', 'trade_contract_size',
+                                       'volume_min', 'volume_max'],
+                        defaults=[1e-5, 1.0, 1e-5, 100_000, 0.01, 100.0])
+
+BUY, SELL = 1, -1
+
+
+class SimulatedBroker:
+    # Netting book with one position per symbol. Buys fill at ask, sells at bid, both with
+    # adverse slippage; margin is notional / leverage and must fit in free margin.
+
+    def __init__(self, balance=10_000.0, leverage=100, slippage_points=1, commission_per_lot=0.0):
+        self.balance = balance
+        self.leverage = leverage
+        self.slippage_points = slippage_points
+        self.commission_per_lot = commission_per_lot
+        self.positions = {}
+        self.floating = {}
+        self.total_floating = 0.0
+        self.margin_used = 0.0
+        self.deals = []
+        self.rejected = 0
+
+    @property
+    def equity(self):
+        return self.balance + self.total_floating
+
+    @property
+    def margin_free(self):
+        return self.equity - self.margin_used
+
+    def margin_required(self, spec, volume, price):
+        return volume * spec.trade_contract_size * price / self.leverage
+
+    def open(self, symbol, spec, direction, volume, bid, ask, sl, tp, when):
+        slip = self.slippage_points * spec.point
+        price = ask + slip if direction == BUY else bid - slip
+        margin = self.margin_required(spec, volume, price)
+        if margin > self.margin_free:
+            self.rejected += 1
+            return False
+        self.positions[symbol] = (direction, volume, price, sl, tp, margin, when)
+        self.margin_used += margin
+        self.balance -= self.commission_per_lot * volume
+        self.floating[symbol] = 0.0
+        return True
+
+    def mark(self, symbol, spec, bid, ask):
+        direction, volume, entry = self.positions[symbol][:3]
+        exit_price = bid if direction == BUY else ask
+        value = (exit_price - entry) * direction * volume * spec.trade_tick_value / spec.trade_tick_size
+        self.total_floating += value - self.floating[symbol]
+        self.floating[symbol] = value
+
+    def close(self, symbol, spec, price, when, reason):
+        direction, volume, entry, sl, tp, margin, opened = self.positions.pop(symbol)
+        profit = (price - entry) * direction * volume * spec.trade_tick_value / spec.trade_tick_size
+        self.balance += profit - self.commission_per_lot * volume
+        self.margin_used -= margin
+        self.total_floating -= self.floating.pop(symbol)
+        self.deals.append((opened, when, symbol, direction, volume, entry, price, profit, reason))
+        return profit
+
+
+def bars_fingerprint(bars):
+    # Content key for a symbol's bars: a different range, fold or edited price changes it
+    bars = np.ascontiguousarray(bars)
+    return len(bars), zlib.crc32(bars.view(np.uint8))
+
+
+def signal_probabilities(model, features):
+    # Probability of the "up" class (label 1) for every row; one vectorized call per symbol
+    proba = model.predict_proba(features)
+    classes = list(getattr(model, 'classes_', [0, 1]))
+    return proba[:, classes.index(1)]
+
+
+class Backtester:
+    def __init__(self, model, risk_percent=0.01, threshold=0.5, sl_atr=1.5, tp_atr=3.0,
+                 balance=10_000.0, leverage=100, slippage_points=1, default_spread_points=10,
+                 commission_per_lot=0.0):
+        self.model = model
+        self.risk_percent = risk_percent
+        self.threshold = threshold
+        self.sl_atr = sl_atr
+        self.tp_atr = tp_atr
+        self.balance = balance
+        self.leverage = leverage
+        self.slippage_points = slippage_points
+        self.default_spread_points = default_spread_points
+        self.commission_per_lot = commission_per_lot
+        self.prepared = {}
+
+    def prepare(self, symbol, bars, spec):
+        # Features and model probabilities for every bar, computed once per symbol and reused
+        # by every run on this instance with the same bars and spec (e.g. across a parameter
+        # sweep in one worker). One entry per symbol; other bars replace it.
+        key = (bars_fingerprint(bars), spec, self.default_spread_points, id(self.model))
+        cached = self.prepared.get(symbol)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        features = compute_features(bars['open'], bars['high'], bars['low'], bars['close'])
+        p_up = np.full(len(bars), 0.5)
+        if len(bars) > WARMUP_BARS:
+            p_up[WARMUP_BARS:] = signal_probabilities(self.model, features[WARMUP_BARS:])
+        spread = bars['spread'] if 'spread' in bars.dtype.names else np.zeros(len(bars))
+        spread = np.where(spread > 0, spread, self.default_spread_points) * spec.point
+        data = {
+            'time': bars['time'],
+            'open': bars['open'].tolist(),
+            'high': bars['high'].tolist(),
+            'low': bars['low'].tolist(),
+            'close': bars['close'].tolist(),
+            'spread': spread.tolist(),
+            'atr_points': (features[:, FEATURES.index('atr')] / spec.point).tolist(),
+            'p_up': p_up,
+        }
+        self.prepared[symbol] = (key, data)
+        return data
+
+    def run(self, bars_by_symbol, specs=None):
+        # bars_by_symbol: {symbol: structured array with time/open/high/low/close[/spread]}, oldest first
+        start = time.perf_counter()
+        specs = specs or {}
+        symbols = list(bars_by_symbol)
+        spec_list = [specs.get(symbol, SymbolSpec()) for symbol in symbols]
+        data = [self.prepare(symbol, bars_by_symbol[symbol], spec) for symbol, spec in zip(symbols, spec_list)]
+        signals = []
+        for d in data:
+            s = np.zeros(len(d['p_up']), dtype=np.int8)
+            s[d['p_up'] > self.threshold] = BUY
+            s[d['p_up'] < 1 - self.threshold] = SELL
+            signals.append(s.tolist())
+
+        # One time-ordered event stream across symbols so balance and margin are shared
+        times = np.concatenate([d['time'] for d in data]) if data else np.empty(0)
+        symbol_ids = np.concatenate([np.full(len(d['time']), k) for k, d in enumerate(data)]) if data else times
+        bar_ids = np.concatenate([np.arange(len(d['time'])) for d in data]) if data else times
+        order = np.argsort(times, kind='stable')
+        events = zip(symbol_ids[order].tolist(), bar_ids[order].tolist(), times[order].tolist())
+
+        broker = SimulatedBroker(self.balance, self.leverage, self.slippage_points, self.commission_per_lot)
+        positions = broker.positions
+        pending = [0] * len(symbols)
+        equity = np.empty(len(order))
+        metrics = MetricsAccumulator(self.balance)
+
+        for n, (k, i, when) in enumerate(events):
+            d = data[k]
+            symbol, spec = symbols[k], spec_list[k]
+            bid_open = d['open'][i]
+            spread = d['spread'][i]
+
+            # Signals from the previous bar's close are executed at this bar's open
+            if pending[k] and symbol not in positions:
+                direction = pending[k]
+                ask_open = bid_open + spread
+                entry = ask_open if direction == BUY else bid_open
+                sl, tp = dynamic_stops(entry, "BUY" if direction == BUY else "SELL", d['atr_points'][i - 1],
+                                       spec.point, bid_open, ask_open, self.sl_atr, self.tp_atr)
+                volume = risk_lot_size(broker.balance, broker.equity, self.risk_percent, entry, sl, spec)
+                if broker.margin_required(spec, volume, entry) > broker.margin_free:
+                    volume = MIN_LOT
+                broker.open(symbol, spec, direction, volume, bid_open, ask_open, sl, tp, when)
+            pending[k] = 0
+
+            if symbol in positions:
+                direction, _, _, sl, tp = positions[symbol][:5]
+                slip = self.slippage_points * spec.point
+                if direction == BUY:
+                    low, high = d['low'][i], d['high'][i]
+                    if low <= sl:
+                        metrics.update(broker.close(symbol, spec, min(sl, bid_open) - slip, when, 'sl'))
+                    elif high >= tp:
+                        metrics.update(broker.close(symbol, spec, tp, when, 'tp'))
+                else:
+                    low, high = d['low'][i] + spread, d['high'][i] + spread
+                    if high >= sl:
+                        metrics.update(broker.close(symbol, spec, max(sl, bid_open + spread) + slip, when, 'sl'))
+                    elif low <= tp:
+                        metrics.update(broker.close(symbol, spec, tp, when, 'tp'))
+                if symbol in positions:
+                    close = d['close'][i]
+                    broker.mark(symbol, spec, close, close + spread)
+
+            if symbol not in positions:
+                pending[k] = signals[k][i]
+            equity[n] = broker.equity
+
+        elapsed = time.perf_counter() - start
+        peak = np.maximum.accumulate(equity) if len(equity) else equity
+        return {
+            'bars': len(order),
+            'seconds': elapsed,
+            'bars_per_second': len(order) / elapsed if elapsed > 0 else 0.0,
+            'final_balance': broker.balance,
+            'final_equity': broker.equity,
+            'open_positions': len(positions),
+            'rejected_orders': broker.rejected,
+            'equity_max_drawdown': float(((peak - equity) / peak).max()) if len(equity) else 0.0,
+            'metrics': metrics.snapshot(),
+            'deals': broker.deals,
+            'equity': equity,
+        }
+
+
+_worker_state = {}
+
+
+def _init_sweep_worker(model, bars_by_symbol, specs):
+    _worker_state['model'] = model
+    _worker_state['bars'] = bars_by_symbol
+    _worker_state['specs'] = specs
+    _worker_state['backtester'] = None
+
+
+def _run_sweep_point(params):
+    # Features and probabilities do not depend on the swept parameters, so each worker
+    # computes them once and reuses them for every grid point it receives.
+    backtester = _worker_state['backtester']
+    if backtester is None:
+        backtester = _worker_state['backtester'] = Backtester(_worker_state['model'])
+    for key, value in params.items():
+        setattr(backtester, key, value)
+    result = backtester.run(_worker_state['bars'], _worker_state['specs'])
+    result.pop('equity')
+    result.pop('deals')
+    return params, result
+
+
+def run_sweep(model, bars_by_symbol, param_grid, specs=None, workers=BACKTEST_WORKERS):
+    # param_grid: {Backtester attribute: [values]}; returns [(params, result)] in grid order.
+    # Data and model are shipped to each worker once, not per grid point.
+    keys = list(param_grid)
+    points = [dict(zip(keys, values)) for values in itertools.product(*(param_grid[key] for key in keys))]
+    invalid = [key for key in keys if key in ('model', 'prepared', 'default_spread_points') or not hasattr(Backtester(model), key)]
+    if invalid:
+        raise ValueError(f"Cannot sweep over {invalid}")
+    logging.info(f"Running {len(points)} backtests on {workers} workers")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker,
+                             initargs=(model, bars_by_symbol, specs)) as pool:
+        return list(pool.map(_run_sweep_point, points))
@@ -0,0 +1,184 @@
+import os
+import struct
+import logging
+import threading
+import numpy as np
+import mt5_constants as mt5
+from bar_cache import RATES_DTYPE
+
+BAR_ARCHIVE_DIR = os.getenv("BAR_ARCHIVE_DIR", "bar_archive")
+ARCHIVE_SYNC_BARS = int(os.getenv("ARCHIVE_SYNC_BARS", 100_000))  # most bars requested on a first sync
+
+# 64-byte header: magic, format version, record size, timeframe, reserved, committed record count, symbol
+HEADER = struct.Struct('<8sIIiIq32s')
+MAGIC = b'BARARCH1'
+VERSION = 1
+
+
+def timeframe_name(timeframe):
+    seconds = mt5.timeframe_seconds(timeframe)
+    if seconds % 86400 == 0:
+        return f"D{seconds // 86400}"
+    if seconds % 3600 == 0:
+        return f"H{seconds // 3600}"
+    return f"M{seconds // 60}"
+
+
+def resample(bars, timeframe, complete_only=False):
+    # M1 bars (oldest first) -> bars of `timeframe`, bucketed on the timeframe boundary like the terminal.
+    # complete_only drops a trailing bucket the M1 data does not cover to its end.
+    step = mt5.timeframe_seconds(timeframe)
+    if len(bars) == 0 or step == 60:
+        return np.array(bars, dtype=RATES_DTYPE)
+    times = bars['time']
+    groups = times // step
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    ends = np.r_[starts[1:], len(bars)] - 1
+    out = np.zeros(len(starts), dtype=RATES_DTYPE)
+    out['time'] = groups[starts] * step
+    out['open'] = bars['open'][starts]
+    out['close'] = bars['close'][ends]
+    out['high'] = np.maximum.reduceat(bars['high'], starts)
+    out['low'] = np.minimum.reduceat(bars['low'], starts)
+    out['tick_volume'] = np.add.reduceat(bars['tick_volume'], starts)
+    out['real_volume'] = np.add.reduceat(bars['real_volume'], starts)
+    out['spread'] = bars['spread'][ends]
+    if complete_only and times[-1] + 60 < out['time'][-1] + step:
+        out = out[:-1]
+    return out
+
+
+class ArchiveFile:
+    # One (symbol, timeframe): header + RATES_DTYPE records, oldest first, append-only.
+    # Records are written first and the header count after, so a torn append is never visible;
+    # whatever lies past the committed count is overwritten by the next append.
+
+    def __init__(self, path, symbol, timeframe):
+        self.path = path
+        self.lock = threading.Lock()
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, RATES_DTYPE.itemsize, timeframe, 0, 0, symbol.encode()))
+        with open(path, 'rb') as f:
+            magic, version, record_size, stored_tf, _, count, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != RATES_DTYPE.itemsize or stored_tf != timeframe:
+            raise ValueError(f"{path} is not a version {VERSION} bar archive for timeframe {timeframe}")
+        on_disk = (os.path.getsize(path) - HEADER.size) // RATES_DTYPE.itemsize
+        if count > on_disk:
+            logging.warning(f"{path} header claims {count} bars but holds {on_disk}, truncating")
+            count = on_disk
+            self._commit(count)
+        self.count = count
+        self._map()
+
+    def _map(self):
+        if self.count:
+            self.records = np.memmap(self.path, dtype=RATES_DTYPE, mode='r', offset=HEADER.size, shape=(self.count,))
+        else:
+            self.records = np.empty(0, dtype=RATES_DTYPE)
+
+    def _commit(self, count):
+        with open(self.path, 'r+b') as f:
+            f.seek(24)  # count field
+            f.write(struct.pack('<q', count))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __len__(self):
+        return self.count
+
+    def last_time(self):
+        return int(self.records['time'][-1]) if self.count else None
+
+    def append(self, rates):
+        # Only bars newer than the last stored one are written; returns how many were
+        rates = np.asarray(rates).astype(RATES_DTYPE, copy=False)
+        with self.lock:
+            last_time = self.last_time()
+            if last_time is not None:
+                rates = rates[rates['time'] > last_time]
+            if len(rates) == 0:
+                return 0
+            with open(self.path, 'r+b') as f:
+                f.seek(HEADER.size + self.count * RATES_DTYPE.itemsize)
+                f.write(rates.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._commit(self.count + len(rates))
+            self.count += len(rates)
+            # Slices handed out earlier keep the old mapping, which stays valid
+            self._map()
+            return len(rates)
+
+    def slice(self, start=None, end=None):
+        # Bars with start <= time < end (epoch seconds), as a read-only view of the mapping
+        records = self.records
+        times = records['time']
+        lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        hi = len(records) if end is None else int(np.searchsorted(times, end, side='left'))
+        return records[lo:hi]
+
+
+class BarArchive:
+    # Local bar history, one memory-mapped file per (symbol, timeframe) under `directory`.
+    # fetch(symbol, timeframe, start_pos, count) returns terminal bars like copy_rates_from_pos.
+
+    def __init__(self, directory=BAR_ARCHIVE_DIR, fetch=None, sync_bars=ARCHIVE_SYNC_BARS):
+        self.directory = directory
+        self.fetch = fetch
+        self.sync_bars = sync_bars
+        self.files = {}
+        self.guard = threading.Lock()
+
+    def path(self, symbol, timeframe):
+        return os.path.join(self.directory, f"{symbol}_{timeframe_name(timeframe)}.bars")
+
+    def has(self, symbol, timeframe):
+        return (symbol, timeframe) in self.files or os.path.exists(self.path(symbol, timeframe))
+
+    def open(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        with self.guard:
+            archive = self.files.get(key)
+            if archive is None:
+                os.makedirs(self.directory, exist_ok=True)
+                archive = self.files[key] = ArchiveFile(self.path(symbol, timeframe), symbol, timeframe)
+            return archive
+
+    def sync(self, symbol, timeframe):
+        # Appends closed bars newer than the archive's last one. Position 0 is the forming bar,
+        # so requests start at 1; the window widens until it reaches back to what is stored.
+        archive = self.open(symbol, timeframe)
+        last_time = archive.last_time()
+        count = self.sync_bars if last_time is None else 64
+        while True:
+            rates = self.fetch(symbol, timeframe, 1, count)
+            if rates is None or len(rates) == 0:
+                return 0
+            if last_time is None or rates['time'][0] <= last_time or count >= self.sync_bars:
+                break
+            count = min(count * 4, self.sync_bars)
+        if last_time is not None and rates['time'][0] > last_time:
+            logging.warning(f"Bar archive gap for {symbol} {timeframe_name(timeframe)} after {last_time}")
+        added = archive.append(rates)
+        if added:
+            logging.info(f"Archived {added} {timeframe_name(timeframe)} bars for {symbol}")
+        return added
+
+    def bars(self, symbol, timeframe, start=None, end=None):
+        # Stored bars for [start, end); a timeframe without its own file is resampled from M1
+        if self.has(symbol, timeframe):
+            return self.open(symbol, timeframe).slice(start, end)
+        if not self.has(symbol, mt5.TIMEFRAME_M1):
+            return np.empty(0, dtype=RATES_DTYPE)
+        step = mt5.timeframe_seconds(timeframe)
+        # Widen to bucket boundaries so the first and last buckets get all their M1 bars
+        m1 = self.open(symbol, mt5.TIMEFRAME_M1).slice(
+            None if start is None else start // step * step,
+            None if end is None else -(-end // step) * step)
+        bars = resample(m1, timeframe, complete_only=True)
+        if start is not None:
+            bars = bars[bars['time'] >= start]
+        if end is not None:
+            bars = bars[bars['time'] < end]
+        return bars
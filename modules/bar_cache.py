@@ -0,0 +1,130 @@
+import logging
+import threading
+import numpy as np
+
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('tick_volume', '<u8'),
+    ('spread', '<i4'),
+    ('real_volume', '<u8'),
+])
+
+
+class BarBuffer:
+    # Bars for one (symbol, timeframe), oldest first. Storage is twice the capacity so the
+    # live window is always a contiguous slice; when the end is reached it is moved to the front.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.empty(capacity * 2, dtype=RATES_DTYPE)
+        self.start = 0
+        self.end = 0
+        # True when the broker returned fewer bars than asked for: there is no older history
+        self.exhausted = False
+
+    def __len__(self):
+        return self.end - self.start
+
+    def view(self, n=None):
+        start = self.start if n is None else max(self.start, self.end - n)
+        bars = self.buffer[start:self.end]
+        bars.flags.writeable = False
+        return bars
+
+    def last_time(self):
+        return int(self.buffer['time'][self.end - 1]) if len(self) else None
+
+    def replace(self, rates, requested):
+        self.start = self.end = 0
+        self.append(rates)
+        self.exhausted = len(rates) < requested
+
+    def merge(self, rates):
+        # Bars at or after the first fetched bar (including the still-forming one) are overwritten
+        current = self.buffer['time'][self.start:self.end]
+        self.end = self.start + int(np.searchsorted(current, rates['time'][0], side='left'))
+        self.append(rates)
+
+    def append(self, rates):
+        k = len(rates)
+        if k >= self.capacity:
+            self.buffer[:self.capacity] = rates[-self.capacity:]
+            self.start, self.end = 0, self.capacity
+            return
+        if self.end + k > len(self.buffer):
+            keep = min(len(self), self.capacity - k)
+            self.buffer[:keep] = self.buffer[self.end - keep:self.end]
+            self.start, self.end = 0, keep
+        self.buffer[self.end:self.end + k] = rates
+        self.end += k
+        self.start = max(self.start, self.end - self.capacity)
+
+
+class BarCache:
+    def __init__(self, fetch, refresh_bars=3):
+        # fetch(symbol, timeframe, count) -> structured array of the newest `count` bars, or None
+        self.fetch = fetch
+        self.refresh_bars = refresh_bars
+        # listener(symbol, timeframe) is called whenever a newer bar lands in the cache
+        self.listeners = []
+        self.buffers = {}
+        self.locks = {}
+        self.locks_guard = threading.Lock()
+
+    def _lock(self, key):
+        with self.locks_guard:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def _fetch(self, symbol, timeframe, count):
+        rates = self.fetch(symbol, timeframe, count)
+        if rates is None or len(rates) == 0:
+            raise ValueError(f"Failed to copy rates for {symbol} timeframe {timeframe}")
+        return np.asarray(rates).astype(RATES_DTYPE, copy=False)
+
+    def get(self, symbol, timeframe, n):
+        key = (symbol, timeframe)
+        with self._lock(key):
+            buf = self.buffers.get(key)
+            # Reload when the buffer is too small, or holds fewer than n bars and the broker has more
+            if buf is None or buf.capacity < n or (len(buf) < n and not buf.exhausted):
+                buf = BarBuffer(max(n, buf.capacity if buf is not None else 0))
+                buf.replace(self._fetch(symbol, timeframe, n), n)
+                self.buffers[key] = buf
+                self._notify(symbol, timeframe)
+                return buf.view(n)
+
+            # Widen the request until it overlaps the cached bars, falling back to a full reload
+            last_time = buf.last_time()
+            count = self.refresh_bars
+            while True:
+                rates = self._fetch(symbol, timeframe, min(count, n))
+                if rates['time'][0] <= last_time:
+                    buf.merge(rates)
+                    break
+                if count >= n:
+                    logging.info(f"Bar cache gap for {symbol} timeframe {timeframe}, reloading {n} bars")
+                    buf.replace(rates, n)
+                    break
+                count *= 4
+            if buf.last_time() != last_time:
+                self._notify(symbol, timeframe)
+            return buf.view(n)
+
+    def _notify(self, symbol, timeframe):
+        for listener in self.listeners:
+            listener(symbol, timeframe)
+
+    def peek(self, symbol, timeframe, n=None):
+        # Cached bars only, never fetches; None if nothing is cached for this key
+        key = (symbol, timeframe)
+        with self._lock(key):
+            buf = self.buffers.get(key)
+            return buf.view(n) if buf is not None else None
+
+    def invalidate(self, symbol=None):
+        for key in list(self.buffers):
+            if symbol is None or key[0] == symbol:
+                self.buffers.pop(key, None)
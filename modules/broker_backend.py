@@ -0,0 +1,114 @@
+import os
+from abc import ABC, abstractmethod
+
+BROKER_BACKEND = os.getenv("BROKER_BACKEND", "mt5")
+
+
+class BrokerBackend(ABC):
+    # The subset of the MetaTrader5 module API that MT5Manager uses. Backends return the same
+    # shapes as the terminal: namedtuple-like records and NumPy structured arrays.
+    # Every method is abstract, so a backend missing one fails when it is constructed.
+
+    @abstractmethod
+    def initialize(self, **kwargs):
+        raise NotImplementedError
+
+    @abstractmethod
+    def shutdown(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def last_error(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def account_info(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def symbol_info(self, symbol):
+        raise NotImplementedError
+
+    @abstractmethod
+    def symbol_info_tick(self, symbol):
+        raise NotImplementedError
+
+    @abstractmethod
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        raise NotImplementedError
+
+    @abstractmethod
+    def copy_ticks_from(self, symbol, date_from, count, flags):
+        raise NotImplementedError
+
+    @abstractmethod
+    def history_deals_get(self, date_from, date_to, group=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def positions_get(self, symbol=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def order_send(self, request):
+        raise NotImplementedError
+
+    @abstractmethod
+    def order_calc_margin(self, action, symbol, volume, price):
+        raise NotImplementedError
+
+
+class MT5Backend(BrokerBackend):
+    def __init__(self):
+        import MetaTrader5
+        self.mt5 = MetaTrader5
+
+    def initialize(self, **kwargs):
+        return self.mt5.initialize(**kwargs)
+
+    def shutdown(self):
+        return self.mt5.shutdown()
+
+    def last_error(self):
+        return self.mt5.last_error()
+
+    def account_info(self):
+        return self.mt5.account_info()
+
+    def symbol_info(self, symbol):
+        return self.mt5.symbol_info(symbol)
+
+    def symbol_info_tick(self, symbol):
+        return self.mt5.symbol_info_tick(symbol)
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        return self.mt5.copy_rates_from_pos(symbol, timeframe, start_pos, count)
+
+    def copy_ticks_from(self, symbol, date_from, count, flags):
+        return self.mt5.copy_ticks_from(symbol, date_from, count, flags)
+
+    def history_deals_get(self, date_from, date_to, group=None):
+        if group is None:
+            return self.mt5.history_deals_get(date_from, date_to)
+        return self.mt5.history_deals_get(date_from, date_to, group=group)
+
+    def positions_get(self, symbol=None):
+        if symbol is None:
+            return self.mt5.positions_get()
+        return self.mt5.positions_get(symbol=symbol)
+
+    def order_send(self, request):
+        return self.mt5.order_send(request)
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        return self.mt5.order_calc_margin(action, symbol, volume, price)
+
+
+def create_backend(name=None):
+    name = (name or BROKER_BACKEND).lower()
+    if name == "mt5":
+        return MT5Backend()
+    if name == "simulator":
+        from broker_simulator import SimulatorBackend
+        return SimulatorBackend.from_env()
+    raise ValueError(f"Unknown broker backend {name!r}, expected 'mt5' or 'simulator'")
@@ -0,0 +1,380 @@
+import os
+import time
+import zlib
+import fnmatch
+import threading
+import numpy as np
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import mt5_constants as mt5
+from bar_cache import RATES_DTYPE
+from bar_archive import BarArchive, resample
+from broker_backend import BrokerBackend
+
+SIM_SPEED = float(os.getenv("SIM_SPEED", 1.0))  # simulated seconds per wall-clock second; 0 = manual clock
+SIM_LATENCY_MS = float(os.getenv("SIM_LATENCY_MS", 0))
+SIM_HISTORY_BARS = int(os.getenv("SIM_HISTORY_BARS", 30000))
+SIM_DATA_DIR = os.getenv("SIM_DATA_DIR")
+SIM_SEED = int(os.getenv("SIM_SEED", 0))
+SIM_BALANCE = float(os.getenv("SIM_BALANCE", 10000))
+SIM_LEVERAGE = int(os.getenv("SIM_LEVERAGE", 100))
+
+TICK_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('bid', '<f8'),
+    ('ask', '<f8'),
+    ('last', '<f8'),
+    ('volume', '<u8'),
+    ('time_msc', '<i8'),
+    ('flags', '<u4'),
+    ('volume_real', '<f8'),
+])
+TICKS_PER_BAR = 4
+
+AccountInfo = namedtuple('AccountInfo', ['login', 'balance', 'equity', 'profit', 'margin', 'margin_free',
+                                         'leverage', 'currency'])
+SymbolInfo = namedtuple('SymbolInfo', ['name', 'point', 'digits', 'spread', 'bid', 'ask', 'trade_tick_value',
+                                       'trade_tick_size', 'trade_contract_size', 'volume_min', 'volume_max',
+                                       'volume_step'])
+Tick = namedtuple('Tick', list(TICK_DTYPE.names))
+TradePosition = namedtuple('TradePosition', ['ticket', 'time', 'time_msc', 'type', 'magic', 'volume', 'price_open',
+                                             'sl', 'tp', 'price_current', 'swap', 'profit', 'symbol', 'comment'])
+TradeDeal = namedtuple('TradeDeal', ['ticket', 'order', 'time', 'time_msc', 'type', 'entry', 'magic', 'position_id',
+                                     'reason', 'volume', 'price', 'commission', 'swap', 'profit', 'fee', 'symbol',
+                                     'comment', 'external_id'])
+OrderSendResult = namedtuple('OrderSendResult', ['retcode', 'deal', 'order', 'volume', 'price', 'bid', 'ask',
+                                                 'comment', 'request_id', 'request'])
+
+
+def to_timestamp(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+class SimSymbol:
+    # M1 bars for one symbol: recorded, or a seeded random walk generated on demand as the clock advances
+    def __init__(self, name, start_time, history_bars, seed, recorded=None):
+        self.name = name
+        jpy = 'JPY' in name.upper()
+        self.point = 0.001 if jpy else 0.00001
+        self.digits = 3 if jpy else 5
+        self.spread_points = 10
+        self.rng = np.random.default_rng([seed, zlib.crc32(name.encode())])
+        self.recorded = recorded is not None
+        if self.recorded:
+            self.bars = np.asarray(recorded).astype(RATES_DTYPE)
+            self.length = len(self.bars)
+        else:
+            self.bars = np.zeros(max(1024, history_bars * 2), dtype=RATES_DTYPE)
+            self.length = 0
+            self.price = (120.0 if jpy else 1.0) * self.rng.uniform(0.8, 1.5)
+            first = int(start_time // 60 * 60) - history_bars * 60
+            self.generate(first, history_bars + 1)
+
+    def generate(self, first_time, count):
+        if self.length + count > len(self.bars):
+            grown = np.zeros(max(len(self.bars) * 2, self.length + count), dtype=RATES_DTYPE)
+            grown[:self.length] = self.bars[:self.length]
+            self.bars = grown
+        steps = self.rng.normal(0, 2e-4, count) * self.price
+        close = self.price + np.cumsum(steps)
+        open_ = np.r_[self.price, close[:-1]]
+        wick = np.abs(self.rng.normal(0, 1e-4, (2, count))) * self.price
+        new = self.bars[self.length:self.length + count]
+        new['time'] = first_time + np.arange(count) * 60
+        new['open'] = open_
+        new['close'] = close
+        new['high'] = np.maximum(open_, close) + wick[0]
+        new['low'] = np.minimum(open_, close) - wick[1]
+        new['tick_volume'] = TICKS_PER_BAR
+        new['spread'] = self.spread_points
+        self.price = close[-1]
+        self.length += count
+
+    def visible(self, now):
+        # Number of M1 bars opened at or before `now`; the last one is the bar in progress
+        if not self.recorded:
+            last = int(self.bars['time'][self.length - 1])
+            due = int(now // 60 * 60)
+            if due > last:
+                self.generate(last + 60, (due - last) // 60)
+        return int(np.searchsorted(self.bars['time'][:self.length], now, side='right'))
+
+
+class SimulatorBackend(BrokerBackend):
+    def __init__(self, speed=SIM_SPEED, latency_ms=SIM_LATENCY_MS, history_bars=SIM_HISTORY_BARS,
+                 data_dir=SIM_DATA_DIR, seed=SIM_SEED, balance=SIM_BALANCE, leverage=SIM_LEVERAGE,
+                 start_time=None, recorded=None):
+        self.speed = speed
+        self.latency = latency_ms / 1000
+        self.history_bars = history_bars
+        self.data_dir = data_dir
+        self.seed = seed
+        self.leverage = leverage
+        self.recorded = dict(recorded or {})
+        if start_time is None and self.recorded:
+            start_time = min(int(bars['time'][min(history_bars, len(bars) - 1)]) for bars in self.recorded.values())
+        self.start_time = to_timestamp(start_time) if start_time is not None else time.time() // 60 * 60
+        self.started = time.monotonic()
+        self.offset = 0.0
+        self.symbols = {}
+        self.balance = balance
+        self.positions = {}
+        self.deals = []
+        self.next_ticket = 1
+        self.stops_minute = None
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_env(cls):
+        return cls()
+
+    # Clock
+
+    def now(self):
+        return self.start_time + self.offset + (time.monotonic() - self.started) * self.speed
+
+    def advance(self, seconds):
+        with self.lock:
+            self.offset += seconds
+            self._check_stops()
+
+    def _call(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _symbol(self, name):
+        sym = self.symbols.get(name)
+        if sym is None:
+            recorded = self.recorded.get(name)
+            if recorded is None and self.data_dir:
+                path = os.path.join(self.data_dir, f"{name}.npy")
+                archive = BarArchive(self.data_dir)
+                if os.path.exists(path):
+                    recorded = np.load(path)
+                elif archive.has(name, mt5.TIMEFRAME_M1):
+                    # M1 history synced by the live bot's bar archive
+                    recorded = archive.bars(name, mt5.TIMEFRAME_M1)
+            sym = self.symbols[name] = SimSymbol(name, self.start_time, self.history_bars, self.seed, recorded)
+        return sym
+
+    def _quote(self, sym, now):
+        n = sym.visible(now)
+        bar = sym.bars[max(n - 1, 0)]
+        bid = float(bar['close'])
+        return bid, bid + sym.spread_points * sym.point
+
+    # Terminal API
+
+    def initialize(self, **kwargs):
+        return True
+
+    def shutdown(self):
+        return True
+
+    def last_error(self):
+        return (1, 'Success')
+
+    def account_info(self):
+        self._call()
+        with self.lock:
+            self._check_stops()
+            return self._account()
+
+    def symbol_info(self, symbol):
+        self._call()
+        with self.lock:
+            sym = self._symbol(symbol)
+            bid, ask = self._quote(sym, self.now())
+            return SymbolInfo(symbol, sym.point, sym.digits, sym.spread_points, bid, ask, 1.0, sym.point,
+                              100_000, 0.01, 100.0, 0.01)
+
+    def symbol_info_tick(self, symbol):
+        self._call()
+        with self.lock:
+            ticks = self._ticks(self._symbol(symbol), self.now() - 60, None)
+            return Tick(*ticks[-1].tolist()) if len(ticks) else None
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        self._call()
+        with self.lock:
+            sym = self._symbol(symbol)
+            n = sym.visible(self.now())
+            step = mt5.timeframe_seconds(timeframe)
+            per_bar = step // 60
+            wanted = start_pos + count
+            m1 = sym.bars[max(0, n - (wanted + 1) * per_bar):n]
+            if len(m1) == 0:
+                return None
+            out = resample(m1, timeframe)
+            out = out[max(0, len(out) - wanted):len(out) - start_pos]
+            return out
+
+    def _ticks(self, sym, date_from, count):
+        # Four synthetic ticks per M1 bar (open, first extreme, second extreme, close) at 15s spacing
+        now = self.now()
+        n = sym.visible(now)
+        first = max(0, int(np.searchsorted(sym.bars['time'][:n], date_from // 60 * 60, side='left')))
+        if count is not None:
+            n = min(n, first + count // TICKS_PER_BAR + 2)
+        bars = sym.bars[first:n]
+        up = bars['close'] >= bars['open']
+        prices = np.stack([bars['open'], np.where(up, bars['low'], bars['high']),
+                           np.where(up, bars['high'], bars['low']), bars['close']], axis=1).ravel()
+        times = (bars['time'][:, None] + np.arange(TICKS_PER_BAR) * 15).ravel()
+        keep = (times >= date_from) & (times <= now)
+        ticks = np.zeros(int(keep.sum()), dtype=TICK_DTYPE)
+        ticks['time'] = times[keep]
+        ticks['time_msc'] = times[keep] * 1000
+        ticks['bid'] = prices[keep]
+        ticks['ask'] = prices[keep] + sym.spread_points * sym.point
+        ticks['last'] = prices[keep]
+        ticks['volume'] = 1
+        ticks['volume_real'] = 1.0
+        return ticks if count is None else ticks[:count]
+
+    def copy_ticks_from(self, symbol, date_from, count, flags):
+        self._call()
+        with self.lock:
+            return self._ticks(self._symbol(symbol), to_timestamp(date_from), count)
+
+    def history_deals_get(self, date_from, date_to, group=None):
+        self._call()
+        with self.lock:
+            self._check_stops()
+            start, end = to_timestamp(date_from), to_timestamp(date_to)
+            return tuple(deal for deal in self.deals if start <= deal.time <= end
+                         and (group is None or fnmatch.fnmatch(deal.symbol, group)))
+
+    def positions_get(self, symbol=None):
+        self._call()
+        with self.lock:
+            self._check_stops()
+            return tuple(self._position_record(p) for p in self.positions.values()
+                         if symbol is None or p['symbol'] == symbol)
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        self._call()
+        return volume * 100_000 * price / self.leverage
+
+    def order_send(self, request):
+        self._call()
+        with self.lock:
+            self._check_stops()
+            now = self.now()
+            symbol = request.get('symbol')
+            if request.get('action') != mt5.TRADE_ACTION_DEAL or symbol is None:
+                return self._result(mt5.TRADE_RETCODE_INVALID, request, comment='Unsupported request')
+            sym = self._symbol(symbol)
+            bid, ask = self._quote(sym, now)
+            volume = float(request.get('volume', 0))
+            if not 0.01 <= volume <= 100.0:
+                return self._result(mt5.TRADE_RETCODE_INVALID_VOLUME, request, comment='Invalid volume')
+
+            if 'position' in request:
+                position = self.positions.get(request['position'])
+                if position is None:
+                    return self._result(mt5.TRADE_RETCODE_INVALID, request, comment='Position not found')
+                price = bid if position['type'] == mt5.POSITION_TYPE_BUY else ask
+                deal = self._close(position, price, now, request.get('comment', ''))
+                return self._result(mt5.TRADE_RETCODE_DONE, request, deal.ticket, position['ticket'],
+                                    volume, price, bid, ask)
+
+            buy = request.get('type') == mt5.ORDER_TYPE_BUY
+            price = ask if buy else bid
+            margin = volume * 100_000 * price / self.leverage
+            account = self._account()
+            if margin > account.margin_free:
+                return self._result(mt5.TRADE_RETCODE_NO_MONEY, request, comment='No money')
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            self.positions[ticket] = {
+                'ticket': ticket, 'symbol': symbol, 'time': now,
+                'type': mt5.POSITION_TYPE_BUY if buy else mt5.POSITION_TYPE_SELL,
+                'volume': volume, 'price_open': price, 'sl': request.get('sl', 0.0) or 0.0,
+                'tp': request.get('tp', 0.0) or 0.0, 'magic': request.get('magic', 0),
+                'comment': request.get('comment', ''), 'margin': margin, 'checked': now,
+            }
+            deal = self._deal(self.positions[ticket], price, now, mt5.DEAL_ENTRY_IN, 0.0, request.get('comment', ''))
+            return self._result(mt5.TRADE_RETCODE_DONE, request, deal.ticket, ticket, volume, price, bid, ask)
+
+    # Book keeping
+
+    def _account(self):
+        profit = sum(self._position_profit(p) for p in self.positions.values())
+        margin = sum(p['margin'] for p in self.positions.values())
+        equity = self.balance + profit
+        return AccountInfo(0, self.balance, equity, profit, margin, equity - margin, self.leverage, 'USD')
+
+    def _result(self, retcode, request, deal=0, order=0, volume=0.0, price=0.0, bid=0.0, ask=0.0, comment='done'):
+        return OrderSendResult(retcode, deal, order, volume, price, bid, ask, comment, 0, request)
+
+    def _position_profit(self, position, price=None):
+        sym = self._symbol(position['symbol'])
+        if price is None:
+            bid, ask = self._quote(sym, self.now())
+            price = bid if position['type'] == mt5.POSITION_TYPE_BUY else ask
+        direction = 1 if position['type'] == mt5.POSITION_TYPE_BUY else -1
+        return (price - position['price_open']) * direction * position['volume'] / sym.point
+
+    def _position_record(self, position):
+        sym = self._symbol(position['symbol'])
+        bid, ask = self._quote(sym, self.now())
+        current = bid if position['type'] == mt5.POSITION_TYPE_BUY else ask
+        t = int(position['time'])
+        return TradePosition(position['ticket'], t, t * 1000, position['type'], position['magic'],
+                             position['volume'], position['price_open'], position['sl'], position['tp'],
+                             current, 0.0, self._position_profit(position, current), position['symbol'],
+                             position['comment'])
+
+    def _deal(self, position, price, when, entry, profit, comment):
+        buy = position['type'] == mt5.POSITION_TYPE_BUY
+        deal_type = mt5.DEAL_TYPE_BUY if buy == (entry == mt5.DEAL_ENTRY_IN) else mt5.DEAL_TYPE_SELL
+        ticket = self.next_ticket
+        self.next_ticket += 1
+        deal = TradeDeal(ticket, position['ticket'], int(when), int(when * 1000), deal_type, entry,
+                         position['magic'], position['ticket'], 0, position['volume'], price, 0.0, 0.0,
+                         profit, 0.0, position['symbol'], comment, '')
+        self.deals.append(deal)
+        return deal
+
+    def _close(self, position, price, when, comment):
+        profit = self._position_profit(position, price)
+        self.balance += profit
+        del self.positions[position['ticket']]
+        return self._deal(position, price, when, mt5.DEAL_ENTRY_OUT, profit, comment)
+
+    def _check_stops(self):
+        # Close positions whose stop loss or take profit was touched by bars since the last check.
+        # Bars are whole minutes, so there is nothing new to check until the minute changes.
+        now = self.now()
+        if now // 60 == self.stops_minute:
+            return
+        self.stops_minute = now // 60
+        for position in list(self.positions.values()):
+            sl, tp = position['sl'], position['tp']
+            if not sl and not tp:
+                continue
+            sym = self._symbol(position['symbol'])
+            n = sym.visible(now)
+            first = int(np.searchsorted(sym.bars['time'][:n], position['checked'] // 60 * 60, side='left'))
+            bars = sym.bars[first:n]
+            position['checked'] = now
+            if len(bars) == 0:
+                continue
+            spread = sym.spread_points * sym.point
+            if position['type'] == mt5.POSITION_TYPE_BUY:
+                hit_sl = bars['low'] <= sl if sl else np.zeros(len(bars), bool)
+                hit_tp = bars['high'] >= tp if tp else np.zeros(len(bars), bool)
+            else:
+                hit_sl = bars['high'] + spread >= sl if sl else np.zeros(len(bars), bool)
+                hit_tp = bars['low'] + spread <= tp if tp else np.zeros(len(bars), bool)
+            hits = np.flatnonzero(hit_sl | hit_tp)
+            if len(hits):
+                i = hits[0]
+                price, reason = (sl, 'sl') if hit_sl[i] else (tp, 'tp')
+                self._close(position, price, max(float(bars['time'][i]), position['time']), f"[{reason}]")
@@ -1,19 +1,120 @@
-import requests
+import os
+import csv
+import json
+import time
+import bisect
 import logging
-from datetime import datetime, timedelta
+import threading
+import requests
+from datetime import datetime, timedelta, timezone
+
+CALENDAR_URL = "https://economic-calendar.tradingview.com/events"
+CALENDAR_FILE = os.getenv("ECONOMIC_CALENDAR_FILE")
+CALENDAR_REFRESH_MINUTES = float(os.getenv("CALENDAR_REFRESH_MINUTES", 60))
+EVENT_WINDOW_MINUTES = float(os.getenv("EVENT_WINDOW_MINUTES", 30))
+ALL_CURRENCIES = '*'
+
+
+def parse_event_time(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
 
 class EconomicCalendar:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, source_file=CALENDAR_FILE, refresh_minutes=CALENDAR_REFRESH_MINUTES,
+                 auto_refresh=True):
         self.api_key = api_key
+        self.source_file = source_file
+        self.refresh_interval = refresh_minutes * 60
+        # {currency: sorted event timestamps}; ALL_CURRENCIES holds every event
+        self.index = {ALL_CURRENCIES: []}
+        self.loaded_at = 0
+        self.session = requests.Session()
+        self.refresh_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        if auto_refresh:
+            self.refresh_thread = threading.Thread(target=self.refresh_loop, daemon=True)
+            self.refresh_thread.start()
+
+    def fetch_events(self):
+        if self.source_file:
+            return self.load_file(self.source_file)
+        now = datetime.utcnow()
+        params = {
+            'minImportance': 1,
+            'from': now.strftime('%Y-%m-%dT00:00:00.000Z'),
+            'to': (now + timedelta(days=1)).strftime('%Y-%m-%dT23:59:59.000Z'),
+        }
+        response = self.session.get(CALENDAR_URL, params=params, timeout=10,
+                                    headers={'Origin': 'https://www.tradingview.com'})
+        response.raise_for_status()
+        data = response.json()
+        return data.get('result', []) if isinstance(data, dict) else data
+
+    @staticmethod
+    def load_file(path):
+        # JSON: a list of events (or {"result": [...]}); CSV: a header row with at least date,currency
+        with open(path, 'r', newline='') as f:
+            if path.lower().endswith('.csv'):
+                return list(csv.DictReader(f))
+            data = json.load(f)
+        return data.get('result', []) if isinstance(data, dict) else data
+
+    def build_index(self, events):
+        index = {ALL_CURRENCIES: []}
+        for event in events:
+            try:
+                if int(event.get('importance', 1)) < 1:
+                    continue
+                ts = parse_event_time(event['date'])
+            except (KeyError, TypeError, ValueError) as e:
+                logging.warning(f"Skipping malformed calendar event {event}: {e}")
+                continue
+            index[ALL_CURRENCIES].append(ts)
+            currency = (event.get('currency') or '').upper()
+            if currency:
+                index.setdefault(currency, []).append(ts)
+        for times in index.values():
+            times.sort()
+        return index
+
+    def refresh(self):
+        with self.refresh_lock:
+            try:
+                index = self.build_index(self.fetch_events())
+            except Exception as e:
+                logging.error(f"Economic calendar error: {e}")
+                return False
+            # Swapped in one assignment so readers never see a partial index
+            self.index = index
+            self.loaded_at = time.time()
+            logging.info(f"Economic calendar loaded {len(index[ALL_CURRENCIES])} high-impact events")
+            return True
+
+    def refresh_loop(self):
+        while not self.stop_event.is_set():
+            self.refresh()
+            self.stop_event.wait(self.refresh_interval)
+
+    def stop(self):
+        self.stop_event.set()
 
-    def is_high_impact_event_now(self):
-        try:
-            now = datetime.utcnow()
-            url = f"https://economic-calendar.tradingview.com/events?minImportance=high&from={now.strftime('%Y-%m-%d')}&to={(now + timedelta(hours=1)).strftime('%Y-%m-%d')}"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            events = response.json()
-            return len(events) > 0
-        except Exception as e:
-            logging.error(f"Economic calendar error: {e}")
-            return False
+    def is_high_impact_event_now(self, currencies=None, window_minutes=EVENT_WINDOW_MINUTES, now=None):
+        # True if a high-impact event for any of `currencies` (all currencies if None) falls
+        # within +/- window_minutes of now. Reads only the in-memory index.
+        now = time.time() if now is None else now
+        window = window_minutes * 60
+        index = self.index
+        keys = [ALL_CURRENCIES] if currencies is None else [c.upper() for c in currencies]
+        for key in keys:
+            times = index.get(key)
+            if not times:
+                continue
+            i = bisect.bisect_left(times, now - window)
+            if i < len(times) and times[i] <= now + window:
+                return True
+        return False
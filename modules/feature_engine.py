@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from instrumentation import timed
+
+FEATURES = ['return', 'ma_fast', 'ma_slow', 'rsi', 'atr', 'macd', 'macd_signal', 'volatility', 'spread']
+MA_FAST, MA_SLOW = 9, 21
+RSI_PERIOD, ATR_PERIOD = 14, 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+# Leading rows with undefined features (ma_slow needs MA_SLOW bars); dropped by prepare_features
+WARMUP_BARS = MA_SLOW - 1
+
+
+def rolling_sum(x, period, out):
+    if x.shape[-1] < period:
+        out[...] = np.nan
+        return out
+    total = np.cumsum(x, axis=-1)
+    out[..., :period - 1] = np.nan
+    out[..., period - 1] = total[..., period - 1]
+    np.subtract(total[..., period:], total[..., :-period], out=out[..., period:])
+    return out
+
+
+def rolling_mean(x, period, out):
+    rolling_sum(x, period, out)
+    out /= period
+    return out
+
+
+def ema(x, span):
+    alpha = 2 / (span + 1)
+    y, _ = lfilter([alpha], [1, alpha - 1], x, axis=-1, zi=(1 - alpha) * x[..., :1])
+    return y
+
+
+@timed('feature_compute_seconds')
+def compute_features(open_, high, low, close, out=None):
+    # Inputs are (n_bars,) or (n_symbols, n_bars); returns (..., n_bars, len(FEATURES)) float64
+    open_, high, low, close = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    n = close.shape[-1]
+    if out is None:
+        out = np.empty(close.shape + (len(FEATURES),))
+    if n == 0:
+        return out
+    scratch = np.empty(close.shape)
+    prev_close = close[..., :-1]
+
+    ret, ma_fast, ma_slow, rsi, atr, macd, signal, volatility, spread = (out[..., i] for i in range(len(FEATURES)))
+    ret[..., 0] = np.nan
+    np.divide(close[..., 1:], prev_close, out=ret[..., 1:])
+    ret[..., 1:] -= 1
+    rolling_mean(close, MA_FAST, scratch)
+    ma_fast[...] = scratch
+    rolling_mean(close, MA_SLOW, scratch)
+    ma_slow[...] = scratch
+
+    # RSI: the first delta counts as zero, flat windows give 0 and loss-free windows 100.
+    # Zero windows are detected from exact integer counts rather than the float sums.
+    delta = np.zeros(close.shape)
+    np.subtract(close[..., 1:], prev_close, out=delta[..., 1:])
+    gain = rolling_mean(np.maximum(delta, 0), RSI_PERIOD, np.empty(close.shape))
+    loss = rolling_mean(np.maximum(-delta, 0), RSI_PERIOD, np.empty(close.shape))
+    ups = rolling_sum(delta > 0, RSI_PERIOD, np.empty(close.shape))
+    downs = rolling_sum(delta < 0, RSI_PERIOD, np.empty(close.shape))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi[...] = 100 - 100 / (1 + gain / loss)
+    rsi[...] = np.where(downs == 0, np.where(ups > 0, 100.0, 0.0), rsi)
+    rsi[..., :RSI_PERIOD - 1] = 0
+
+    np.subtract(high, low, out=volatility)
+    tr = volatility.copy()
+    np.maximum(tr[..., 1:], np.abs(high[..., 1:] - prev_close), out=tr[..., 1:])
+    np.maximum(tr[..., 1:], np.abs(low[..., 1:] - prev_close), out=tr[..., 1:])
+    rolling_mean(tr, ATR_PERIOD, scratch)
+    scratch[..., :ATR_PERIOD - 1] = 0
+    atr[...] = scratch
+
+    macd[...] = ema(close, MACD_FAST) - ema(close, MACD_SLOW)
+    signal[...] = ema(np.ascontiguousarray(macd), MACD_SIGNAL)
+
+    spread[..., 0] = np.nan
+    np.subtract(open_[..., 1:], prev_close, out=spread[..., 1:])
+    return out
+
+
+def compute_features_batch(bars_list, n=None):
+    # Stacks the last n bars of each symbol's structured array into (n_symbols, n) and computes them together
+    n = n or min(len(bars) for bars in bars_list)
+    stacked = {col: np.stack([bars[col][-n:] for bars in bars_list]) for col in ('open', 'high', 'low', 'close')}
+    return compute_features(stacked['open'], stacked['high'], stacked['low'], stacked['close'])
+
+
+def prepare_features(df):
+    # Drop-in for the pandas pipeline: feature columns appended, warm-up rows dropped, next-bar target added
+    matrix = compute_features(df['open'].to_numpy(), df['high'].to_numpy(),
+                              df['low'].to_numpy(), df['close'].to_numpy())
+    df = df.iloc[WARMUP_BARS:].copy()
+    df[FEATURES] = matrix[WARMUP_BARS:]
+    df['target'] = (df['close'].shift(-1) > df['close']).astype(int)
+    return df
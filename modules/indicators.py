@@ -1,3 +1,5 @@
+import math
+from collections import deque
 import pandas as pd
 import numpy as np
 
@@ -27,3 +29,88 @@ class Indicators:
         macd = exp1 - exp2
         signal_line = macd.ewm(span=signal, adjust=False).mean()
         return macd, signal_line
+
+
+class StreamingSMA:
+    def __init__(self, period):
+        self.period = period
+        self.window = deque()
+        self.total = 0.0
+        self.nonzero = 0
+        self.updates = 0
+
+    def update(self, value):
+        self.window.append(value)
+        self.total += value
+        self.nonzero += value != 0
+        if len(self.window) > self.period:
+            old = self.window.popleft()
+            self.total -= old
+            self.nonzero -= old != 0
+        # Re-sum once per window so subtraction error cannot accumulate
+        self.updates += 1
+        if self.updates % self.period == 0:
+            self.total = math.fsum(self.window)
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.window) < self.period:
+            return np.nan
+        return self.total / self.period if self.nonzero else 0.0
+
+
+class StreamingEMA:
+    def __init__(self, span):
+        self.alpha = 2 / (span + 1)
+        self.value = None
+
+    def update(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class StreamingRSI:
+    def __init__(self, period=14):
+        self.gain = StreamingSMA(period)
+        self.loss = StreamingSMA(period)
+        self.prev_close = None
+
+    def update(self, close):
+        delta = 0.0 if self.prev_close is None else close - self.prev_close
+        self.prev_close = close
+        gain = self.gain.update(delta if delta > 0 else 0.0)
+        loss = self.loss.update(-delta if delta < 0 else 0.0)
+        if np.isnan(gain) or (gain == 0 and loss == 0):
+            return 0.0
+        if loss == 0:
+            return 100.0
+        return 100 - (100 / (1 + gain / loss))
+
+
+class StreamingATR:
+    def __init__(self, period=14):
+        self.tr = StreamingSMA(period)
+        self.prev_close = None
+
+    def update(self, high, low, close):
+        tr = high - low
+        if self.prev_close is not None:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        atr = self.tr.update(tr)
+        return 0.0 if np.isnan(atr) else atr
+
+
+class StreamingMACD:
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = StreamingEMA(fast)
+        self.slow = StreamingEMA(slow)
+        self.signal = StreamingEMA(signal)
+
+    def update(self, close):
+        macd = self.fast.update(close) - self.slow.update(close)
+        return macd, self.signal.update(macd)
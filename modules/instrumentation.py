@@ -0,0 +1,256 @@
+import os
+import sys
+import time
+import logging
+import functools
+import threading
+from collections import Counter
+
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "trading_")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Log-linear buckets over integer microseconds, HDR style: values below 2**(SUB_BITS + 1) get
+# exact buckets, above that every power of two is split into 2**SUB_BITS buckets (~3% error)
+SUB_BITS = 5
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def bucket_index(micros):
+    shift = max(micros.bit_length() - SUB_BITS - 1, 0)
+    return (shift << SUB_BITS) + (micros >> shift)
+
+
+def bucket_upper(index):
+    # Highest value that lands in the bucket
+    shift = max((index >> SUB_BITS) - 1, 0)
+    return ((index - (shift << SUB_BITS) + 1) << shift) - 1
+
+
+class Histogram:
+    # Latency histogram in seconds, recorded at microsecond resolution. Recording is a few integer
+    # ops and a list increment; quantiles are only computed when the histogram is read.
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        index = bucket_index(int(seconds * 1e6)) if seconds > 0 else 0
+        with self.lock:
+            if index >= len(self.counts):
+                self.counts.extend([0] * (index + 1 - len(self.counts)))
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def merge(self, other):
+        with other.lock:
+            counts, count, total, peak = list(other.counts), other.count, other.sum, other.max
+        with self.lock:
+            if len(counts) > len(self.counts):
+                self.counts.extend([0] * (len(counts) - len(self.counts)))
+            for index, n in enumerate(counts):
+                self.counts[index] += n
+            self.count += count
+            self.sum += total
+            self.max = max(self.max, peak)
+        return self
+
+    def quantiles(self, qs=QUANTILES):
+        with self.lock:
+            counts, count, peak = list(self.counts), self.count, self.max
+        values = []
+        for q in qs:
+            if count == 0:
+                values.append(0.0)
+                continue
+            rank = max(1, int(q * count + 0.5))
+            seen = 0
+            for index, n in enumerate(counts):
+                seen += n
+                if seen >= rank:
+                    values.append(min(bucket_upper(index) / 1e6, peak))
+                    break
+        return values
+
+    def snapshot(self):
+        p50, p90, p99, p999 = self.quantiles()
+        return {'count': self.count, 'mean': self.sum / self.count if self.count else 0.0,
+                'p50': p50, 'p90': p90, 'p99': p99, 'p999': p999, 'max': self.max}
+
+
+class Registry:
+    def __init__(self, prefix=METRICS_PREFIX):
+        self.prefix = prefix
+        self.histograms = {}
+        self.counters = {}
+        # collector() -> iterable of (name, type, labels dict, value) read at render time
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def histogram(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        hist = self.histograms.get(key)
+        if hist is None:
+            with self.lock:
+                hist = self.histograms.setdefault(key, Histogram())
+        return hist
+
+    def observe(self, name, seconds, **labels):
+        self.histogram(name, **labels).record(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self, name, by):
+        # Histograms of `name` merged per value of label `by` (e.g. every symbol's 'fetch' into one)
+        merged = {}
+        with self.lock:
+            histograms = list(self.histograms.items())
+        for (hist_name, labels), hist in histograms:
+            if hist_name == name:
+                group = dict(labels).get(by)
+                merged.setdefault(group, Histogram()).merge(hist)
+        return {group: hist.snapshot() for group, hist in merged.items()}
+
+    def render(self):
+        # Prometheus text exposition format (0.0.4); histograms are exported as summaries.
+        # Samples are grouped per metric family, as the format requires.
+        families = {}
+        # Snapshot under the lock; another thread may be registering a histogram or counter
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        def sample(name, kind, labels, value, suffix=""):
+            family = families.setdefault(self.prefix + name, (kind, []))
+            family[1].append(f"{self.prefix}{name}{suffix}{format_labels(labels)} {value:.9g}")
+
+        for (name, labels), hist in histograms:
+            labels = dict(labels)
+            for q, value in zip(QUANTILES, hist.quantiles()):
+                sample(name, 'summary', dict(labels, quantile=str(q)), value)
+            sample(name, 'summary', labels, hist.sum, "_sum")
+            sample(name, 'summary', labels, hist.count, "_count")
+        for (name, labels), value in counters:
+            sample(name, 'counter', dict(labels), value)
+        for collector in self.collectors:
+            try:
+                for name, kind, labels, value in collector():
+                    sample(name, kind, labels, value)
+            except Exception as e:
+                logging.error(f"Metrics collector {collector.__name__} failed: {e}")
+
+        lines = []
+        for name, (kind, samples) in families.items():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+METRICS = Registry()
+
+
+class timer:
+    # with timer('stage_seconds', stage='fetch', symbol=symbol): ...
+    __slots__ = ('hist', 'start')
+
+    def __init__(self, name, registry=METRICS, **labels):
+        self.hist = registry.histogram(name, **labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.record(time.perf_counter() - self.start)
+        return False
+
+
+def timed(name, registry=METRICS, **labels):
+    # Decorator form of timer; labels are fixed when the function is decorated
+    def decorator(func):
+        hist = registry.histogram(name, **labels)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                hist.record(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class SamplingProfiler:
+    # Samples every thread's Python stack at a fixed interval while running and counts
+    # collapsed stacks ("thread;outer;...;inner count"), the input flamegraph.pl and speedscope take.
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while self.running:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(frames))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def dump(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
+        logging.info(f"Wrote {self.samples} profile samples ({len(self.stacks)} stacks) to {path}")
+        return path
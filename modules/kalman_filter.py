@@ -0,0 +1,50 @@
+import numpy as np
+from scipy.signal import lfilter
+
+
+class OnlineKalmanFilter:
+    # 1-D random walk: x_t = x_{t-1} + w (variance Q), z_t = x_t + v (variance R).
+    # Same model and initial state as the pykalman filter TradeExecutor used.
+
+    def __init__(self, initial_state_mean=0.0, initial_state_covariance=1.0,
+                 observation_covariance=1.0, transition_covariance=0.01):
+        self.initial_state_mean = initial_state_mean
+        self.initial_state_covariance = initial_state_covariance
+        self.R = observation_covariance
+        self.Q = transition_covariance
+        self.reset()
+
+    def reset(self):
+        self.mean = self.initial_state_mean
+        self.covariance = self.initial_state_covariance
+        self.count = 0
+        self.last_time = None
+
+    def update(self, observation):
+        # The first observation corrects the initial state directly, as pykalman does
+        predicted_covariance = self.covariance + self.Q if self.count else self.covariance
+        gain = predicted_covariance / (predicted_covariance + self.R)
+        self.mean += gain * (observation - self.mean)
+        self.covariance = (1 - gain) * predicted_covariance
+        self.count += 1
+        return self.mean
+
+    def update_many(self, observations, tol=1e-12):
+        # The gain sequence does not depend on the data. Step it until it converges, then
+        # run the remaining steady-state recursion in one vectorized lfilter call.
+        observations = np.asarray(observations, dtype=np.float64)
+        i = 0
+        n = len(observations)
+        while i < n:
+            previous = self.covariance
+            self.update(observations[i])
+            i += 1
+            if abs(self.covariance - previous) < tol:
+                break
+        if i < n:
+            predicted_covariance = self.covariance + self.Q
+            gain = predicted_covariance / (predicted_covariance + self.R)
+            means, _ = lfilter([gain], [1, gain - 1], observations[i:], zi=[(1 - gain) * self.mean])
+            self.mean = float(means[-1])
+            self.count += n - i
+        return self.mean
@@ -1,42 +1,93 @@
 import os
 import json
+import time
 import logging
+import threading
 import joblib
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split, TimeSeriesSplit, GridSearchCV
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+import mt5_constants as mt5
+from concurrent.futures import ThreadPoolExecutor
 
-from indicators import Indicators  # import your indicators module
+from feature_engine import FEATURES, prepare_features
+from training_scheduler import TrainingScheduler, TRAIN_CORE_BUDGET, fit_model
+from model_cache import ModelCache, MODEL_CACHE_SIZE
+from tree_compiler import CompiledForest
+from utils import CallError
+from instrumentation import timer
 
 SYMBOLS = os.getenv("SYMBOLS", "EURUSD,GBPUSD,USDJPY").split(",")
 MODEL_VERSION = os.getenv("MODEL_VERSION", "v2")
+TRAIN_BARS = int(os.getenv("TRAIN_BARS", 50_000))  # newest archived M15 bars used per fit
+TRAIN_RETRY_SECONDS = float(os.getenv("TRAIN_RETRY_SECONDS", 300))  # first backoff after a failed train, doubles
+TRAIN_RETRY_MAX_SECONDS = float(os.getenv("TRAIN_RETRY_MAX_SECONDS", 6 * 3600))
+COMPILED_INFERENCE = os.getenv("COMPILED_INFERENCE", "false").lower() in ("1", "true", "yes")
 
 class MLModelManager:
     def __init__(self, mt5_manager):
         self.mt5_manager = mt5_manager
-        self.models = {}
+        # Models are loaded on first use and evicted least-recently-used; nothing is read at startup
+        self.models = ModelCache(self.load_model, max_size=MODEL_CACHE_SIZE or len(SYMBOLS))
         self.model_metadata = {}
-        self.load_all_models()
+        self.training = set()
+        # symbol -> (consecutive failures, monotonic time before which no retrain is scheduled)
+        self.train_failures = {}
+        self.training_lock = threading.Lock()
+        self.training_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="train")
+
+    def load_model(self, symbol):
+        model_file = f"ml_model_{symbol}_{MODEL_VERSION}.pkl"
+        meta_file = f"ml_model_{symbol}_{MODEL_VERSION}.meta"
+        if not os.path.exists(model_file):
+            self.schedule_training(symbol)
+            return None
+        try:
+            # Fully loaded: sklearn copies tree arrays on unpickling, so mmap_mode would not help.
+            # Memory is bounded by the number of models the cache keeps.
+            model = joblib.load(model_file)
+            if os.path.exists(meta_file):
+                with open(meta_file, 'r') as f:
+                    self.model_metadata[symbol] = json.load(f)
+            logging.info(f"Loaded model for {symbol} (version {MODEL_VERSION})")
+            return self.inference_model(model)
+        except Exception as e:
+            logging.error(f"Failed to load model for {symbol}: {e}")
+            self.schedule_training(symbol)
+            return None
 
     def load_all_models(self):
-        for symbol in SYMBOLS:
-            model_file = f"ml_model_{symbol}_{MODEL_VERSION}.pkl"
-            meta_file = f"ml_model_{symbol}_{MODEL_VERSION}.meta"
-            if os.path.exists(model_file):
-                try:
-                    model = joblib.load(model_file)
-                    self.models[symbol] = model
-                    if os.path.exists(meta_file):
-                        with open(meta_file, 'r') as f:
-                            self.model_metadata[symbol] = json.load(f)
-                    logging.info(f"Loaded model for {symbol} (version {MODEL_VERSION})")
-                except Exception as e:
-                    logging.error(f"Failed to load model for {symbol}: {e}")
-                    self.train_ml_model(symbol)
-            else:
-                self.train_ml_model(symbol)
+        # Optional warm-up; loads at most as many models as the cache holds
+        for symbol in SYMBOLS[:self.models.max_size]:
+            self.models.get(symbol)
+
+    def schedule_training(self, symbol):
+        with self.training_lock:
+            if symbol in self.training:
+                return
+            failures, retry_at = self.train_failures.get(symbol, (0, 0.0))
+            if time.monotonic() < retry_at:
+                return
+            self.training.add(symbol)
+        logging.info(f"No usable model for {symbol}, training in the background")
+        self.training_pool.submit(self._train_in_background, symbol)
+
+    def _train_in_background(self, symbol):
+        model = None
+        try:
+            model = self.train_ml_model(symbol)
+        except Exception as e:
+            logging.error(f"Background training failed for {symbol}: {e}")
+        finally:
+            with self.training_lock:
+                self.training.discard(symbol)
+                if model is not None:
+                    self.train_failures.pop(symbol, None)
+                else:
+                    # Back off so a symbol with unusable history is not retrained on every prediction
+                    failures = self.train_failures.get(symbol, (0, 0.0))[0] + 1
+                    wait = min(TRAIN_RETRY_SECONDS * 2 ** (failures - 1), TRAIN_RETRY_MAX_SECONDS)
+                    self.train_failures[symbol] = (failures, time.monotonic() + wait)
+                    logging.warning(f"No model for {symbol} after {failures} attempt(s), next try in {wait:.0f}s")
 
     def save_model_metadata(self, symbol, metrics):
         meta_file = f"ml_model_{symbol}_{MODEL_VERSION}.meta"
@@ -45,75 +96,100 @@ class MLModelManager:
         self.model_metadata[symbol] = metrics
 
     def prepare_features(self, df):
-        df['return'] = df['close'].pct_change()
-        df['ma_fast'] = df['close'].rolling(9).mean()
-        df['ma_slow'] = df['close'].rolling(21).mean()
-        df['rsi'] = Indicators.compute_rsi(df['close'])
-        df['atr'] = Indicators.compute_atr(df)
-        df['macd'], df['macd_signal'] = Indicators.compute_macd(df['close'])
-        df['volatility'] = df['high'] - df['low']
-        df['spread'] = df['open'] - df['close'].shift(1)
-        df.dropna(inplace=True)
-        df['target'] = (df['close'].shift(-1) > df['close']).astype(int)
-        return df
+        return prepare_features(df)
 
-    def train_ml_model(self, symbol):
-        df = self.mt5_manager.copy_rates(symbol, mt5.TIMEFRAME_M15, n=2000)
+    def build_training_set(self, symbol):
+        bars = self.mt5_manager.get_history(symbol, mt5.TIMEFRAME_M15)[-TRAIN_BARS:]
+        df = pd.DataFrame(bars)
         if df.empty:
             logging.error(f"No data to train ML model for {symbol}")
             return None
 
         df = self.prepare_features(df)
-        features = ['return', 'ma_fast', 'ma_slow', 'rsi', 'atr', 'macd', 'macd_signal', 'volatility', 'spread']
-        X = df[features]
-        y = df['target']
-
-        tscv = TimeSeriesSplit(n_splits=5)
-        param_grid = {
-            'n_estimators': [100, 200, 300],
-            'max_depth': [5, 10, 15],
-            'min_samples_split': [2, 5, 10]
-        }
-
-        model = RandomForestClassifier(class_weight='balanced', random_state=42, n_jobs=-1)
-        grid_search = GridSearchCV(model, param_grid, cv=tscv, scoring='f1', n_jobs=-1, verbose=1)
-        grid_search.fit(X, y)
+        return df[FEATURES].to_numpy(), df['target'].to_numpy()
 
-        best_model = grid_search.best_estimator_
-        X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, shuffle=False)
-        val_score = best_model.score(X_val, y_val)
-        train_score = best_model.score(X_train, y_train)
-
-        if train_score - val_score > 0.15:
-            logging.warning(f"Potential overfitting for {symbol} (train: {train_score:.2f}, val: {val_score:.2f})")
+    def store_model(self, symbol, model, metrics):
+        if metrics['train_score'] - metrics['val_score'] > 0.15:
+            logging.warning(f"Potential overfitting for {symbol} (train: {metrics['train_score']:.2f}, val: {metrics['val_score']:.2f})")
 
         model_file = f"ml_model_{symbol}_{MODEL_VERSION}.pkl"
-        joblib.dump(best_model, model_file)
-
-        metrics = {
-            'train_score': train_score,
-            'val_score': val_score,
-            'best_params': grid_search.best_params_,
-            'feature_importance': dict(zip(features, best_model.feature_importances_))
-        }
+        joblib.dump(model, model_file)
         self.save_model_metadata(symbol, metrics)
-        logging.info(f"Trained model for {symbol} with validation accuracy: {val_score:.2%}")
-        self.models[symbol] = best_model
-        return best_model
+        logging.info(f"Trained model for {symbol} with validation accuracy: {metrics['val_score']:.2%}")
+        self.models.put(symbol, self.inference_model(model))
+
+    def train_ml_model(self, symbol):
+        dataset = self.build_training_set(symbol)
+        if dataset is None:
+            return None
+        model, metrics = fit_model(*dataset, n_jobs=TRAIN_CORE_BUDGET, features=FEATURES)
+        self.store_model(symbol, model, metrics)
+        return model
+
+    @staticmethod
+    def inference_model(model):
+        # What the cache holds: with COMPILED_INFERENCE the flattened forest replaces the sklearn
+        # model, so each cached symbol keeps one copy and eviction frees it
+        return CompiledForest.from_sklearn(model) if COMPILED_INFERENCE else model
+
+    @staticmethod
+    def feature_row(latest_data):
+        if hasattr(latest_data, 'index'):
+            latest_data = latest_data[FEATURES]
+        return np.asarray(latest_data, dtype=np.float64).reshape(-1)
 
     def predict_direction(self, symbol, latest_data):
         model = self.models.get(symbol)
         if model is None:
-            model = self.train_ml_model(symbol)
-        features = ['return', 'ma_fast', 'ma_slow', 'rsi', 'atr', 'macd', 'macd_signal', 'volatility', 'spread']
+            return None
         try:
-            X = latest_data[features].values.reshape(1, -1)
-            pred = model.predict(X)
+            X = self.feature_row(latest_data).reshape(1, -1)
+            with timer('model_predict_seconds', symbol=symbol):
+                pred = model.predict(X)
             return pred[0]
         except Exception as e:
             logging.error(f"Prediction error: {e}")
             return None
 
-    def retrain_all_models(self):
-        for symbol in SYMBOLS:
-            self.train_ml_model(symbol)
+    def predict_many(self, latest_rows):
+        # latest_rows: {symbol: feature row}. Symbols that resolve to the same model are scored
+        # in one predict_proba call. Returns {symbol: {'label': ..., 'proba': {class: p}}}.
+        groups = {}
+        for symbol, row in latest_rows.items():
+            model = self.models.get(symbol)
+            if model is None:
+                continue
+            try:
+                row = self.feature_row(row)
+            except Exception as e:
+                logging.error(f"Prediction input error for {symbol}: {e}")
+                continue
+            _, symbols, rows = groups.setdefault(id(model), (model, [], []))
+            symbols.append(symbol)
+            rows.append(row)
+
+        results = {}
+        for model, symbols, rows in groups.values():
+            try:
+                proba = model.predict_proba(np.vstack(rows))
+            except Exception as e:
+                logging.error(f"Batch prediction error for {symbols}: {e}")
+                continue
+            labels = model.classes_[np.argmax(proba, axis=1)]
+            for symbol, label, p in zip(symbols, labels.tolist(), proba.tolist()):
+                results[symbol] = {'label': label, 'proba': dict(zip(model.classes_.tolist(), p))}
+        return results
+
+    def retrain_all_models(self, symbols=None):
+        # Bars and features are built here (the terminal connection lives in this process),
+        # then the fits fan out across the scheduler's process pool.
+        datasets = {}
+        for symbol in symbols or SYMBOLS:
+            try:
+                dataset = self.build_training_set(symbol)
+            except CallError as e:
+                logging.error(f"Skipping retrain for {symbol}: {e}")
+                continue
+            if dataset is not None:
+                datasets[symbol] = dataset
+        return TrainingScheduler().run(datasets, self.store_model, features=FEATURES)
@@ -0,0 +1,57 @@
+import os
+import threading
+from collections import OrderedDict
+
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", 0))  # 0 = one entry per configured symbol
+
+
+class ModelCache:
+    def __init__(self, loader, max_size):
+        # loader(key) -> model, or None when it is not available yet (None is never cached)
+        self.loader = loader
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # One lock per key: a slow load only holds up callers waiting for the same model
+        self.load_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            load_lock = self.load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Another thread may have loaded it while this one waited
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    return self.entries[key]
+            value = self.loader(key)
+            if value is not None:
+                self.put(key, value)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            return self.entries.pop(key, None)
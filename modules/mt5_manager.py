@@ -1,21 +1,47 @@
 import time
 import logging
-import MetaTrader5 as mt5
+import threading
+import numpy as np
+import mt5_constants as mt5
 from datetime import datetime
-from utils import retry  # We'll provide utils.py later
+from utils import retry, CallError
+from bar_cache import BarCache
+from bar_archive import BarArchive
+from tick_stream import TickStream
+from regime_engine import RegimeEngine
+from broker_backend import create_backend
+
+RES_S_OK = 1
+
+
+class BrokerError(Exception):
+    pass
+
 
 class MT5Manager:
-    def __init__(self, login, password, server):
+    def __init__(self, login, password, server, backend=None):
+        # BROKER_BACKEND=simulator swaps the terminal for a local deterministic market
+        self.backend = backend or create_backend()
         self.login = login
         self.password = password
         self.server = server
         self.max_retries = 5
         self.connection_retries = 0
+        self.bar_cache = BarCache(self._fetch_rates)
+        self.tick_stream = TickStream(self._fetch_ticks, self._terminal_time)
+        self.regimes = RegimeEngine(self.bar_cache, mt5.TIMEFRAME_M15)
+        self.archive = BarArchive(fetch=self._fetch_history)
+        # Order-path snapshots: static symbol specs until invalidated, account state per cycle
+        # (or until the next fill) and margin per lot for the cycle's candidate orders
+        self.symbol_specs = {}
+        self.account = None
+        self.margin_per_lot = {}
+        self.snapshot_lock = threading.Lock()
         self.initialize_connection()
 
     def initialize_connection(self):
-        if not mt5.initialize(login=self.login, password=self.password, server=self.server):
-            error = mt5.last_error()
+        if not self.backend.initialize(login=self.login, password=self.password, server=self.server):
+            error = self.backend.last_error()
             logging.error(f"MT5 initialization failed, error code: {error}")
             if self.connection_retries < self.max_retries:
                 self.connection_retries += 1
@@ -28,40 +54,151 @@ class MT5Manager:
         self.connection_retries = 0
 
     def shutdown(self):
-        mt5.shutdown()
+        self.backend.shutdown()
         logging.info("MT5 shutdown completed.")
 
+    def _call(self, name, *args, empty=None, **kwargs):
+        # The terminal reports failures as None plus last_error(); turn them into exceptions so
+        # retry/circuit breaking sees them. Some queries return None for "nothing found".
+        result = getattr(self.backend, name)(*args, **kwargs)
+        if result is None:
+            error = self.backend.last_error()
+            if empty is not None and error and error[0] == RES_S_OK:
+                return empty
+            raise BrokerError(f"{name} returned None, last error: {error}")
+        return result
+
     @retry()
     def get_account_info(self):
-        return mt5.account_info()
+        return self._call('account_info')
 
     @retry()
     def get_symbol_info(self, symbol):
-        return mt5.symbol_info(symbol)
+        return self._call('symbol_info', symbol)
 
     @retry()
     def get_symbol_tick(self, symbol):
-        return mt5.symbol_info_tick(symbol)
+        return self._call('symbol_info_tick', symbol)
+
+    def get_symbol_spec(self, symbol):
+        # Contract spec (point, tick value/size, volume limits); bid/ask on it are stale by design
+        spec = self.symbol_specs.get(symbol)
+        if spec is None:
+            spec = self.get_symbol_info(symbol)
+            with self.snapshot_lock:
+                self.symbol_specs[symbol] = spec
+        return spec
+
+    def invalidate_symbol_specs(self, symbol=None):
+        with self.snapshot_lock:
+            if symbol is None:
+                self.symbol_specs.clear()
+            else:
+                self.symbol_specs.pop(symbol, None)
+
+    def refresh_account(self):
+        # Once per cycle; also drops last cycle's margin quotes since prices have moved
+        account = self.get_account_info()
+        with self.snapshot_lock:
+            self.account = account
+            self.margin_per_lot = {}
+        return account
+
+    def get_account_snapshot(self):
+        account = self.account
+        if account is None:
+            account = self.account = self.get_account_info()
+        return account
+
+    def mark_account_stale(self):
+        # After a fill balance/margin have changed; the next read goes to the terminal
+        self.account = None
+
+    def precompute_margins(self, orders):
+        # orders: iterable of (action, symbol, price). Margin is linear in volume, so one quote
+        # per lot covers whatever size the order ends up with.
+        for action, symbol, price in orders:
+            if (action, symbol) not in self.margin_per_lot:
+                per_lot = self.order_calc_margin(action, symbol, 1.0, price)
+                with self.snapshot_lock:
+                    self.margin_per_lot[(action, symbol)] = per_lot
+
+    def margin_required(self, action, symbol, volume, price):
+        per_lot = self.margin_per_lot.get((action, symbol))
+        if per_lot is None:
+            return self.order_calc_margin(action, symbol, volume, price)
+        return per_lot * volume
+
+    def _fetch_rates(self, symbol, timeframe, count):
+        return self._call('copy_rates_from_pos', symbol, timeframe, 0, count)
 
     @retry()
+    def get_bars(self, symbol, timeframe, n=500):
+        # Read-only view into the bar cache, valid until the next fetch for this symbol/timeframe
+        return self.bar_cache.get(symbol, timeframe, n)
+
     def copy_rates(self, symbol, timeframe, n=500):
-        rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, n)
-        if rates is None:
-            raise ValueError(f"Failed to copy rates for {symbol} timeframe {timeframe}")
+        bars = self.get_bars(symbol, timeframe, n)
         import pandas as pd
-        df = pd.DataFrame(rates)
+        df = pd.DataFrame(bars)
         df['time'] = pd.to_datetime(df['time'], unit='s')
         return df
 
+    def _fetch_history(self, symbol, timeframe, start_pos, count):
+        return self._call('copy_rates_from_pos', symbol, timeframe, start_pos, count)
+
+    @retry()
+    def sync_history(self, symbol, timeframe):
+        return self.archive.sync(symbol, timeframe)
+
+    def get_history(self, symbol, timeframe, start=None, end=None, sync=True):
+        # Closed bars from the local archive (memory-mapped, read-only), topped up from the terminal first.
+        # If the terminal is unreachable whatever is already archived is still returned.
+        if sync:
+            try:
+                self.sync_history(symbol, timeframe)
+            except CallError as e:
+                if not len(self.archive.bars(symbol, timeframe)):
+                    raise
+                logging.warning(f"History sync failed for {symbol}, using archived bars: {e}")
+        return self.archive.bars(symbol, timeframe, start, end)
+
+    def _fetch_ticks(self, symbol, date_from, count):
+        return self._call('copy_ticks_from', symbol, date_from, count, mt5.COPY_TICKS_ALL)
+
+    def _terminal_time(self, symbol):
+        return self._call('symbol_info_tick', symbol).time
+
+    @retry()
+    def update_ticks(self, symbol):
+        # Incremental: only ticks after the last one already buffered; returns TickStats
+        return self.tick_stream.update(symbol)
+
+    def get_ticks(self, symbol, n=50):
+        # Newest n buffered ticks as records (tick.price, tick.time_msc, ...); call update_ticks first
+        return self.tick_stream.ticks(symbol, n).view(np.recarray)
+
+    def check_market_regime(self, symbol):
+        # O(1) read of the regime table; symbols with new bars are recomputed together on first read
+        return self.regimes.get(symbol).regime
+
     @retry()
     def history_deals_get(self, from_time, to_time, symbol=None):
-        return mt5.history_deals_get(from_time, to_time, group=symbol)
+        return self._call('history_deals_get', from_time, to_time, group=symbol, empty=())
 
     @retry()
     def positions_get(self, symbol=None):
-        return mt5.positions_get(symbol=symbol)
+        return self._call('positions_get', symbol=symbol, empty=())
 
-    @retry()
+    @retry(max_retries=1)  # never resend an order that may have reached the server
     def order_send(self, request):
-        return mt5.order_send(request)
+        return self._call('order_send', request)
+
+    @retry()
+    def order_calc_margin(self, action, symbol, volume, price):
+        return self._call('order_calc_margin', action, symbol, volume, price)
+
+    @retry()
+    def copy_ticks_from(self, symbol, date_from, count, flags):
+        return self._call('copy_ticks_from', symbol, date_from, count, flags)
 
@@ -1,24 +1,154 @@
-import requests
+import os
+import re
+import time
 import logging
-from textblob import TextBlob
+import threading
+import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from utils import CallError, retry
+
+SENTIMENT_TTL = float(os.getenv("SENTIMENT_TTL", 300))
+SENTIMENT_ERROR_TTL = float(os.getenv("SENTIMENT_ERROR_TTL", 60))  # a failed fetch is answered as neutral this long
+HEADLINE_CACHE_SIZE = int(os.getenv("HEADLINE_CACHE_SIZE", 10000))
+SENTIMENT_SCORER = os.getenv("SENTIMENT_SCORER", "textblob")
+NEWS_WORKERS = int(os.getenv("NEWS_WORKERS", 8))
+
+
+class TextBlobScorer:
+    def __init__(self):
+        from textblob import TextBlob
+        self.TextBlob = TextBlob
+
+    def score_batch(self, headlines):
+        return [self.TextBlob(headline).sentiment.polarity for headline in headlines]
+
+
+class LexiconScorer:
+    # Word-level polarity lookup with single-word negation; roughly TextBlob's scale (-1..1)
+    LEXICON = {
+        'beat': 0.5, 'beats': 0.5, 'boost': 0.5, 'boosts': 0.5, 'bullish': 0.7, 'climb': 0.4,
+        'climbs': 0.4, 'gain': 0.4, 'gains': 0.4, 'good': 0.7, 'growth': 0.4, 'high': 0.2,
+        'higher': 0.3, 'improve': 0.5, 'improves': 0.5, 'jump': 0.4, 'jumps': 0.4, 'positive': 0.5,
+        'rally': 0.6, 'rallies': 0.6, 'record': 0.3, 'recover': 0.4, 'recovery': 0.4, 'rise': 0.4,
+        'rises': 0.4, 'soar': 0.7, 'soars': 0.7, 'strong': 0.5, 'stronger': 0.5, 'surge': 0.6,
+        'surges': 0.6, 'upbeat': 0.6, 'bearish': -0.7, 'cut': -0.3, 'cuts': -0.3, 'decline': -0.4,
+        'declines': -0.4, 'drop': -0.4, 'drops': -0.4, 'fall': -0.4, 'falls': -0.4, 'fear': -0.6,
+        'fears': -0.6, 'lower': -0.3, 'loss': -0.5, 'losses': -0.5, 'miss': -0.5, 'misses': -0.5,
+        'negative': -0.5, 'plunge': -0.7, 'plunges': -0.7, 'recession': -0.7, 'risk': -0.2,
+        'selloff': -0.6, 'slide': -0.4, 'slides': -0.4, 'slump': -0.6, 'slumps': -0.6, 'weak': -0.5,
+        'weaker': -0.5, 'worse': -0.6, 'crisis': -0.8, 'crash': -0.8, 'default': -0.6, 'inflation': -0.2,
+    }
+    NEGATIONS = frozenset({'not', 'no', 'never', "isn't", "doesn't", "don't", "won't", 'without'})
+    TOKEN_RE = re.compile(r"[a-z']+")
+
+    def __init__(self, lexicon=None):
+        self.lexicon = dict(self.LEXICON if lexicon is None else lexicon)
+
+    def score(self, headline):
+        lexicon = self.lexicon
+        total = 0.0
+        matched = 0
+        negate = False
+        for token in self.TOKEN_RE.findall(headline.lower()):
+            if token in self.NEGATIONS:
+                negate = True
+                continue
+            polarity = lexicon.get(token)
+            if polarity is not None:
+                total += -polarity if negate else polarity
+                matched += 1
+            negate = False
+        return max(-1.0, min(1.0, total / matched)) if matched else 0.0
+
+    def score_batch(self, headlines):
+        return [self.score(headline) for headline in headlines]
+
+
+SCORERS = {'textblob': TextBlobScorer, 'lexicon': LexiconScorer}
+
 
 class NewsSentiment:
-    def __init__(self, api_key):
+    def __init__(self, api_key, scorer=None, ttl=SENTIMENT_TTL, cache_size=HEADLINE_CACHE_SIZE,
+                 error_ttl=SENTIMENT_ERROR_TTL):
         self.api_key = api_key
+        self.scorer = scorer or SCORERS[SENTIMENT_SCORER]()
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.cache_size = cache_size
+        self.headline_cache = OrderedDict()
+        self.symbol_cache = {}
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=NEWS_WORKERS, pool_maxsize=NEWS_WORKERS))
+        self.pool = ThreadPoolExecutor(max_workers=NEWS_WORKERS, thread_name_prefix="news")
 
-    def get_news_sentiment(self, symbol):
+    # Behind the shared circuit breaker: during an outage symbols fail fast instead of each
+    # waiting out the request timeout
+    @retry(max_retries=1, endpoint='news.fetch_headlines')
+    def fetch_headlines(self, symbol):
+        url = f'https://finnhub.io/api/v1/news-sentiment?symbol={symbol}&token={self.api_key}'
+        response = self.session.get(url, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        return [news.get('headline', '') for news in data.get('data', [])]
+
+    def score_headlines(self, headlines):
+        # Only headlines not seen recently reach the scorer, and they go in one batch
+        keys = [hash(headline) for headline in headlines]
+        scores = {}
+        with self.lock:
+            for key in keys:
+                if key in self.headline_cache:
+                    self.headline_cache.move_to_end(key)
+                    scores[key] = self.headline_cache[key]
+        missing = {key: headline for key, headline in zip(keys, headlines) if key not in scores}
+        if missing:
+            for key, polarity in zip(missing, self.scorer.score_batch(list(missing.values()))):
+                scores[key] = polarity
+            with self.lock:
+                for key in missing:
+                    self.headline_cache[key] = scores[key]
+                while len(self.headline_cache) > self.cache_size:
+                    self.headline_cache.popitem(last=False)
+        return [scores[key] for key in keys]
+
+    def cached_sentiment(self, symbol, now=None):
+        entry = self.symbol_cache.get(symbol)
+        if entry is not None and entry[0] > (time.monotonic() if now is None else now):
+            return entry[1]
+        return None
+
+    def refresh_sentiment(self, symbol):
         try:
-            url = f'https://finnhub.io/api/v1/news-sentiment?symbol={symbol}&token={self.api_key}'
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            sentiments = []
-            for news in data.get('data', []):
-                headline = news.get('headline', '')
-                polarity = TextBlob(headline).sentiment.polarity
-                sentiments.append(polarity)
+            sentiments = self.score_headlines(self.fetch_headlines(symbol))
             avg_sentiment = sum(sentiments) / len(sentiments) if sentiments else 0
+            self.symbol_cache[symbol] = (time.monotonic() + self.ttl, avg_sentiment)
             return avg_sentiment
         except Exception as e:
-            logging.error(f"News sentiment fetch error: {e}")
+            # Fetch failures were logged by retry; an open circuit fails fast without a log line
+            if not isinstance(e, CallError):
+                logging.error(f"News sentiment fetch error: {e}")
+            self.symbol_cache[symbol] = (time.monotonic() + self.error_ttl, 0)
             return 0
+
+    def get_news_sentiment(self, symbol):
+        cached = self.cached_sentiment(symbol)
+        if cached is not None:
+            return cached
+        return self.refresh_sentiment(symbol)
+
+    def get_many(self, symbols):
+        # Cache hits are answered directly; misses are fetched concurrently over the pooled session
+        results = {}
+        stale = []
+        for symbol in symbols:
+            cached = self.cached_sentiment(symbol)
+            if cached is None:
+                stale.append(symbol)
+            else:
+                results[symbol] = cached
+        for symbol, sentiment in zip(stale, self.pool.map(self.refresh_sentiment, stale)):
+            results[symbol] = sentiment
+        return results
@@ -0,0 +1,107 @@
+import math
+import threading
+import mt5_constants as mt5
+
+# Deals that close (part of) a position; only these count as trades
+EXIT_ENTRIES = (mt5.DEAL_ENTRY_OUT, mt5.DEAL_ENTRY_INOUT, mt5.DEAL_ENTRY_OUT_BY)
+
+
+def deal_net_profit(records):
+    # What a deal did to the balance: profit plus commission, swap and fee (costs are negative)
+    return records['profit'] + records['commission'] + records['swap'] + records['fee']
+
+
+class MetricsAccumulator:
+    # O(1) per deal: running sums for win/loss stats, Welford mean/variance for Sharpe
+    # and a running equity peak for peak-to-trough drawdown. Without an initial balance
+    # (per-symbol/magic breakdowns) drawdown is only reported in money.
+
+    def __init__(self, initial_balance=None):
+        self.trades = 0
+        self.wins = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.has_balance = initial_balance is not None
+        self.equity = initial_balance or 0.0
+        self.peak = self.equity
+        self.max_drawdown = 0.0
+        self.max_drawdown_abs = 0.0
+
+    def update(self, profit):
+        self.trades += 1
+        if profit > 0:
+            self.wins += 1
+            self.gross_profit += profit
+        else:
+            self.gross_loss += profit
+
+        delta = profit - self.mean
+        self.mean += delta / self.trades
+        self.m2 += delta * (profit - self.mean)
+
+        self.equity += profit
+        if self.equity > self.peak:
+            self.peak = self.equity
+        drawdown = self.peak - self.equity
+        if drawdown > self.max_drawdown_abs:
+            self.max_drawdown_abs = drawdown
+        if self.has_balance and self.peak > 0 and drawdown / self.peak > self.max_drawdown:
+            self.max_drawdown = drawdown / self.peak
+
+    def snapshot(self):
+        if self.trades == 0:
+            return None
+        losses = self.trades - self.wins
+        std = math.sqrt(self.m2 / (self.trades - 1)) if self.trades > 1 else 0.0
+        return {
+            'trades': self.trades,
+            'net_profit': self.gross_profit + self.gross_loss,
+            'win_rate': self.wins / self.trades * 100,
+            'avg_win': self.gross_profit / self.wins if self.wins else None,
+            'avg_loss': self.gross_loss / losses if losses else None,
+            'profit_factor': abs(self.gross_profit / self.gross_loss) if self.gross_loss else None,
+            'max_drawdown': self.max_drawdown if self.has_balance else None,
+            'max_drawdown_abs': self.max_drawdown_abs,
+            # Per-trade, not annualized
+            'sharpe': self.mean / std if std > 0 else 0.0,
+            'expectancy': self.mean,
+        }
+
+
+class PerformanceTracker:
+    def __init__(self, initial_balance=None):
+        self.initial_balance = initial_balance
+        self.total = MetricsAccumulator(initial_balance)
+        self.by_symbol = {}
+        self.by_magic = {}
+        # position_id -> costs of its entry deals, charged to the trade when it closes
+        self.open_costs = {}
+        self.lock = threading.Lock()
+
+    def update(self, profit, symbol=None, magic=None):
+        with self.lock:
+            self.total.update(profit)
+            if symbol is not None:
+                self.by_symbol.setdefault(symbol, MetricsAccumulator()).update(profit)
+            if magic is not None:
+                self.by_magic.setdefault(magic, MetricsAccumulator()).update(profit)
+
+    def update_records(self, records):
+        # records: structured array of deals (trade_store.DEAL_DTYPE), in deal order
+        for entry, position, net, symbol, magic in zip(records['entry'].tolist(), records['position_id'].tolist(),
+                                                       deal_net_profit(records).tolist(),
+                                                       records['symbol'].tolist(), records['magic'].tolist()):
+            if entry in EXIT_ENTRIES:
+                self.update(net + self.open_costs.pop(position, 0.0), symbol, magic)
+            else:
+                self.open_costs[position] = self.open_costs.get(position, 0.0) + net
+
+    def snapshot(self, breakdown=False):
+        with self.lock:
+            metrics = self.total.snapshot()
+            if metrics is not None and breakdown:
+                metrics['by_symbol'] = {key: acc.snapshot() for key, acc in self.by_symbol.items()}
+                metrics['by_magic'] = {key: acc.snapshot() for key, acc in self.by_magic.items()}
+            return metrics
@@ -0,0 +1,129 @@
+import os
+import threading
+import numpy as np
+from collections import namedtuple
+from scipy.signal import lfilter
+from feature_engine import rolling_mean
+
+REGIME_BARS = int(os.getenv("REGIME_BARS", 100))
+ADX_PERIOD = 14
+ATR_PERIOD = 14
+ER_PERIOD = 20
+HURST_LAGS = np.arange(2, 21)
+# Classification thresholds
+ADX_TREND, ADX_RANGE = 25.0, 20.0
+ER_TREND = 0.3
+HURST_TREND, HURST_RANGE = 0.55, 0.45
+ATR_VOLATILE = 0.9
+MIN_BARS = ADX_PERIOD * 2 + 2
+
+Regime = namedtuple('Regime', ['regime', 'adx', 'efficiency', 'atr_percentile', 'hurst', 'bar_time'])
+UNKNOWN = Regime('unknown', np.nan, np.nan, np.nan, np.nan, None)
+
+
+def wilder(x):
+    # Wilder smoothing (alpha = 1/period) along the last axis, seeded with the first value
+    alpha = 1 / ADX_PERIOD
+    y, _ = lfilter([alpha], [1, alpha - 1], x, axis=-1, zi=(1 - alpha) * x[..., :1])
+    return y
+
+
+def regime_metrics(high, low, close):
+    # (n_symbols, n_bars) arrays -> ADX, efficiency ratio, ATR percentile and Hurst per symbol
+    prev_close = close[:, :-1]
+    high, low, close = high[:, 1:], low[:, 1:], close[:, 1:]
+    tr = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+    up = np.diff(high, axis=1, prepend=high[:, :1])
+    down = -np.diff(low, axis=1, prepend=low[:, :1])
+    plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+    minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+    atr = wilder(tr)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus_di = 100 * wilder(plus_dm) / atr
+        minus_di = 100 * wilder(minus_dm) / atr
+        dx = 100 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+    adx = wilder(np.nan_to_num(dx))[:, -1]
+
+    path = np.abs(np.diff(close[:, -(ER_PERIOD + 1):], axis=1)).sum(axis=1)
+    net = np.abs(close[:, -1] - close[:, -(ER_PERIOD + 1)])
+    efficiency = np.divide(net, path, out=np.zeros_like(net), where=path > 0)
+
+    # Share of the window's ATR readings at or below the latest one
+    atr_simple = rolling_mean(tr, ATR_PERIOD, np.empty_like(tr))[:, ATR_PERIOD - 1:]
+    atr_percentile = (atr_simple <= atr_simple[:, -1:]).mean(axis=1)
+
+    # Scaling of lagged log-price differences: std(x[t+lag] - x[t]) ~ lag ** H
+    log_close = np.log(close)
+    lags = HURST_LAGS[HURST_LAGS < close.shape[1] // 2]
+    spread = np.stack([(log_close[:, lag:] - log_close[:, :-lag]).std(axis=1) for lag in lags], axis=1)
+    log_lags = np.log(lags) - np.log(lags).mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_spread = np.log(spread)
+        hurst = (log_spread - log_spread.mean(axis=1, keepdims=True)) @ log_lags / (log_lags @ log_lags)
+    return adx, efficiency, atr_percentile, hurst
+
+
+def classify(adx, efficiency, atr_percentile, hurst):
+    trending = (adx >= ADX_TREND) & ((efficiency >= ER_TREND) | (hurst >= HURST_TREND))
+    ranging = ((adx < ADX_RANGE) & ~(hurst >= HURST_TREND)) | ((hurst <= HURST_RANGE) & (efficiency < ER_TREND))
+    volatile = atr_percentile >= ATR_VOLATILE
+    return np.where(trending, "trending", np.where(volatile, "volatile", np.where(ranging, "ranging", "neutral")))
+
+
+class RegimeEngine:
+    # Regime table over the bar cache. New bars only mark a symbol dirty; the next lookup
+    # recomputes every dirty symbol in one vectorized pass, so most lookups are a dict read.
+
+    def __init__(self, bar_cache, timeframe, bars=REGIME_BARS):
+        self.bar_cache = bar_cache
+        self.timeframe = timeframe
+        self.bars = bars
+        self.table = {}
+        self.dirty = set()
+        self.computing = set()
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        bar_cache.listeners.append(self.on_bars)
+
+    def on_bars(self, symbol, timeframe):
+        if timeframe == self.timeframe:
+            with self.lock:
+                self.dirty.add(symbol)
+
+    def get(self, symbol):
+        if symbol in self.dirty or symbol in self.computing:
+            self.refresh()
+        return self.table.get(symbol, UNKNOWN)
+
+    def refresh(self):
+        # One refresh at a time; a lookup for a symbol being computed waits for it here.
+        # Bar cache locks are taken outside self.lock: the cache calls on_bars while holding them.
+        with self.refresh_lock:
+            with self.lock:
+                symbols, self.dirty = self.dirty, set()
+                self.computing = symbols
+            try:
+                self._compute(symbols)
+            finally:
+                self.computing = set()
+
+    def _compute(self, symbols):
+        # The forming bar is excluded: it would be frozen at whatever it looked like at refresh time.
+        # Symbols are grouped by window length (normally all the same) and stacked into 2-D arrays.
+        windows = {}
+        for symbol in symbols:
+            bars = self.bar_cache.peek(symbol, self.timeframe)
+            if bars is None or len(bars) - 1 < MIN_BARS:
+                self.table[symbol] = UNKNOWN
+                continue
+            n = min(len(bars) - 1, self.bars)
+            windows.setdefault(n, []).append((symbol, bars[-n - 1:-1].copy()))
+
+        for n, group in windows.items():
+            stacked = np.stack([bars for _, bars in group])
+            metrics = regime_metrics(stacked['high'], stacked['low'], stacked['close'])
+            labels = classify(*metrics)
+            for k, (symbol, _) in enumerate(group):
+                self.table[symbol] = Regime(str(labels[k]), *(float(m[k]) for m in metrics),
+                                            int(stacked['time'][k, -1]))
@@ -0,0 +1,42 @@
+# Terminal-independent sizing and stop rules shared by TradeExecutor and the backtester.
+# `symbol_info` is anything with MT5 SymbolInfo attribute names.
+
+MIN_LOT = 0.01
+
+
+def risk_lot_size(balance, equity, risk_percent, entry_price, stop_price, symbol_info):
+    drawdown = (equity - balance) / equity if equity > 0 else 0
+
+    adjusted_risk = risk_percent
+    if drawdown > 0.05:
+        adjusted_risk = max(risk_percent * 0.5, 0.005)
+
+    risk_amount = balance * adjusted_risk
+    pip_value = symbol_info.trade_tick_value / symbol_info.trade_tick_size
+    pips_risk = abs(entry_price - stop_price) / symbol_info.point
+
+    if pips_risk == 0:
+        return MIN_LOT
+
+    lot_size = (risk_amount / pips_risk) / pip_value
+    lot_size = max(round(lot_size, 2), symbol_info.volume_min)
+    return min(lot_size, symbol_info.volume_max)
+
+
+def dynamic_stops(entry_price, direction, atr, point, bid, ask, sl_atr=1.5, tp_atr=3.0):
+    spread = ask - bid
+
+    if direction == "BUY":
+        base_sl = entry_price - (atr * sl_atr * point)
+        base_tp = entry_price + (atr * tp_atr * point)
+        base_sl -= spread
+        base_tp -= spread
+        base_sl = max(base_sl, ask - (ask * 0.05))
+    else:
+        base_sl = entry_price + (atr * sl_atr * point)
+        base_tp = entry_price - (atr * tp_atr * point)
+        base_sl += spread
+        base_tp += spread
+        base_sl = min(base_sl, bid + (bid * 0.05))
+
+    return base_sl, base_tp
@@ -1,109 +1,332 @@
+import os
+import json
 import requests
 import logging
 import threading
 import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from utils import CallError
+
+TELEGRAM_QUEUE_SIZE = int(os.getenv("TELEGRAM_QUEUE_SIZE", 1000))
+TELEGRAM_COALESCE_SECONDS = float(os.getenv("TELEGRAM_COALESCE_SECONDS", 1.0))
+TELEGRAM_OVERFLOW = os.getenv("TELEGRAM_OVERFLOW", "drop_oldest")  # drop_oldest, drop_newest or persist
+TELEGRAM_SPOOL_FILE = os.getenv("TELEGRAM_SPOOL_FILE", "telegram_spool.jsonl")
+# Telegram allows about one message per second per chat and 30 per second overall
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", 1.0))
+TELEGRAM_GLOBAL_INTERVAL = 1 / 30
+MAX_MESSAGE_LENGTH = 4096
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_POLL_TIMEOUT = int(os.getenv("TELEGRAM_POLL_TIMEOUT", 30))
+TELEGRAM_COMMAND_WORKERS = int(os.getenv("TELEGRAM_COMMAND_WORKERS", 4))
+
+# Command registry filled by @command on TelegramNotifier methods. Restricted commands change
+# trading state and are only accepted from the configured chat.
+Command = namedtuple('Command', ['handler', 'description', 'inline', 'restricted'])
+COMMANDS = {}
+
+
+def command(name, description, inline=False, restricted=False):
+    def decorator(func):
+        COMMANDS[name] = Command(func, description, inline, restricted)
+        return func
+    return decorator
+
 
 class TelegramNotifier:
-    def __init__(self, token, chat_id, bot_instance=None):
+    def __init__(self, token, chat_id, bot_instance=None, queue_size=TELEGRAM_QUEUE_SIZE,
+                 coalesce_seconds=TELEGRAM_COALESCE_SECONDS, overflow=TELEGRAM_OVERFLOW,
+                 spool_file=TELEGRAM_SPOOL_FILE, api_url=TELEGRAM_API_URL):
         self.token = token
+        self.api_url = f"{api_url.rstrip('/')}/bot{token}"
         self.chat_id = chat_id
         self.bot_instance = bot_instance
         self.last_update_id = 0
+        self.session = requests.Session()
+
+        # Outbound: callers only append to a bounded queue; one sender thread does the HTTP
+        if overflow not in ("drop_oldest", "drop_newest", "persist"):
+            raise ValueError(f"Unknown TELEGRAM_OVERFLOW policy {overflow!r}")
+        self.outbox = deque()
+        self.queue_size = queue_size
+        self.coalesce_seconds = coalesce_seconds
+        self.overflow = overflow
+        self.spool_file = spool_file
+        self.outbox_cond = threading.Condition()
+        self.next_send = {}
+        self.last_send = 0.0
+        self.sending = False
+        self.stats = {'queued': 0, 'sent': 0, 'digests': 0, 'dropped': 0, 'spooled': 0, 'failed': 0}
+        self.sender_thread = threading.Thread(target=self.sender_loop, daemon=True)
+        self.sender_thread.start()
+
         if bot_instance:
+            self.poll_session = requests.Session()
+            self.command_pool = ThreadPoolExecutor(max_workers=TELEGRAM_COMMAND_WORKERS,
+                                                   thread_name_prefix="telegram-cmd")
             self.command_thread = threading.Thread(target=self.command_listener, daemon=True)
             self.command_thread.start()
 
-    def send_message(self, message, chat_id=None):
-        chat_id = chat_id or self.chat_id
+    def send_message(self, message, chat_id=None, coalesce=True):
+        # Never blocks on the network. coalesce=False skips the digest window (command replies).
+        item = (chat_id or self.chat_id, message, coalesce, time.monotonic())
+        with self.outbox_cond:
+            if len(self.outbox) >= self.queue_size:
+                if self.overflow == "drop_oldest":
+                    self.outbox.popleft()
+                    self.stats['dropped'] += 1
+                elif self.overflow == "drop_newest":
+                    self.stats['dropped'] += 1
+                    return
+                else:
+                    self.spool(item)
+                    return
+            self.outbox.append(item)
+            self.stats['queued'] += 1
+            self.outbox_cond.notify_all()
+
+    def spool(self, item):
         try:
-            url = f"https://api.telegram.org/bot{self.token}/sendMessage"
-            payload = {
-                "chat_id": chat_id,
-                "text": message,
-                "parse_mode": "HTML"
-            }
-            response = requests.post(url, data=payload, timeout=10)
-            response.raise_for_status()
-        except Exception as e:
-            logging.warning(f"Telegram message failed: {e}")
+            with open(self.spool_file, 'a') as f:
+                f.write(json.dumps({'chat_id': item[0], 'text': item[1]}) + "\n")
+            self.stats['spooled'] += 1
+        except OSError as e:
+            logging.warning(f"Could not spool Telegram message: {e}")
+            self.stats['dropped'] += 1
+
+    def unspool(self):
+        # Called with outbox_cond held once the queue has drained; refills from the spool file
+        if self.overflow != "persist" or not os.path.exists(self.spool_file):
+            return
+        try:
+            with open(self.spool_file) as f:
+                lines = f.readlines()
+        except OSError as e:
+            logging.warning(f"Could not read Telegram spool {self.spool_file}: {e}")
+            return
+        room = self.queue_size - len(self.outbox)
+        now = time.monotonic()
+        for line in lines[:room]:
+            # A crash mid-write can leave a partial line; skip it rather than lose the rest
+            try:
+                entry = json.loads(line)
+                self.outbox.append((entry['chat_id'], entry['text'], True, now))
+            except (ValueError, KeyError, TypeError) as e:
+                logging.warning(f"Skipping malformed Telegram spool line {line[:80]!r}: {e}")
+                self.stats['dropped'] += 1
+        rest = lines[room:]
+        try:
+            if rest:
+                with open(self.spool_file, 'w') as f:
+                    f.writelines(rest)
+            else:
+                os.remove(self.spool_file)
+        except OSError as e:
+            logging.warning(f"Could not update Telegram spool {self.spool_file}: {e}")
+
+    def take_batch(self):
+        # Waits for messages, then for the coalescing window of the oldest one (unless any
+        # queued message is urgent), and takes everything queued by then
+        with self.outbox_cond:
+            while not self.outbox:
+                self.unspool()
+                if self.outbox:
+                    break
+                self.outbox_cond.wait()
+            while not any(not coalesce for _, _, coalesce, _ in self.outbox):
+                remaining = self.outbox[0][3] + self.coalesce_seconds - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.outbox_cond.wait(remaining)
+            batch = list(self.outbox)
+            self.outbox.clear()
+            self.sending = True
+            return batch
+
+    @staticmethod
+    def digests(batch):
+        # Per chat, in order, joined into as few messages as fit Telegram's length limit
+        by_chat = {}
+        for chat_id, text, _, _ in batch:
+            by_chat.setdefault(chat_id, []).append(text[:MAX_MESSAGE_LENGTH])
+        for chat_id, texts in by_chat.items():
+            current = []
+            size = 0
+            for text in texts:
+                if current and size + len(text) + 2 > MAX_MESSAGE_LENGTH:
+                    yield chat_id, "\n\n".join(current), len(current)
+                    current, size = [], 0
+                current.append(text)
+                size += len(text) + 2
+            if current:
+                yield chat_id, "\n\n".join(current), len(current)
+
+    def sender_loop(self):
+        while True:
+            try:
+                batch = self.take_batch()
+                for chat_id, text, count in self.digests(batch):
+                    if self.post_message(chat_id, text):
+                        self.stats['sent'] += count
+                        self.stats['digests'] += 1
+                    else:
+                        self.stats['failed'] += count
+            except Exception as e:
+                # This is the only sender thread; log and keep going
+                logging.error(f"Telegram sender error: {e}")
+                time.sleep(1)
+            finally:
+                with self.outbox_cond:
+                    self.sending = False
+                    self.outbox_cond.notify_all()
+
+    def post_message(self, chat_id, text, max_attempts=5):
+        url = f"{self.api_url}/sendMessage"
+        payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
+        for attempt in range(max_attempts):
+            # Pace per chat and globally so we stay under Telegram's limits instead of hitting 429s
+            wait = max(self.next_send.get(chat_id, 0.0), self.last_send + TELEGRAM_GLOBAL_INTERVAL) - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = self.session.post(url, data=payload, timeout=10)
+                self.last_send = time.monotonic()
+                self.next_send[chat_id] = self.last_send + TELEGRAM_CHAT_INTERVAL
+                if response.status_code == 429:
+                    retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+                    logging.warning(f"Telegram rate limited, retrying in {retry_after}s")
+                    self.next_send[chat_id] = time.monotonic() + retry_after
+                    continue
+                response.raise_for_status()
+                return True
+            except Exception as e:
+                logging.warning(f"Telegram message failed (attempt {attempt + 1}): {e}")
+                self.next_send[chat_id] = time.monotonic() + min(2 ** attempt, 30)
+        return False
+
+    def flush(self, timeout=None):
+        # Waits until everything queued so far has been handed to Telegram
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.outbox_cond:
+            while self.outbox or self.sending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.outbox_cond.wait(remaining)
+        return True
 
     def command_listener(self):
+        # Long polling: the request stays open until an update arrives or the timeout passes
+        failures = 0
         while True:
             try:
-                url = f"https://api.telegram.org/bot{self.token}/getUpdates?offset={self.last_update_id+1}"
-                response = requests.get(url, timeout=10)
+                response = self.poll_session.get(
+                    f"{self.api_url}/getUpdates",
+                    params={'offset': self.last_update_id + 1, 'timeout': TELEGRAM_POLL_TIMEOUT},
+                    timeout=TELEGRAM_POLL_TIMEOUT + 10)
                 response.raise_for_status()
-                data = response.json()
-                for update in data.get('result', []):
+                failures = 0
+                for update in response.json().get('result', []):
                     self.last_update_id = update['update_id']
                     if 'message' in update and 'text' in update['message']:
-                        self.process_command(update['message'])
+                        self.dispatch(update['message'])
             except Exception as e:
+                failures += 1
                 logging.error(f"Telegram command error: {e}")
-            time.sleep(3)
+                time.sleep(min(2 ** failures, 30))
+
+    def dispatch(self, message):
+        # Inline commands (e.g. /pause) run right here so they never queue behind slow ones
+        name = message['text'].split()[0].split('@')[0].lower()
+        entry = COMMANDS.get(name)
+        if entry and entry.inline:
+            self.process_command(message)
+        else:
+            self.command_pool.submit(self.process_command, message)
 
     def process_command(self, message):
-        command = message['text'].lower()
+        name, *args = message['text'].split()
+        name = name.split('@')[0].lower()
         chat_id = message['chat']['id']
+        entry = COMMANDS.get(name)
+        if entry is None:
+            if name.startswith('/'):
+                self.reply(chat_id, f"Unknown command {name}. Send /help for the list.")
+            return
+        if entry.restricted and str(chat_id) != str(self.chat_id):
+            logging.warning(f"Ignoring {name} from unauthorized chat {chat_id}")
+            return
+        try:
+            entry.handler(self, chat_id, *args)
+        except CallError as e:
+            self.reply(chat_id, f"Broker unavailable: {e}")
+        except Exception as e:
+            logging.error(f"Telegram command {name} failed: {e}")
+            self.reply(chat_id, f"{name} failed: {e}")
 
-        if command == '/status':
-            self.handle_status_command(chat_id)
-        elif command == '/pause':
-            self.handle_pause_command(chat_id)
-        elif command == '/resume':
-            self.handle_resume_command(chat_id)
-        elif command == '/positions':
-            self.handle_positions_command(chat_id)
-        elif command.startswith('/risk'):
-            try:
-                risk_val = float(command.split()[1])
-                self.handle_risk_command(chat_id, risk_val)
-            except:
-                self.send_message("Invalid risk value. Usage: /risk 0.02", chat_id)
-        elif command == '/help':
-            self.handle_help_command(chat_id)
+    def reply(self, chat_id, text):
+        self.send_message(text, chat_id, coalesce=False)
 
+    @command('/status', "Bot status")
     def handle_status_command(self, chat_id):
         if self.bot_instance:
             account_info = self.bot_instance.mt5_manager.get_account_info()
             status = (f"Equity: ${account_info.equity:.2f}\n"
                       f"Balance: ${account_info.balance:.2f}\n"
                       f"Trading: {'ACTIVE' if self.bot_instance.trading_enabled else 'PAUSED'}")
-            self.send_message(status, chat_id)
+            metrics = self.bot_instance.trade_logger.calculate_performance_metrics()
+            if metrics:
+                status += (f"\nTrades: {metrics['trades']} (win rate {metrics['win_rate']:.1f}%)\n"
+                           f"Profit factor: {metrics['profit_factor'] or 0:.2f}\n"
+                           f"Max drawdown: {metrics['max_drawdown'] or 0:.2%}")
+            self.reply(chat_id, status)
 
+    @command('/pause', "Pause trading", inline=True, restricted=True)
     def handle_pause_command(self, chat_id):
         if self.bot_instance:
             self.bot_instance.trading_enabled = False
-            self.send_message("Trading PAUSED", chat_id)
+            self.reply(chat_id, "Trading PAUSED")
 
+    @command('/resume', "Resume trading", inline=True, restricted=True)
     def handle_resume_command(self, chat_id):
         if self.bot_instance:
             self.bot_instance.trading_enabled = True
-            self.send_message("Trading RESUMED", chat_id)
+            self.reply(chat_id, "Trading RESUMED")
 
+    @command('/positions', "Show open positions")
     def handle_positions_command(self, chat_id):
         if self.bot_instance:
             positions = self.bot_instance.mt5_manager.positions_get()
             if not positions:
-                self.send_message("No open positions", chat_id)
+                self.reply(chat_id, "No open positions")
                 return
             msg = "Open Positions:\n"
             for pos in positions:
                 pos_type = "BUY" if pos.type == 0 else "SELL"
                 msg += f"{pos.symbol} {pos_type} {pos.volume} lots\n"
-            self.send_message(msg, chat_id)
+            self.reply(chat_id, msg)
 
-    def handle_risk_command(self, chat_id, risk):
+    @command('/closeall', "Close all open positions", restricted=True)
+    def handle_closeall_command(self, chat_id):
+        if self.bot_instance:
+            # Replies with the batch's single aggregated report
+            reports = self.bot_instance.executor.close_all(chat_id=chat_id)
+            if not reports:
+                self.reply(chat_id, "No open positions")
+
+    @command('/risk', "Set risk percentage, e.g. /risk 0.02", restricted=True)
+    def handle_risk_command(self, chat_id, risk=None):
+        try:
+            risk = float(risk)
+        except (TypeError, ValueError):
+            self.reply(chat_id, "Invalid risk value. Usage: /risk 0.02")
+            return
         if self.bot_instance:
             self.bot_instance.current_risk = min(risk, 0.03)
-            self.send_message(f"Risk set to {risk*100:.1f}%", chat_id)
+            self.reply(chat_id, f"Risk set to {risk*100:.1f}%")
 
+    @command('/help', "Show this help")
     def handle_help_command(self, chat_id):
-        help_text = ("Available commands:\n"
-                     "/status - Bot status\n"
-                     "/pause - Pause trading\n"
-                     "/resume - Resume trading\n"
-                     "/positions - Show open positions\n"
-                     "/risk 0.02 - Set risk percentage\n"
-                     "/help - Show this help")
-        self.send_message(help_text, chat_id)
+        help_text = "Available commands:\n" + "\n".join(
+            f"{name} - {entry.description}" for name, entry in COMMANDS.items())
+        self.reply(chat_id, help_text)
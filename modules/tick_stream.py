@@ -0,0 +1,156 @@
+import os
+import time
+import threading
+import numpy as np
+from collections import namedtuple
+
+TICK_BUFFER_SIZE = int(os.getenv("TICK_BUFFER_SIZE", 4096))
+TICK_LOOKBACK_SECONDS = int(os.getenv("TICK_LOOKBACK_SECONDS", 600))
+TICK_FETCH_LIMIT = 100_000
+
+TICK_DTYPE = np.dtype([
+    ('time_msc', '<i8'),
+    ('bid', '<f8'),
+    ('ask', '<f8'),
+    ('last', '<f8'),
+    ('price', '<f8'),  # last if the symbol reports trades, otherwise mid
+])
+
+TickStats = namedtuple('TickStats', ['time_msc', 'price', 'bid', 'ask', 'spread', 'ma_fast', 'ma_slow',
+                                     'volatility', 'efficiency', 'ticks'])
+
+
+class TickBuffer:
+    # Newest ticks for one symbol, oldest first. Same layout as BarBuffer: twice the capacity so
+    # the live window is always a contiguous slice, moved to the front when the end is reached.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.empty(capacity * 2, dtype=TICK_DTYPE)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def view(self, n=None):
+        start = self.start if n is None else max(self.start, self.end - n)
+        ticks = self.buffer[start:self.end]
+        ticks.flags.writeable = False
+        return ticks
+
+    def append(self, ticks):
+        k = len(ticks)
+        if k >= self.capacity:
+            self.buffer[:self.capacity] = ticks[-self.capacity:]
+            self.start, self.end = 0, self.capacity
+            return
+        if self.end + k > len(self.buffer):
+            keep = min(len(self), self.capacity - k)
+            self.buffer[:keep] = self.buffer[self.end - keep:self.end]
+            self.start, self.end = 0, keep
+        self.buffer[self.end:self.end + k] = ticks
+        self.end += k
+        self.start = max(self.start, self.end - self.capacity)
+
+
+class SymbolTicks:
+    def __init__(self, capacity):
+        self.buffer = TickBuffer(capacity)
+        self.last_msc = None
+        self.seen_at_last_msc = 0
+        self.stats = None
+        self.lock = threading.Lock()
+
+
+def to_ticks(raw):
+    # Terminal tick array (time, bid, ask, last, volume, time_msc, flags, volume_real) -> TICK_DTYPE
+    ticks = np.empty(len(raw), dtype=TICK_DTYPE)
+    ticks['time_msc'] = raw['time_msc']
+    ticks['bid'] = raw['bid']
+    ticks['ask'] = raw['ask']
+    ticks['last'] = raw['last']
+    # FX symbols report no trades (last == 0); a tick may also carry only one side
+    mid = np.where((raw['bid'] > 0) & (raw['ask'] > 0), (raw['bid'] + raw['ask']) / 2,
+                   np.maximum(raw['bid'], raw['ask']))
+    ticks['price'] = np.where(raw['last'] > 0, raw['last'], mid)
+    return ticks
+
+
+class TickStream:
+    # Per-symbol tick rings filled incrementally from the last seen tick, with rolling stats
+    # recomputed once per ingest so entry checks only read them.
+
+    def __init__(self, fetch, clock=None, capacity=TICK_BUFFER_SIZE, fast=9, slow=21,
+                 lookback_seconds=TICK_LOOKBACK_SECONDS):
+        # fetch(symbol, date_from_seconds, count) -> terminal tick array (oldest first), or None.
+        # clock(symbol) -> current time in the terminal's clock, used only for the first fetch.
+        self.fetch = fetch
+        self.capacity = capacity
+        self.fast = fast
+        self.slow = slow
+        self.lookback_seconds = lookback_seconds
+        self.clock = clock or (lambda symbol: time.time())
+        self.symbols = {}
+        self.guard = threading.Lock()
+
+    def _state(self, symbol):
+        with self.guard:
+            state = self.symbols.get(symbol)
+            if state is None:
+                state = self.symbols[symbol] = SymbolTicks(self.capacity)
+            return state
+
+    def update(self, symbol):
+        # Pulls ticks newer than the last one seen; returns the refreshed stats
+        state = self._state(symbol)
+        with state.lock:
+            if state.last_msc is None:
+                start = int(self.clock(symbol) - self.lookback_seconds)
+            else:
+                start = state.last_msc // 1000
+            raw = self.fetch(symbol, start, TICK_FETCH_LIMIT)
+            if raw is not None and len(raw):
+                self._ingest(state, raw)
+            return state.stats
+
+    def _ingest(self, state, raw):
+        times = raw['time_msc']
+        if state.last_msc is not None:
+            # The fetch starts at a whole second, so skip what we already have; several ticks
+            # can share a millisecond, so count those instead of comparing times alone
+            skip = int(np.searchsorted(times, state.last_msc, side='left'))
+            same = int(np.searchsorted(times, state.last_msc, side='right')) - skip
+            raw = raw[skip + min(same, state.seen_at_last_msc):]
+            if len(raw) == 0:
+                return
+            times = raw['time_msc']
+        last_msc = int(times[-1])
+        at_last = len(times) - int(np.searchsorted(times, last_msc, side='left'))
+        state.seen_at_last_msc = at_last + (state.seen_at_last_msc if last_msc == state.last_msc else 0)
+        state.last_msc = last_msc
+        state.buffer.append(to_ticks(raw))
+        state.stats = self.compute_stats(state.buffer.view(self.slow + 1), len(state.buffer))
+
+    def compute_stats(self, ticks, count):
+        prices = ticks['price']
+        last = ticks[-1]
+        fast = prices[-self.fast:].mean() if len(prices) >= self.fast else np.nan
+        slow = prices[-self.slow:].mean() if len(prices) >= self.slow else np.nan
+        window = prices[-(self.slow + 1):]
+        moves = np.diff(window)
+        path = np.abs(moves).sum()
+        efficiency = abs(window[-1] - window[0]) / path if path > 0 else 0.0
+        returns = np.diff(np.log(window)) if len(window) > 2 and (window > 0).all() else np.empty(0)
+        volatility = returns.std(ddof=1) if len(returns) > 1 else np.nan
+        return TickStats(int(last['time_msc']), float(last['price']), float(last['bid']), float(last['ask']),
+                         float(last['ask'] - last['bid']), float(fast), float(slow), float(volatility),
+                         float(efficiency), count)
+
+    def ticks(self, symbol, n=None):
+        state = self._state(symbol)
+        with state.lock:
+            return state.buffer.view(n)
+
+    def stats(self, symbol):
+        state = self.symbols.get(symbol)
+        return state.stats if state else None
@@ -0,0 +1,78 @@
+import threading
+import numpy as np
+
+
+class RingBuffer:
+    # Fixed-capacity (time, value) series backed by two float64 arrays; the oldest points are overwritten
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = np.zeros(capacity)
+        self.values = np.zeros(capacity)
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, t, value):
+        self.times[self.head] = t
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def last_time(self):
+        return self.times[self.head - 1] if self.count else None
+
+    def set_last(self, value):
+        self.values[self.head - 1] = value
+
+    def ordered(self):
+        if self.count < self.capacity:
+            return self.times[:self.count], self.values[:self.count]
+        return (np.concatenate((self.times[self.head:], self.times[:self.head])),
+                np.concatenate((self.values[self.head:], self.values[:self.head])))
+
+    def since(self, t=None, limit=None, inclusive=True):
+        times, values = self.ordered()
+        # Inclusive by default, so a bucket still being updated is re-sent and clients merge points
+        # by time; paging passes inclusive=False so the cursor always moves past the last point
+        start = 0 if t is None else int(np.searchsorted(times, t, side='left' if inclusive else 'right'))
+        if limit is not None and len(times) - start > limit:
+            # Page forward from `since`; without it, return the newest `limit` points
+            start, end = (start, start + limit) if t is not None else (len(times) - limit, len(times))
+        else:
+            end = len(times)
+        return times[start:end], values[start:end]
+
+
+class EquityCurve:
+    # Raw samples plus 1-minute and 1-hour downsampled series (last value per bucket),
+    # each in its own fixed-size ring so memory stays flat however long the bot runs.
+    RESOLUTIONS = {'raw': 0, '1m': 60, '1h': 3600}
+
+    def __init__(self, raw_capacity=10_000, minute_capacity=7 * 24 * 60, hour_capacity=365 * 24):
+        capacities = {'raw': raw_capacity, '1m': minute_capacity, '1h': hour_capacity}
+        self.series = {name: RingBuffer(capacities[name]) for name in self.RESOLUTIONS}
+        self.lock = threading.Lock()
+        self.version = 0
+
+    def append(self, t, value):
+        with self.lock:
+            for name, step in self.RESOLUTIONS.items():
+                series = self.series[name]
+                if step == 0:
+                    series.append(t, value)
+                    continue
+                bucket = t - t % step
+                if series.last_time() == bucket:
+                    series.set_last(value)
+                else:
+                    series.append(bucket, value)
+            self.version += 1
+
+    def points(self, resolution='1m', since=None, limit=500, inclusive=True):
+        if resolution not in self.series:
+            raise ValueError(f"Unknown resolution {resolution!r}, expected one of {list(self.RESOLUTIONS)}")
+        with self.lock:
+            times, values = self.series[resolution].since(since, limit, inclusive)
+            return np.column_stack((times, values)).tolist()
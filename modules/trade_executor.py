@@ -1,23 +1,31 @@
+import os
+import time
 import logging
-import MetaTrader5 as mt5
+import mt5_constants as mt5
 import numpy as np
-import pandas as pd
-from pykalman import KalmanFilter
+from kalman_filter import OnlineKalmanFilter
+from risk import MIN_LOT, risk_lot_size, dynamic_stops
+from utils import CallError
+from instrumentation import timer
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from economic_calendar import EconomicCalendar  # your module
 from telegram_notifier import TelegramNotifier  # your module
 
+ORDER_WORKERS = int(os.getenv("ORDER_WORKERS", 4))
+MAGIC = 234000
+
+
 class TradeExecutor:
-    def __init__(self, mt5_manager, notifier: TelegramNotifier):
+    def __init__(self, mt5_manager, notifier: TelegramNotifier, economic_calendar=None):
         self.mt5_manager = mt5_manager
         self.notifier = notifier
         self.kalman_filters = {}
-        self.economic_calendar = EconomicCalendar()
+        self.economic_calendar = economic_calendar or EconomicCalendar()
+        self.order_pool = ThreadPoolExecutor(max_workers=ORDER_WORKERS, thread_name_prefix="orders")
 
     def init_kalman_filter(self, symbol):
-        kf = KalmanFilter(
-            transition_matrices=[1],
-            observation_matrices=[1],
+        kf = OnlineKalmanFilter(
             initial_state_mean=0,
             initial_state_covariance=1,
             observation_covariance=1,
@@ -26,95 +34,74 @@ class TradeExecutor:
         self.kalman_filters[symbol] = kf
         return kf
 
-    def get_filtered_price(self, symbol, prices):
+    def get_filtered_price(self, symbol, prices, times=None):
+        # With tick times the filter keeps its state and only steps over ticks newer than the
+        # last one it saw; without them the window is filtered from scratch as before.
         if symbol not in self.kalman_filters:
             self.init_kalman_filter(symbol)
 
         kf = self.kalman_filters[symbol]
-        if len(prices) < 10:
+        if len(prices) < 10 and kf.count == 0:
             return prices[-1] if len(prices) > 0 else None
 
-        filtered_state_means, _ = kf.filter(prices)
-        return filtered_state_means[-1][0]
-
-    def calculate_lot_size(self, symbol, entry_price, stop_price, risk_percent):
-        account_info = self.mt5_manager.get_account_info()
-        symbol_info = self.mt5_manager.get_symbol_info(symbol)
-        if account_info is None or symbol_info is None:
-            return 0.01
-
-        current_balance = account_info.balance
-        drawdown = (account_info.equity - current_balance) / account_info.equity if account_info.equity > 0 else 0
-
-        adjusted_risk = risk_percent
-        if drawdown > 0.05:
-            adjusted_risk = max(risk_percent * 0.5, 0.005)
+        if times is None:
+            kf.reset()
+            return kf.update_many(prices)
 
-        risk_amount = current_balance * adjusted_risk
-        pip_value = symbol_info.trade_tick_value / symbol_info.trade_tick_size
-        pips_risk = abs(entry_price - stop_price) / symbol_info.point
+        times = np.asarray(times)
+        start = 0 if kf.last_time is None else int(np.searchsorted(times, kf.last_time, side='right'))
+        if start < len(prices):
+            kf.update_many(np.asarray(prices, dtype=np.float64)[start:])
+            kf.last_time = times[-1]
+        return kf.mean
 
-        if pips_risk == 0:
-            return 0.01
-
-        lot_size = (risk_amount / pips_risk) / pip_value
-        lot_size = max(round(lot_size, 2), symbol_info.volume_min)
-        lot_size = min(lot_size, symbol_info.volume_max)
+    def calculate_lot_size(self, symbol, entry_price, stop_price, risk_percent):
+        # Snapshot account state, cached spec and precomputed margin: no terminal round trips
+        # on the order path once the cycle's snapshots are warm
+        account_info = self.mt5_manager.get_account_snapshot()
+        symbol_info = self.mt5_manager.get_symbol_spec(symbol)
+        lot_size = risk_lot_size(account_info.balance, account_info.equity, risk_percent,
+                                 entry_price, stop_price, symbol_info)
 
-        margin_required = mt5.order_calc_margin(
+        margin_required = self.mt5_manager.margin_required(
             mt5.ORDER_TYPE_BUY if entry_price > stop_price else mt5.ORDER_TYPE_SELL,
             symbol,
             lot_size,
             entry_price
         )
 
-        if margin_required is None or margin_required > account_info.margin_free:
+        if margin_required > account_info.margin_free:
             logging.warning("Insufficient margin for desired position size")
-            return 0.01
+            return MIN_LOT
 
         return lot_size
 
-    def calculate_dynamic_stops(self, symbol, entry_price, direction, atr):
-        symbol_info = self.mt5_manager.get_symbol_info(symbol)
-        if not symbol_info:
-            return None, None
-
-        point = symbol_info.point
-        spread = symbol_info.ask - symbol_info.bid
-
-        if direction == "BUY":
-            base_sl = entry_price - (atr * 1.5 * point)
-            base_tp = entry_price + (atr * 3 * point)
-            base_sl -= spread
-            base_tp -= spread
-            base_sl = max(base_sl, symbol_info.ask - (symbol_info.ask * 0.05))
-        else:
-            base_sl = entry_price + (atr * 1.5 * point)
-            base_tp = entry_price - (atr * 3 * point)
-            base_sl += spread
-            base_tp += spread
-            base_sl = min(base_sl, symbol_info.bid + (symbol_info.bid * 0.05))
-
-        return base_sl, base_tp
+    def calculate_dynamic_stops(self, symbol, entry_price, direction, atr, bid=None, ask=None):
+        symbol_info = self.mt5_manager.get_symbol_spec(symbol)
+        if bid is None or ask is None:
+            tick = self.mt5_manager.get_symbol_tick(symbol)
+            bid, ask = tick.bid, tick.ask
+        return dynamic_stops(entry_price, direction, atr, symbol_info.point, bid, ask)
 
     def should_enter_trade(self, symbol, direction, current_price):
         regime = self.mt5_manager.check_market_regime(symbol)
+        # Rolling tick stats are maintained by the tick stream as ticks arrive
+        stats = self.mt5_manager.update_ticks(symbol)
+        if stats is None:
+            return False
         recent_ticks = self.mt5_manager.get_ticks(symbol, n=50)
-        recent_prices = [tick.last for tick in recent_ticks]
-        filtered_price = self.get_filtered_price(symbol, recent_prices)
+        filtered_price = self.get_filtered_price(symbol, recent_ticks.price, recent_ticks.time_msc)
 
         if filtered_price is None:
             return False
 
         if regime == "trending":
-            ma_fast = pd.Series(recent_prices).rolling(9).mean().iloc[-1]
-            ma_slow = pd.Series(recent_prices).rolling(21).mean().iloc[-1]
-            if direction == "BUY" and ma_fast < ma_slow:
+            if direction == "BUY" and stats.ma_fast < stats.ma_slow:
                 return False
-            elif direction == "SELL" and ma_fast > ma_slow:
+            elif direction == "SELL" and stats.ma_fast > stats.ma_slow:
                 return False
 
-        if self.economic_calendar.is_high_impact_event_now():
+        if self.economic_calendar.is_high_impact_event_now(currencies=(symbol[:3], symbol[3:6])):
             return False
 
         return True
@@ -129,11 +116,16 @@ class TradeExecutor:
             "sl": sl,
             "tp": tp,
             "deviation": 10,
-            "magic": 234000,
+            "magic": MAGIC,
             "comment": "Advanced bot",
         }
-        result = self.mt5_manager.order_send(request)
-        if result and result.retcode == mt5.TRADE_RETCODE_DONE:
+        try:
+            result = self.mt5_manager.order_send(request)
+        except CallError as e:
+            logging.error(f"Failed to open position on {symbol}: {e}")
+            return None
+        if result.retcode == mt5.TRADE_RETCODE_DONE:
+            self.mt5_manager.mark_account_stale()
             msg = f"Position opened: {'BUY' if order_type == mt5.ORDER_TYPE_BUY else 'SELL'} {lot_size} lots on {symbol} at {entry_price:.5f}"
             logging.info(msg)
             self.notifier.send_message(msg)
@@ -143,8 +135,10 @@ class TradeExecutor:
             return None
 
     def close_position(self, position):
-        tick = self.mt5_manager.get_symbol_tick(position.symbol)
-        if tick is None:
+        try:
+            tick = self.mt5_manager.get_symbol_tick(position.symbol)
+        except CallError as e:
+            logging.error(f"Failed to close position {position.ticket}: {e}")
             return False
         price = tick.bid if position.type == mt5.POSITION_TYPE_BUY else tick.ask
         request = {
@@ -155,11 +149,16 @@ class TradeExecutor:
             "type": mt5.ORDER_TYPE_SELL if position.type == mt5.POSITION_TYPE_BUY else mt5.ORDER_TYPE_BUY,
             "price": price,
             "deviation": 10,
-            "magic": 234000,
+            "magic": MAGIC,
             "comment": "Close position",
         }
-        result = self.mt5_manager.order_send(request)
-        if result and result.retcode == mt5.TRADE_RETCODE_DONE:
+        try:
+            result = self.mt5_manager.order_send(request)
+        except CallError as e:
+            logging.error(f"Failed to close position {position.ticket}: {e}")
+            return False
+        if result.retcode == mt5.TRADE_RETCODE_DONE:
+            self.mt5_manager.mark_account_stale()
             msg = f"Position closed: {position.volume} lots on {position.symbol} at {price:.5f}"
             logging.info(msg)
             self.notifier.send_message(msg)
@@ -167,3 +166,152 @@ class TradeExecutor:
         else:
             logging.error(f"Failed to close position: {result}")
             return False
+
+    # Batch orders: intents are dicts, either
+    #   open:  {'symbol', 'direction': 'BUY'|'SELL', 'price', 'sl', 'tp'[, 'volume']}
+    #   close: {'position': <position record>}
+    # Opens without a volume are sized from the risk budget. All opens are checked together
+    # against free margin, sent concurrently, reconciled against positions_get by ticket and
+    # reported as one notification.
+
+    def prepare_open(self, intent, account, margin_left, risk_percent):
+        symbol, direction, price, sl = intent['symbol'], intent['direction'], intent['price'], intent['sl']
+        tp = intent.get('tp', 0.0)
+        if direction not in ("BUY", "SELL"):
+            raise ValueError(f"unknown direction {direction!r}")
+        if (direction == "BUY" and not sl < price) or (direction == "SELL" and not sl > price):
+            raise ValueError(f"stop {sl} is on the wrong side of {price}")
+
+        spec = self.mt5_manager.get_symbol_spec(symbol)
+        volume = intent.get('volume')
+        if volume is None:
+            volume = risk_lot_size(account.balance, account.equity, risk_percent, price, sl, spec)
+        step = getattr(spec, 'volume_step', MIN_LOT) or MIN_LOT
+        volume = min(max(round(round(volume / step) * step, 8), spec.volume_min), spec.volume_max)
+
+        order_type = mt5.ORDER_TYPE_BUY if direction == "BUY" else mt5.ORDER_TYPE_SELL
+        margin = self.mt5_manager.margin_required(order_type, symbol, volume, price)
+        if margin > margin_left:
+            # Same fallback as calculate_lot_size: minimum lot if that still fits
+            volume = max(MIN_LOT, spec.volume_min)
+            margin = self.mt5_manager.margin_required(order_type, symbol, volume, price)
+            if margin > margin_left:
+                raise ValueError("insufficient margin")
+        request = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": symbol,
+            "volume": volume,
+            "type": order_type,
+            "price": price,
+            "sl": sl,
+            "tp": tp,
+            "deviation": 10,
+            "magic": MAGIC,
+            "comment": "Advanced bot",
+        }
+        return request, margin
+
+    def prepare_close(self, intent):
+        position = intent['position']
+        return {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "position": position.ticket,
+            "symbol": position.symbol,
+            "volume": position.volume,
+            "type": mt5.ORDER_TYPE_SELL if position.type == mt5.POSITION_TYPE_BUY else mt5.ORDER_TYPE_BUY,
+            "deviation": 10,
+            "magic": MAGIC,
+            "comment": "Close position",
+        }
+
+    def _send(self, request):
+        try:
+            with timer('order_send_seconds', symbol=request["symbol"]):
+                return self._send_request(request), None
+        except CallError as e:
+            return None, str(e)
+
+    def _send_request(self, request):
+        if "position" in request:
+            tick = self.mt5_manager.get_symbol_tick(request["symbol"])
+            request["price"] = tick.bid if request["type"] == mt5.ORDER_TYPE_SELL else tick.ask
+        return self.mt5_manager.order_send(request)
+
+    def submit_batch(self, intents, risk_percent=0.01, notify=True, chat_id=None):
+        start = time.perf_counter()
+        reports = [{'symbol': intent['position'].symbol if 'position' in intent else intent['symbol'],
+                    'action': 'close' if 'position' in intent else 'open',
+                    'status': 'rejected', 'ticket': None, 'volume': None, 'price': None, 'error': None}
+                   for intent in intents]
+
+        # Validate and size together so the batch cannot overcommit free margin
+        requests = []
+        account = self.mt5_manager.get_account_snapshot()
+        margin_left = account.margin_free
+        for report, intent in zip(reports, intents):
+            if intent.get('error'):
+                # Could not be built upstream (e.g. its spec lookup failed); reported, not sent
+                report['error'] = intent['error']
+                continue
+            try:
+                if report['action'] == 'close':
+                    request = self.prepare_close(intent)
+                else:
+                    request, margin = self.prepare_open(intent, account, margin_left, risk_percent)
+                    margin_left -= margin
+            except (ValueError, KeyError, CallError) as e:
+                report['error'] = str(e)
+                continue
+            requests.append((report, request))
+
+        sent = list(self.order_pool.map(self._send, [request for _, request in requests]))
+        if any(result is not None for result, _ in sent):
+            self.mt5_manager.mark_account_stale()
+
+        # Reconcile by ticket: opens should now be in the book, closes gone from it
+        try:
+            book = {position.ticket: position for position in self.mt5_manager.positions_get()}
+        except CallError as e:
+            logging.warning(f"Could not reconcile batch against open positions: {e}")
+            book = None
+        for (report, request), (result, error) in zip(requests, sent):
+            report['volume'] = request['volume']
+            report['price'] = request.get('price')
+            if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
+                report['error'] = error or f"retcode {result.retcode}: {result.comment}"
+                continue
+            report['price'] = result.price or report['price']
+            if report['action'] == 'open':
+                report['ticket'] = result.order
+                filled = book is None or result.order in book
+                report['status'] = 'filled' if filled else 'unconfirmed'
+            else:
+                report['ticket'] = request['position']
+                closed = book is None or request['position'] not in book
+                report['status'] = 'closed' if closed else 'unconfirmed'
+
+        elapsed = time.perf_counter() - start
+        if reports:
+            summary = self.summarize_batch(reports, elapsed)
+            logging.info(summary)
+            if notify:
+                self.notifier.send_message(summary, chat_id)
+        return reports
+
+    @staticmethod
+    def summarize_batch(reports, elapsed):
+        counts = {}
+        for report in reports:
+            counts[report['status']] = counts.get(report['status'], 0) + 1
+        lines = [f"Batch of {len(reports)} orders in {elapsed:.2f}s: "
+                 + ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))]
+        for report in reports:
+            if report['status'] in ('filled', 'closed'):
+                lines.append(f"{report['action']} {report['symbol']} {report['volume']} lots at {report['price']:.5f}")
+            else:
+                lines.append(f"{report['action']} {report['symbol']} {report['status']}: {report['error'] or 'not in book'}")
+        return "\n".join(lines)
+
+    def close_all(self, symbol=None, notify=True, chat_id=None):
+        positions = self.mt5_manager.positions_get(symbol=symbol)
+        return self.submit_batch([{'position': position} for position in positions], notify=notify, chat_id=chat_id)
@@ -1,52 +1,70 @@
 import os
 import logging
 import pandas as pd
+import mt5_constants as mt5
 from datetime import datetime, timedelta
+from trade_store import TradeStore, records_from_rows
+from performance_metrics import PerformanceTracker, deal_net_profit
+from utils import CallError
+
+# Re-read this much history before the last stored deal; covers broker server-time offsets.
+# Overlapping deals are dropped by ticket.
+HISTORY_OVERLAP = timedelta(hours=6)
+
 
 class TradeLogger:
-    def __init__(self, mt5_manager, log_file='trade_history.csv'):
+    def __init__(self, mt5_manager, log_dir='trade_history', legacy_log_file='trade_history.csv'):
         self.mt5_manager = mt5_manager
-        self.log_file = log_file
+        self.store = TradeStore(log_dir)
+        if len(self.store) == 0 and legacy_log_file and os.path.exists(legacy_log_file):
+            self.import_csv(legacy_log_file)
+
+        # Metrics are replayed from disk once here, then updated only with newly logged deals
+        history = self.store.read()
+        self.metrics = PerformanceTracker(self.estimate_initial_balance(history))
+        self.metrics.update_records(history)
+
+    def estimate_initial_balance(self, history):
+        # Balance before the first stored deal, so drawdown is measured against real equity
+        try:
+            account_info = self.mt5_manager.get_account_info()
+        except Exception as e:
+            logging.warning(f"Could not read account balance for metrics: {e}")
+            return None
+        return account_info.balance - float(deal_net_profit(history).sum())
+
+    def import_csv(self, path):
+        df = pd.read_csv(path, parse_dates=['time'])
+        # Whole seconds whatever resolution read_csv picked (pandas 3 parses to microseconds)
+        df['time'] = (df['time'] - pd.Timestamp(0)) // pd.Timedelta(seconds=1) if len(df) else df['time']
+        added = self.store.append(records_from_rows(df.to_dict('records')))
+        logging.info(f"Imported {len(added)} trades from {path}")
 
     def log_closed_trades(self):
         try:
             now = datetime.utcnow()
-            from_time = now - timedelta(days=7)
+            if self.store.last_deal_time is None:
+                from_time = now - timedelta(days=7)
+            else:
+                from_time = datetime.utcfromtimestamp(self.store.last_deal_time) - HISTORY_OVERLAP
             deals = self.mt5_manager.history_deals_get(from_time, now)
-            if deals is None or len(deals) == 0:
+            if len(deals) == 0:
                 logging.info("No recent closed trades to log.")
                 return
 
-            df = pd.DataFrame(list(deals), columns=deals[0]._asdict().keys())
-            df['time'] = pd.to_datetime(df['time'], unit='s')
-            df = df[df['type'].isin([1, 2])]  # BUY and SELL only
-
-            if os.path.exists(self.log_file):
-                existing = pd.read_csv(self.log_file, parse_dates=['time'])
-                combined = pd.concat([existing, df]).drop_duplicates(subset='ticket')
-            else:
-                combined = df
-
-            combined.to_csv(self.log_file, index=False)
-            logging.info(f"Logged {len(df)} closed trades to {self.log_file}")
+            last_deal_time = max(deal.time for deal in deals)
+            # Trades only; balance, credit and other non-trade deals are left out
+            trades = [deal._asdict() for deal in deals if deal.type in (mt5.DEAL_TYPE_BUY, mt5.DEAL_TYPE_SELL)]
+            added = self.store.append(records_from_rows(trades), last_deal_time=last_deal_time)
+            self.metrics.update_records(added)
+            self.store.maybe_compact()
+            logging.info(f"Logged {len(added)} closed trades to {self.store.directory}")
 
+        except CallError as e:
+            logging.warning(f"Trade logging skipped, broker unavailable: {e}")
         except Exception as e:
             logging.error(f"Trade logging failed: {e}", exc_info=True)
 
-    def calculate_performance_metrics(self):
-        if not os.path.exists(self.log_file):
-            return None
-
-        df = pd.read_csv(self.log_file)
-        if df.empty:
-            return None
-
-        metrics = {
-            'win_rate': len(df[df['profit'] > 0]) / len(df) * 100,
-            'avg_win': df[df['profit'] > 0]['profit'].mean(),
-            'avg_loss': df[df['profit'] <= 0]['profit'].mean(),
-            'profit_factor': abs(df[df['profit'] > 0]['profit'].sum() / df[df['profit'] <= 0]['profit'].sum()),
-            'max_drawdown': (df['balance'].max() - df['balance'].min()) / df['balance'].max()
-        }
-
-        return metrics
+    def calculate_performance_metrics(self, breakdown=False):
+        # In-memory; never touches disk
+        return self.metrics.snapshot(breakdown=breakdown)
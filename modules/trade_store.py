@@ -0,0 +1,184 @@
+import os
+import json
+import glob
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+DEAL_DTYPE = np.dtype([
+    ('ticket', '<i8'),
+    ('order', '<i8'),
+    ('time', '<i8'),
+    ('time_msc', '<i8'),
+    ('type', '<i4'),
+    ('entry', '<i4'),
+    ('magic', '<i8'),
+    ('position_id', '<i8'),
+    ('reason', '<i4'),
+    ('volume', '<f8'),
+    ('price', '<f8'),
+    ('commission', '<f8'),
+    ('swap', '<f8'),
+    ('profit', '<f8'),
+    ('fee', '<f8'),
+    ('symbol', '<U32'),
+    ('comment', '<U32'),
+    ('external_id', '<U32'),
+])
+COMPACT_THRESHOLD = int(os.getenv("TRADE_STORE_COMPACT_THRESHOLD", 64))
+
+
+def records_from_rows(rows):
+    # rows: iterable of dicts (e.g. TradeDeal._asdict()); unknown keys are ignored, missing ones zeroed
+    defaults = {name: '' if DEAL_DTYPE[name].kind == 'U' else 0 for name in DEAL_DTYPE.names}
+    return np.array([tuple(row.get(name, defaults[name]) for name in DEAL_DTYPE.names) for row in rows],
+                    dtype=DEAL_DTYPE)
+
+
+class TradeStore:
+    # Append-only deal history: immutable .npy segments in arrival order, an append-only
+    # ticket index and a small JSON state file. Nothing already written is rewritten except
+    # by compact(), which merges segments off the logging path.
+
+    def __init__(self, directory, compact_threshold=COMPACT_THRESHOLD):
+        self.directory = directory
+        self.compact_threshold = compact_threshold
+        self.index_file = os.path.join(directory, 'tickets.bin')
+        self.state_file = os.path.join(directory, 'state.json')
+        self.lock = threading.Lock()
+        self.compaction_thread = None
+        os.makedirs(directory, exist_ok=True)
+
+        self.state = {'last_deal_time': None, 'next_segment': 0, 'rows': 0}
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as f:
+                self.state.update(json.load(f))
+        self._finish_compaction()
+        tickets = np.fromfile(self.index_file, dtype='<i8') if os.path.exists(self.index_file) else np.empty(0, '<i8')
+        # The segments are the source of truth: an append interrupted after its segment landed
+        # leaves the index and/or state.json behind them
+        segments = [np.load(path, mmap_mode='r') for path in self.segments()]
+        rows = sum(len(segment) for segment in segments)
+        next_segment = self._segment_number(self.segments()[-1]) + 1 if segments else 0
+        if len(tickets) != rows or self.state['rows'] != rows or self.state['next_segment'] < next_segment:
+            logging.warning(f"Trade store {directory} was interrupted mid-append, rebuilding index from segments")
+            tickets = np.concatenate([segment['ticket'] for segment in segments] or [tickets[:0]]).astype('<i8')
+            tickets.tofile(self.index_file)
+            self.state['rows'] = rows
+            self.state['next_segment'] = max(self.state['next_segment'], next_segment)
+            self._save_state()
+        self.tickets = set(tickets.tolist())
+
+    @property
+    def last_deal_time(self):
+        return self.state['last_deal_time']
+
+    def __len__(self):
+        return self.state['rows']
+
+    @staticmethod
+    def _segment_number(path):
+        return int(os.path.basename(path)[len('segment_'):-len('.npy')])
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'segment_*.npy')))
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"segment_{number:08d}.npy")
+
+    def _apply_compaction(self, numbers):
+        # Idempotent: safe to repeat after a crash at any point
+        merged = self._segment_path(numbers[-1])
+        if os.path.exists(merged + '.compact'):
+            os.replace(merged + '.compact', merged)
+        for number in numbers[:-1]:
+            if os.path.exists(self._segment_path(number)):
+                os.remove(self._segment_path(number))
+
+    def _finish_compaction(self):
+        # state['compacting'] lists the segments a compaction merges into the last of them. It is
+        # saved before any file changes, so after a crash the merge is completed rather than
+        # the old segments being read alongside the merged one.
+        numbers = self.state.pop('compacting', None)
+        if numbers:
+            logging.warning(f"Trade store {self.directory} was interrupted mid-compaction, finishing it")
+            self._apply_compaction(numbers)
+            self._save_state()
+        # Merged files never recorded in state.json are from a compaction that had not started
+        for path in glob.glob(os.path.join(self.directory, 'segment_*.npy.compact')):
+            os.remove(path)
+
+    def _save_state(self):
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_file)
+
+    def append(self, records, last_deal_time=None):
+        # Returns the deals actually written; tickets already stored are skipped
+        with self.lock:
+            if len(records):
+                seen = self.tickets
+                fresh = np.fromiter((ticket not in seen for ticket in records['ticket'].tolist()),
+                                    dtype=bool, count=len(records))
+                records = records[fresh]
+                _, first = np.unique(records['ticket'], return_index=True)
+                records = records[np.sort(first)]
+            if len(records):
+                path = self._segment_path(self.state['next_segment'])
+                tmp = path + '.tmp'
+                with open(tmp, 'wb') as f:
+                    np.save(f, records)
+                os.replace(tmp, path)
+                with open(self.index_file, 'ab') as f:
+                    records['ticket'].astype('<i8').tofile(f)
+                self.tickets.update(records['ticket'].tolist())
+                self.state['next_segment'] += 1
+                self.state['rows'] += len(records)
+            if last_deal_time is not None:
+                self.state['last_deal_time'] = max(last_deal_time, self.state['last_deal_time'] or 0)
+            self._save_state()
+            return records
+
+    def read(self):
+        # Opened under the lock so a compaction cannot remove a segment in between; the
+        # mappings stay valid after it does
+        with self.lock:
+            parts = [np.load(path, mmap_mode='r') for path in self.segments()]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=DEAL_DTYPE)
+
+    def to_frame(self):
+        df = pd.DataFrame(self.read())
+        df['time'] = pd.to_datetime(df['time'], unit='s')
+        return df
+
+    def compact(self):
+        # Merge all current segments into one file that takes the newest merged segment's
+        # name, so ordering against segments appended meanwhile is preserved.
+        with self.lock:
+            paths = self.segments()
+        if len(paths) < 2:
+            return 0
+        merged = np.concatenate([np.load(path, mmap_mode='r') for path in paths])
+        tmp = paths[-1] + '.compact'
+        with open(tmp, 'wb') as f:
+            np.save(f, merged)
+        with self.lock:
+            numbers = [self._segment_number(path) for path in paths]
+            self.state['compacting'] = numbers
+            self._save_state()
+            self._apply_compaction(numbers)
+            del self.state['compacting']
+            self._save_state()
+        logging.info(f"Compacted {len(paths)} trade segments into {os.path.basename(paths[-1])}")
+        return len(paths)
+
+    def maybe_compact(self):
+        if len(self.segments()) < self.compact_threshold:
+            return False
+        if self.compaction_thread is not None and self.compaction_thread.is_alive():
+            return False
+        self.compaction_thread = threading.Thread(target=self.compact, daemon=True)
+        self.compaction_thread.start()
+        return True
@@ -0,0 +1,99 @@
+import os
+import time
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingGridSearchCV, TimeSeriesSplit, train_test_split
+
+TRAIN_CORE_BUDGET = int(os.getenv("TRAIN_CORE_BUDGET", os.cpu_count() or 1))
+TRAIN_TIME_BUDGET = float(os.getenv("TRAIN_TIME_BUDGET", 0))  # seconds, 0 = no deadline
+MAX_ESTIMATORS = 300
+
+# n_estimators is the resource successive halving grows, so it is not part of the grid
+PARAM_GRID = {
+    'max_depth': [5, 10, 15],
+    'min_samples_split': [2, 5, 10]
+}
+
+
+def fit_model(X, y, n_jobs=1, features=None):
+    # Features are converted once to the float32 layout the forest uses, and the fold
+    # indices are materialized once, so every candidate and fold reuses the same arrays.
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    folds = list(TimeSeriesSplit(n_splits=5).split(X))
+
+    model = RandomForestClassifier(class_weight='balanced', random_state=42, n_jobs=n_jobs)
+    search = HalvingGridSearchCV(model, PARAM_GRID, cv=folds, scoring='f1', factor=3,
+                                 resource='n_estimators', max_resources=MAX_ESTIMATORS,
+                                 min_resources='exhaust', random_state=42, n_jobs=1)
+    search.fit(X, y)
+
+    best_model = search.best_estimator_
+    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, shuffle=False)
+    metrics = {
+        'train_score': float(best_model.score(X_train, y_train)),
+        'val_score': float(best_model.score(X_val, y_val)),
+        'best_params': {k: v.item() if hasattr(v, 'item') else v for k, v in search.best_params_.items()},
+        'candidates_evaluated': int(sum(search.n_candidates_)),
+    }
+    if features is not None:
+        metrics['feature_importance'] = dict(zip(features, best_model.feature_importances_.tolist()))
+    return best_model, metrics
+
+
+def _fit_symbol(symbol, X, y, n_jobs, features):
+    start = time.perf_counter()
+    model, metrics = fit_model(X, y, n_jobs, features)
+    metrics['train_seconds'] = round(time.perf_counter() - start, 2)
+    return symbol, model, metrics
+
+
+class TrainingScheduler:
+    def __init__(self, core_budget=TRAIN_CORE_BUDGET, time_budget=TRAIN_TIME_BUDGET):
+        self.core_budget = max(1, core_budget)
+        self.time_budget = time_budget
+
+    def plan(self, n_symbols):
+        # Split the budget between symbol workers and forest threads; nothing nests beyond it
+        workers = max(1, min(n_symbols, self.core_budget))
+        return workers, max(1, self.core_budget // workers)
+
+    def run(self, datasets, on_result, features=None):
+        # datasets: {symbol: (X, y)}; on_result(symbol, model, metrics) runs in the calling process
+        if not datasets:
+            return {}
+        workers, n_jobs = self.plan(len(datasets))
+        deadline = time.monotonic() + self.time_budget if self.time_budget > 0 else None
+        logging.info(f"Training {len(datasets)} models on {workers} workers x {n_jobs} threads")
+
+        results = {}
+
+        def collect(future):
+            symbol = futures[future]
+            try:
+                symbol, model, metrics = future.result()
+            except Exception as e:
+                logging.error(f"Training failed for {symbol}: {e}")
+                return
+            on_result(symbol, model, metrics)
+            results[symbol] = metrics
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_fit_symbol, symbol, X, y, n_jobs, features): symbol
+                       for symbol, (X, y) in datasets.items()}
+            done = set()
+            try:
+                timeout = None if deadline is None else max(0, deadline - time.monotonic())
+                for future in as_completed(futures, timeout=timeout):
+                    done.add(future)
+                    collect(future)
+            except TimeoutError:
+                # Queued symbols are dropped; fits already running are kept since their cost is paid
+                skipped = [symbol for future, symbol in futures.items() if future.cancel()]
+                logging.warning(f"Training time budget of {self.time_budget}s exhausted, skipping {skipped}")
+                for future in as_completed(f for f in futures if f not in done and not f.cancelled()):
+                    collect(future)
+        return results
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class CompiledForest:
+    # A fitted sklearn tree ensemble flattened into node arrays. Leaves point to themselves,
+    # so every tree can be walked in lockstep for max_depth steps without branching.
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.depth = depth
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            index = np.arange(n) + offset
+            is_leaf = tree.children_left == -1
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, index, tree.children_left + offset))
+            rights.append(np.where(is_leaf, index, tree.children_right + offset))
+            value = tree.value[:, 0, :]
+            values.append(value / value.sum(axis=1, keepdims=True))
+            roots.append(offset)
+            depth = max(depth, tree.max_depth)
+            offset += n
+        return cls(np.concatenate(features).astype(np.intp), np.concatenate(thresholds),
+                   np.concatenate(lefts).astype(np.intp), np.concatenate(rights).astype(np.intp),
+                   np.concatenate(values), np.array(roots, dtype=np.intp),
+                   np.asarray(forest.classes_), depth)
+
+    def predict_proba(self, X):
+        # sklearn compares float32 features against float64 thresholds; do the same
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
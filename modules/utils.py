@@ -1,16 +1,228 @@
+import os
 import time
+import random
+import asyncio
 import logging
+import functools
+import threading
+from instrumentation import METRICS
 
-def retry(max_retries=3, delay=2):
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 30))
+
+
+class CallError(Exception):
+    def __init__(self, endpoint, message):
+        super().__init__(f"{endpoint}: {message}")
+        self.endpoint = endpoint
+
+
+class RetryError(CallError):
+    # Every attempt failed; __cause__ is the last underlying error
+    def __init__(self, endpoint, attempts):
+        super().__init__(endpoint, f"failed after {attempts} attempt(s)")
+        self.attempts = attempts
+
+
+class CircuitOpenError(CallError):
+    # Short-circuited without calling the endpoint
+    def __init__(self, endpoint, retry_in):
+        super().__init__(endpoint, f"circuit open, next trial in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    # closed: calls pass, consecutive failures are counted.
+    # open: calls fail fast until reset_timeout has passed.
+    # half_open: one trial call at a time; success closes the circuit, failure re-opens it.
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and retry_in <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return
+            raise CircuitOpenError(self.name, max(retry_in, 0.0))
+
+    def record_success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                logging.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def release_trial(self):
+        # The trial ended in an error that says nothing about the endpoint (not in retry_on,
+        # or cancelled); let the next call make the trial instead
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(f"Circuit for {self.name} opened after {self.failures} failure(s)")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class EndpointStats:
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.short_circuits = 0
+        self.seconds = 0.0
+        self.backoff_seconds = 0.0
+
+
+_breakers = {}
+_stats = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(endpoint):
+    with _registry_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
+
+
+def _record(endpoint, **deltas):
+    with _registry_lock:
+        stats = _stats.setdefault(endpoint, EndpointStats())
+        for key, value in deltas.items():
+            setattr(stats, key, getattr(stats, key) + value)
+
+
+def retry_metrics():
+    with _registry_lock:
+        return {endpoint: dict(vars(stats), state=_breakers[endpoint].state if endpoint in _breakers else None)
+                for endpoint, stats in _stats.items()}
+
+
+def _endpoint_samples():
+    # Broker endpoint counters and circuit state for /metrics
+    for endpoint, stats in retry_metrics().items():
+        labels = {'endpoint': endpoint}
+        for field in ('calls', 'retries', 'failures', 'short_circuits', 'backoff_seconds'):
+            yield f"broker_{field}_total", 'counter', labels, stats[field]
+        yield 'broker_circuit_open', 'gauge', labels, int(stats['state'] == CircuitBreaker.OPEN)
+
+
+METRICS.collectors.append(_endpoint_samples)
+
+
+def backoff_delay(attempt, delay, max_delay):
+    # Full jitter: uniform in [0, min(max_delay, delay * 2**attempt)]
+    return random.uniform(0, min(max_delay, delay * 2 ** attempt))
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def retry(max_retries=3, delay=0.5, max_delay=5.0, endpoint=None, breaker=True, retry_on=(Exception,)):
+    # Retries with jittered exponential backoff behind a per-endpoint circuit breaker, then
+    # raises RetryError (or CircuitOpenError). Coroutine functions back off with asyncio.sleep;
+    # plain functions called on the event loop thread get a single attempt so they never
+    # sleep on the loop.
     def decorator(func):
+        name = endpoint or func.__qualname__
+        circuit = get_breaker(name) if breaker else None
+
+        def before_attempt():
+            if circuit:
+                try:
+                    circuit.before_call()
+                except CircuitOpenError:
+                    _record(name, short_circuits=1)
+                    raise
+
+        def after_attempt(error, attempt, attempts, start):
+            # Returns the backoff to sleep before the next attempt; raises once attempts run out
+            if circuit:
+                circuit.record_failure()
+            # No point backing off into a circuit that just opened
+            if attempt + 1 >= attempts or (circuit and circuit.state == CircuitBreaker.OPEN):
+                elapsed = time.monotonic() - start
+                _record(name, failures=1, seconds=elapsed)
+                METRICS.observe('broker_call_seconds', elapsed, endpoint=name, outcome='failed')
+                logging.error(f"Giving up on {name} after {attempt + 1} attempt(s): {error}")
+                raise RetryError(name, attempt + 1) from error
+            wait = backoff_delay(attempt, delay, max_delay)
+            logging.warning(f"Attempt {attempt+1} failed in {name}: {error}; retrying in {wait:.2f}s")
+            _record(name, retries=1, backoff_seconds=wait)
+            return wait
+
+        def succeeded(start):
+            if circuit:
+                circuit.record_success()
+            elapsed = time.monotonic() - start
+            _record(name, seconds=elapsed)
+            # Whole call including retries and backoff; attempts are counted in broker_retries_total
+            METRICS.observe('broker_call_seconds', elapsed, endpoint=name, outcome='ok')
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.monotonic()
+                _record(name, calls=1)
+                for attempt in range(max_retries):
+                    before_attempt()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except retry_on as e:
+                        await asyncio.sleep(after_attempt(e, attempt, max_retries, start))
+                        continue
+                    except BaseException:
+                        if circuit:
+                            circuit.release_trial()
+                        raise
+                    succeeded(start)
+                    return result
+            return async_wrapper
+
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            for attempt in range(max_retries):
+            start = time.monotonic()
+            _record(name, calls=1)
+            attempts = 1 if _on_event_loop() else max_retries
+            for attempt in range(attempts):
+                before_attempt()
                 try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    logging.warning(f"Attempt {attempt+1} failed in {func.__name__}: {e}")
-                    time.sleep(delay * (2 ** attempt))
-            logging.error(f"Max retries reached for {func.__name__}")
-            return None
+                    result = func(*args, **kwargs)
+                except retry_on as e:
+                    time.sleep(after_attempt(e, attempt, attempts, start))
+                    continue
+                except BaseException:
+                    if circuit:
+                        circuit.release_trial()
+                    raise
+                succeeded(start)
+                return result
         return wrapper
     return decorator
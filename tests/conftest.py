@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules import their siblings by bare name, so tests do the same
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from backtester import BUY, Backtester
+from feature_engine import WARMUP_BARS
+
+BAR_DTYPE = [('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8')]
+
+
+class FirstBarSignal:
+    # p_up of 0.9 on the first bar after warm-up, undecided (0.5) everywhere else
+    classes_ = np.array([0, 1])
+
+    def predict_proba(self, features):
+        p_up = np.full(len(features), 0.5)
+        p_up[0] = 0.9
+        return np.column_stack([1 - p_up, p_up])
+
+
+def flat_bars(n=WARMUP_BARS + 10, price=1.0, tp_bar=WARMUP_BARS + 3):
+    # Flat prices with a 20-point range (ATR 200 points) and one spike high enough to hit take-profit
+    bars = np.zeros(n, dtype=BAR_DTYPE)
+    bars['time'] = 1_700_000_000 + np.arange(n) * 900
+    bars['open'] = bars['close'] = price
+    bars['high'] = price + 0.001
+    bars['low'] = price - 0.001
+    bars['high'][tp_bar] = price + 0.01
+    return bars
+
+
+def test_single_trade_matches_hand_computation():
+    result = Backtester(FirstBarSignal()).run({'EURUSD': flat_bars()})
+
+    # Signal on bar W, filled at bar W+1's open: ask 1.0001 (10-point default spread) plus
+    # 1 point of slippage. Stops use ATR 200 points, less the spread:
+    #   tp = 1.0001 + 200 * 3.0 * 1e-5 - 0.0001 = 1.0060
+    # Risk sizing rounds down to nothing, so the minimum 0.01 lot is traded.
+    #   profit = (1.0060 - 1.00011) * 0.01 * tick_value / tick_size = 0.00589 * 0.01 * 1e5 = 5.89
+    times = flat_bars()['time']
+    assert len(result['deals']) == 1
+    opened, closed, symbol, direction, volume, entry, exit_price, profit, reason = result['deals'][0]
+    assert (opened, closed, symbol, direction, reason) == (times[WARMUP_BARS + 1], times[WARMUP_BARS + 3],
+                                                          'EURUSD', BUY, 'tp')
+    assert volume == 0.01
+    assert entry == pytest.approx(1.00011)
+    assert exit_price == pytest.approx(1.0060)
+    assert profit == pytest.approx(5.89)
+    assert result['final_balance'] == pytest.approx(10_000 + 5.89)
+    assert result['metrics']['trades'] == 1
+
+    again = Backtester(FirstBarSignal()).run({'EURUSD': flat_bars()})
+    assert again['deals'] == result['deals']
+    assert np.array_equal(again['equity'], result['equity'])
+
+
+def test_rerun_with_different_bars_does_not_reuse_stale_features():
+    backtester = Backtester(FirstBarSignal())
+    first = backtester.run({'EURUSD': flat_bars(price=1.0)})
+    # Same length and timestamps, different prices
+    second = backtester.run({'EURUSD': flat_bars(price=2.0)})
+    fresh = Backtester(FirstBarSignal()).run({'EURUSD': flat_bars(price=2.0)})
+    assert second['deals'] == fresh['deals']
+    assert second['deals'][0][5] == pytest.approx(2.00011)
+    assert first['deals'][0][5] == pytest.approx(1.00011)
+
+    # A shorter range (e.g. the next walk-forward fold) is recomputed too
+    shorter = backtester.run({'EURUSD': flat_bars(n=WARMUP_BARS + 5)})
+    assert shorter['bars'] == WARMUP_BARS + 5
@@ -0,0 +1,86 @@
+import struct
+import numpy as np
+import pytest
+import mt5_constants as mt5
+from bar_archive import HEADER, MAGIC, VERSION, ArchiveFile, BarArchive
+from bar_cache import RATES_DTYPE
+
+
+def bars(times):
+    rates = np.zeros(len(times), dtype=RATES_DTYPE)
+    rates['time'] = times
+    rates['close'] = np.arange(len(times), dtype=float)
+    return rates
+
+
+def test_header_layout_and_validation(tmp_path):
+    path = str(tmp_path / 'EURUSD_M15.bars')
+    archive = ArchiveFile(path, 'EURUSD', mt5.TIMEFRAME_M15)
+    archive.append(bars([900, 1800]))
+    with open(path, 'rb') as f:
+        magic, version, record_size, timeframe, _, count, symbol = HEADER.unpack(f.read(HEADER.size))
+    assert HEADER.size == 64
+    assert (magic, version, record_size, timeframe, count) == (MAGIC, VERSION, RATES_DTYPE.itemsize,
+                                                              mt5.TIMEFRAME_M15, 2)
+    assert symbol.rstrip(b'\0') == b'EURUSD'
+
+    with pytest.raises(ValueError):
+        ArchiveFile(path, 'EURUSD', mt5.TIMEFRAME_H1)
+    other = tmp_path / 'other.bars'
+    other.write_bytes(b'NOTBARS!' + bytes(HEADER.size - 8))
+    with pytest.raises(ValueError):
+        ArchiveFile(str(other), 'EURUSD', mt5.TIMEFRAME_M15)
+
+
+def test_torn_append_is_invisible_and_overwritten(tmp_path):
+    path = str(tmp_path / 'EURUSD_M15.bars')
+    ArchiveFile(path, 'EURUSD', mt5.TIMEFRAME_M15).append(bars([900, 1800]))
+    # Records landed but the process died before the header count was committed
+    with open(path, 'ab') as f:
+        f.write(bars([2700]).tobytes() + b'partial')
+
+    archive = ArchiveFile(path, 'EURUSD', mt5.TIMEFRAME_M15)
+    assert len(archive) == 2
+    assert archive.append(bars([1800, 2700, 3600])) == 2
+    reopened = ArchiveFile(path, 'EURUSD', mt5.TIMEFRAME_M15)
+    assert reopened.slice()['time'].tolist() == [900, 1800, 2700, 3600]
+
+
+def test_header_count_past_the_data_is_truncated(tmp_path):
+    path = str(tmp_path / 'EURUSD_M15.bars')
+    ArchiveFile(path, 'EURUSD', mt5.TIMEFRAME_M15).append(bars([900, 1800, 2700]))
+    with open(path, 'r+b') as f:
+        f.seek(24)
+        f.write(struct.pack('<q', 10))
+    archive = ArchiveFile(path, 'EURUSD', mt5.TIMEFRAME_M15)
+    assert len(archive) == 3
+    with open(path, 'rb') as f:
+        assert HEADER.unpack(f.read(HEADER.size))[5] == 3
+
+
+def test_slice_is_half_open(tmp_path):
+    archive = ArchiveFile(str(tmp_path / 'a.bars'), 'EURUSD', mt5.TIMEFRAME_M15)
+    archive.append(bars([900, 1800, 2700, 3600]))
+    assert archive.slice(1800, 3600)['time'].tolist() == [1800, 2700]
+    assert archive.slice(1000, None)['time'].tolist() == [1800, 2700, 3600]
+    assert archive.slice(None, 900)['time'].tolist() == []
+    assert not archive.slice().flags.writeable
+
+
+def test_sync_widens_until_it_reaches_stored_bars(tmp_path):
+    history = bars(np.arange(1, 1001) * 900)
+    requests = []
+
+    def fetch(symbol, timeframe, start_pos, count):
+        # Like copy_rates_from_pos: the newest `count` bars before position start_pos
+        requests.append(count)
+        end = len(history) - start_pos
+        return history[max(end - count, 0):end]
+
+    archive = BarArchive(str(tmp_path), fetch, sync_bars=500)
+    assert archive.sync('EURUSD', mt5.TIMEFRAME_M15) == 500
+    history = bars(np.arange(1, 1201) * 900)
+    requests.clear()
+    assert archive.sync('EURUSD', mt5.TIMEFRAME_M15) == 200
+    assert requests == [64, 256]
+    assert archive.bars('EURUSD', mt5.TIMEFRAME_M15)['time'][-1] == 1199 * 900
@@ -0,0 +1,47 @@
+import numpy as np
+from bar_cache import RATES_DTYPE, BarCache
+
+
+class History:
+    # Terminal stand-in: `total` bars of 15-minute history, newest last
+    def __init__(self, total):
+        self.total = total
+        self.requests = []
+
+    def fetch(self, symbol, timeframe, count):
+        self.requests.append(count)
+        count = min(count, self.total)
+        rates = np.zeros(count, dtype=RATES_DTYPE)
+        rates['time'] = (np.arange(self.total - count, self.total) + 1) * 900
+        rates['close'] = np.arange(self.total - count, self.total)
+        return rates
+
+
+def test_larger_request_after_smaller_one_returns_full_history():
+    history = History(5000)
+    cache = BarCache(history.fetch)
+    assert len(cache.get('EURUSD', 15, 100)) == 100
+    bars = cache.get('EURUSD', 15, 2000)
+    assert len(bars) == 2000
+    assert bars['close'][-1] == 4999
+
+
+def test_larger_request_after_gap_reload_refetches():
+    history = History(5000)
+    cache = BarCache(history.fetch)
+    cache.get('EURUSD', 15, 2000)
+    history.total += 500  # more new bars than the overlap search covers for n=100
+    assert len(cache.get('EURUSD', 15, 100)) == 100
+    bars = cache.get('EURUSD', 15, 2000)
+    assert len(bars) == 2000
+    assert bars['close'][0] == 3500 and bars['close'][-1] == 5499
+
+
+def test_short_history_is_not_refetched_every_call():
+    history = History(500)
+    cache = BarCache(history.fetch)
+    assert len(cache.get('EURUSD', 15, 2000)) == 500
+    history.requests.clear()
+    history.total += 1
+    assert len(cache.get('EURUSD', 15, 2000)) == 501
+    assert history.requests == [3]
@@ -0,0 +1,17 @@
+import pytest
+from broker_backend import BrokerBackend
+from broker_simulator import SimulatorBackend
+
+
+def test_incomplete_backend_fails_on_construction():
+    class PartialBackend(BrokerBackend):
+        def initialize(self, **kwargs):
+            return True
+
+    with pytest.raises(TypeError, match="abstract"):
+        PartialBackend()
+
+
+def test_simulator_implements_every_method():
+    assert not SimulatorBackend.__abstractmethods__
+    SimulatorBackend(speed=0)
@@ -0,0 +1,58 @@
+import json
+from economic_calendar import EconomicCalendar
+
+NOW = 1_700_000_000.0
+
+
+def calendar(events):
+    cal = EconomicCalendar(auto_refresh=False)
+    cal.index = cal.build_index(events)
+    return cal
+
+
+def test_window_edges_are_inclusive():
+    cal = calendar([{'date': NOW + 1800, 'currency': 'USD'}])
+    assert cal.is_high_impact_event_now(window_minutes=30, now=NOW)
+    assert cal.is_high_impact_event_now(window_minutes=30, now=NOW + 3600)
+    assert not cal.is_high_impact_event_now(window_minutes=30, now=NOW - 0.5)
+    assert not cal.is_high_impact_event_now(window_minutes=30, now=NOW + 3600.5)
+
+
+def test_lookup_finds_the_nearest_event_among_many():
+    cal = calendar([{'date': NOW + hours * 3600, 'currency': 'EUR'} for hours in (-48, -5, 7, 30)])
+    assert not cal.is_high_impact_event_now(now=NOW)
+    assert cal.is_high_impact_event_now(now=NOW + 7 * 3600 - 1700)
+    assert cal.is_high_impact_event_now(now=NOW - 5 * 3600 + 1700)
+    assert not cal.is_high_impact_event_now(now=NOW + 100 * 3600)
+
+
+def test_currency_filter_and_skipped_events():
+    cal = calendar([
+        {'date': '2023-11-14T22:13:20Z', 'currency': 'usd'},  # NOW as ISO time
+        {'date': NOW, 'currency': 'JPY', 'importance': 0},     # below high impact
+        {'currency': 'GBP'},                                   # no date
+        {'date': 'not a date', 'currency': 'GBP'},
+    ])
+    assert cal.is_high_impact_event_now(['EUR', 'USD'], now=NOW)
+    assert not cal.is_high_impact_event_now(['JPY'], now=NOW)
+    assert not cal.is_high_impact_event_now(['GBP'], now=NOW)
+    assert cal.index['*'] == [NOW]
+
+
+def test_refresh_from_json_and_csv_files(tmp_path):
+    json_file = tmp_path / 'calendar.json'
+    json_file.write_text(json.dumps({'result': [{'date': NOW, 'currency': 'EUR'}]}))
+    cal = EconomicCalendar(source_file=str(json_file), auto_refresh=False)
+    assert cal.refresh()
+    assert cal.is_high_impact_event_now(['EUR'], now=NOW)
+
+    csv_file = tmp_path / 'calendar.csv'
+    csv_file.write_text("date,currency\n2023-11-14T22:13:20+00:00,CHF\n")
+    cal = EconomicCalendar(source_file=str(csv_file), auto_refresh=False)
+    assert cal.refresh()
+    assert cal.is_high_impact_event_now(['CHF'], now=NOW) and not cal.is_high_impact_event_now(['EUR'], now=NOW)
+
+    # A failed refresh keeps the previous index
+    csv_file.unlink()
+    assert not cal.refresh()
+    assert cal.is_high_impact_event_now(['CHF'], now=NOW)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from indicators import Indicators, StreamingSMA, StreamingEMA, StreamingRSI, StreamingATR, StreamingMACD
+
+
+def price_series(n, seed):
+    # Random walk with a flat stretch, an all-gain run and an all-loss run
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 1e-3, n)
+    steps[n // 5:n // 5 + 40] = 0.0
+    steps[n // 2:n // 2 + 30] = np.abs(steps[n // 2:n // 2 + 30]) + 1e-4
+    steps[3 * n // 4:3 * n // 4 + 30] = -np.abs(steps[3 * n // 4:3 * n // 4 + 30]) - 1e-4
+    close = 1.1 + np.cumsum(steps)
+    spread = np.where(steps == 0, 0.0, rng.uniform(0, 5e-4, n))
+    return pd.DataFrame({'high': close + spread, 'low': close - spread, 'close': close})
+
+
+SEEDS = [0, 1, 2]
+N = 2_000
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_streaming_rsi_matches_pandas(seed):
+    df = price_series(N, seed)
+    expected = Indicators.compute_rsi(df['close']).to_numpy()
+    rsi = StreamingRSI()
+    actual = np.array([rsi.update(c) for c in df['close']])
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_streaming_atr_matches_pandas(seed):
+    df = price_series(N, seed)
+    expected = Indicators.compute_atr(df).to_numpy()
+    atr = StreamingATR()
+    actual = np.array([atr.update(h, l, c) for h, l, c in zip(df['high'], df['low'], df['close'])])
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_streaming_macd_matches_pandas(seed):
+    df = price_series(N, seed)
+    macd, signal = Indicators.compute_macd(df['close'])
+    streaming = StreamingMACD()
+    actual = np.array([streaming.update(c) for c in df['close']])
+    np.testing.assert_allclose(actual[:, 0], macd.to_numpy(), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(actual[:, 1], signal.to_numpy(), rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_streaming_sma_and_ema_match_pandas(seed):
+    close = price_series(N, seed)['close']
+    sma, ema = StreamingSMA(21), StreamingEMA(9)
+    actual_sma = np.array([sma.update(c) for c in close])
+    actual_ema = np.array([ema.update(c) for c in close])
+    np.testing.assert_allclose(actual_sma, close.rolling(21).mean().to_numpy(), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(actual_ema, close.ewm(span=9, adjust=False).mean().to_numpy(), rtol=0, atol=1e-12)
+
+
+def test_streaming_sma_does_not_drift_over_long_runs():
+    values = np.random.default_rng(3).normal(1e4, 1.0, 200_000)
+    sma = StreamingSMA(14)
+    for v in values:
+        last = sma.update(v)
+    assert last == pytest.approx(values[-14:].mean(), abs=1e-9)
@@ -0,0 +1,24 @@
+import threading
+from instrumentation import Registry
+
+
+def test_render_while_metrics_are_registered():
+    # Every observe/inc adds a new key; rendering must not iterate a dict that is growing
+    registry = Registry(prefix="test_")
+
+    def register():
+        for i in range(5000):
+            registry.observe('stage_seconds', 0.001, stage='fetch', symbol=f"S{i}")
+            registry.inc('orders_total', symbol=f"S{i}")
+
+    thread = threading.Thread(target=register)
+    thread.start()
+    try:
+        while thread.is_alive():
+            registry.render()
+            registry.summary('stage_seconds', by='stage')
+    finally:
+        thread.join()
+    text = registry.render()
+    assert "# TYPE test_stage_seconds summary" in text
+    assert 'test_orders_total{symbol="S4999"} 1' in text
@@ -0,0 +1,36 @@
+import threading
+from model_cache import ModelCache
+
+
+def test_slow_load_does_not_block_other_keys():
+    started, release = threading.Event(), threading.Event()
+    loaded = []
+
+    def loader(key):
+        if key == 'slow':
+            started.set()
+            release.wait(5)
+        loaded.append(key)
+        return key.upper()
+
+    cache = ModelCache(loader, max_size=2)
+    slow = threading.Thread(target=cache.get, args=('slow',))
+    slow.start()
+    started.wait(5)
+    try:
+        assert cache.get('fast') == 'FAST'
+        assert loaded == ['fast']
+    finally:
+        release.set()
+        slow.join()
+    assert cache.get('slow') == 'SLOW'
+    assert loaded == ['fast', 'slow']
+
+
+def test_evicts_least_recently_used():
+    cache = ModelCache(lambda key: key.upper(), max_size=2)
+    cache.get('a')
+    cache.get('b')
+    cache.get('a')
+    cache.get('c')
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
@@ -0,0 +1,60 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+import m1_model_manager
+from m1_model_manager import MLModelManager
+from feature_engine import FEATURES
+from tree_compiler import CompiledForest
+
+
+class BrokenHistory:
+    def __init__(self):
+        self.calls = 0
+
+    def get_history(self, symbol, timeframe, start=None, end=None, sync=True):
+        self.calls += 1
+        raise ValueError("no history")
+
+
+def drain(manager):
+    manager.training_pool.submit(lambda: None).result()
+
+
+def test_failed_training_backs_off(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    history = BrokenHistory()
+    manager = MLModelManager(history)
+    for _ in range(5):
+        assert manager.models.get('EURUSD') is None
+        drain(manager)
+    assert history.calls == 1
+    assert manager.train_failures['EURUSD'][0] == 1
+
+    # Once the backoff has passed the symbol is tried again, and the next wait doubles
+    monkeypatch.setattr(m1_model_manager, 'TRAIN_RETRY_SECONDS', 0.0)
+    manager.train_failures['EURUSD'] = (1, 0.0)
+    manager.models.get('EURUSD')
+    drain(manager)
+    assert history.calls == 2
+    assert manager.train_failures['EURUSD'][0] == 2
+
+
+def test_compiled_models_live_in_the_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(m1_model_manager, 'COMPILED_INFERENCE', True)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, len(FEATURES)))
+    y = (X[:, 0] > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=5, max_depth=4, random_state=0).fit(X, y)
+    manager = MLModelManager(None)
+    manager.models.max_size = 1
+    manager.store_model('EURUSD', model, {'train_score': 1.0, 'val_score': 1.0})
+    assert isinstance(manager.models.get('EURUSD'), CompiledForest)
+
+    # Evicted and reloaded from disk: still one compiled entry, and it scores like the forest
+    manager.models.put('GBPUSD', model)
+    assert 'EURUSD' not in manager.models
+    results = manager.predict_many({'EURUSD': X[0], 'GBPUSD': X[1]})
+    assert isinstance(manager.models.get('EURUSD'), CompiledForest)
+    assert len(manager.models) == 1
+    assert results['EURUSD']['label'] == model.predict(X[:1])[0]
+    assert np.allclose(list(results['EURUSD']['proba'].values()), model.predict_proba(X[:1])[0])
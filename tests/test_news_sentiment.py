@@ -0,0 +1,81 @@
+import pytest
+import requests
+from news_sentiment import LexiconScorer, NewsSentiment
+from utils import CircuitBreaker, get_breaker
+
+
+class FakeResponse:
+    def __init__(self, headlines):
+        self.headlines = headlines
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'data': [{'headline': headline} for headline in self.headlines]}
+
+
+class FakeSession:
+    def __init__(self, headlines=None):
+        self.headlines = headlines
+        self.calls = 0
+
+    def get(self, url, timeout=None):
+        self.calls += 1
+        if self.headlines is None:
+            raise requests.ConnectionError("news API down")
+        return FakeResponse(self.headlines)
+
+
+@pytest.fixture
+def breaker():
+    breaker = get_breaker('news.fetch_headlines')
+    breaker.state, breaker.failures, breaker.trial_in_flight = CircuitBreaker.CLOSED, 0, False
+    yield breaker
+    breaker.state, breaker.failures, breaker.trial_in_flight = CircuitBreaker.CLOSED, 0, False
+
+
+def sentiment(session, **kwargs):
+    news = NewsSentiment('KEY', scorer=LexiconScorer(), **kwargs)
+    news.session = session
+    return news
+
+
+def test_sentiment_is_cached_for_the_ttl(breaker):
+    session = FakeSession(["Stocks rally on strong growth", "Dollar falls"])
+    news = sentiment(session)
+    first = news.get_news_sentiment('EURUSD')
+    assert first == pytest.approx((0.5 + -0.4) / 2)
+    assert news.get_news_sentiment('EURUSD') == first
+    assert session.calls == 1
+
+
+def test_failed_fetch_is_cached_briefly(breaker):
+    session = FakeSession()
+    news = sentiment(session, error_ttl=60)
+    assert news.get_news_sentiment('EURUSD') == 0
+    assert news.get_news_sentiment('EURUSD') == 0
+    assert session.calls == 1
+
+    news.symbol_cache['EURUSD'] = (0.0, 0)  # error TTL expired
+    session.headlines = ["Good jobs report"]
+    assert news.get_news_sentiment('EURUSD') == pytest.approx(0.7)
+
+
+def test_outage_opens_the_circuit_for_all_symbols(breaker):
+    session = FakeSession()
+    news = sentiment(session)
+    results = news.get_many([f"SYM{i}" for i in range(20)])
+    assert set(results.values()) == {0}
+    assert breaker.state == CircuitBreaker.OPEN
+    # Fetches run on a pool; a few may be in flight as the circuit opens
+    assert breaker.failure_threshold <= session.calls < 20
+
+
+def test_lexicon_negation_and_headline_cache():
+    scorer = LexiconScorer()
+    assert scorer.score("Growth is not strong") == pytest.approx((0.4 - 0.5) / 2)
+    assert scorer.score("Nothing to see") == 0.0
+    news = NewsSentiment('KEY', scorer=scorer, cache_size=2)
+    news.score_headlines(["a rally", "a slump", "a crash"])
+    assert len(news.headline_cache) == 2
@@ -0,0 +1,60 @@
+import numpy as np
+from regime_engine import MIN_BARS, UNKNOWN, RegimeEngine
+
+BAR_DTYPE = [('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8')]
+
+
+class FakeBarCache:
+    def __init__(self):
+        self.bars = {}
+        self.listeners = []
+
+    def set(self, symbol, close):
+        bars = np.zeros(len(close), dtype=BAR_DTYPE)
+        bars['time'] = 1_700_000_000 + np.arange(len(close)) * 900
+        bars['open'] = bars['close'] = close
+        bars['high'] = close + 0.0005
+        bars['low'] = close - 0.0005
+        self.bars[symbol] = bars
+        for listener in self.listeners:
+            listener(symbol, 'M15')
+
+    def peek(self, symbol, timeframe):
+        return self.bars.get(symbol)
+
+
+def ranging_close(n=120):
+    # Noise around a fixed level, fading so the latest ATR is also the lowest
+    return 1.0 + np.random.default_rng(7).standard_normal(n) * np.linspace(0.002, 0.0005, n)
+
+
+def test_trend_range_and_short_history_are_classified():
+    cache = FakeBarCache()
+    engine = RegimeEngine(cache, 'M15', bars=100)
+    cache.set('TREND', 1.0 + np.arange(120) * 0.001)
+    cache.set('RANGE', ranging_close())
+    cache.set('SHORT', 1.0 + np.arange(MIN_BARS) * 0.001)
+
+    trend = engine.get('TREND')
+    assert trend.regime == 'trending'
+    assert trend.adx > 25 and trend.efficiency == 1.0
+    # The forming (last) bar is left out
+    assert trend.bar_time == int(cache.bars['TREND']['time'][-2])
+    assert engine.get('RANGE').regime == 'ranging'
+    assert engine.get('SHORT') is UNKNOWN
+    assert engine.get('OTHER') is UNKNOWN
+
+
+def test_only_dirty_symbols_are_recomputed():
+    cache = FakeBarCache()
+    engine = RegimeEngine(cache, 'M15')
+    cache.set('TREND', 1.0 + np.arange(120) * 0.001)
+    first = engine.get('TREND')
+    assert not engine.dirty
+
+    # Other timeframes are ignored; new bars on ours mark the symbol for the next lookup
+    engine.on_bars('TREND', 'H1')
+    assert engine.get('TREND') is first
+    cache.set('TREND', ranging_close())
+    assert engine.dirty == {'TREND'}
+    assert engine.get('TREND').regime == 'ranging'
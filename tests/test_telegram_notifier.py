@@ -0,0 +1,50 @@
+import os
+import sys
+import json
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_telegram import FakeTelegram
+from telegram_notifier import TelegramNotifier
+
+
+def test_sender_survives_malformed_spool_lines(tmp_path):
+    spool = tmp_path / 'spool.jsonl'
+    spool.write_text(json.dumps({'chat_id': 1, 'text': 'first'}) + "\n"
+                     + '{"chat_id": 1, "te\n'  # torn write
+                     + json.dumps({'chat_id': 1}) + "\n"
+                     + json.dumps({'chat_id': 1, 'text': 'second'}) + "\n")
+    fake = FakeTelegram().start()
+    try:
+        notifier = TelegramNotifier('TOKEN', 1, overflow='persist', spool_file=str(spool),
+                                    coalesce_seconds=0, api_url=fake.url)
+        message = fake.wait_for_message(lambda m: 'second' in m['text'], timeout=5)
+        assert message is not None and 'first' in message['text']
+        assert notifier.stats['dropped'] == 2
+        assert not spool.exists()
+
+        notifier.send_message('after', coalesce=False)
+        assert fake.wait_for_message(lambda m: m['text'] == 'after', timeout=5) is not None
+        assert notifier.sender_thread.is_alive()
+    finally:
+        fake.stop()
+
+
+def test_closeall_is_ignored_from_other_chats():
+    closed = []
+    executor = SimpleNamespace(close_all=lambda chat_id=None: closed.append(chat_id) or [])
+    bot = SimpleNamespace(executor=executor, trading_enabled=True)
+    fake = FakeTelegram().start()
+    try:
+        notifier = TelegramNotifier('TOKEN', 1, bot, coalesce_seconds=0, api_url=fake.url)
+        fake.push('/closeall', chat_id=666)
+        fake.push('/pause', chat_id=666)
+        fake.push('/closeall', chat_id=1)
+        assert fake.wait_for_message(lambda m: m['text'] == 'No open positions', timeout=5) is not None
+        notifier.command_pool.shutdown(wait=True)
+        assert closed == [1]
+        assert bot.trading_enabled
+        assert not any(m['chat_id'] == '666' for m in fake.messages)
+    finally:
+        fake.stop()
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from tick_stream import TickStream
+
+RAW_DTYPE = [('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'),
+             ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8')]
+
+
+class Terminal:
+    # copy_ticks_from stand-in: every tick at or after date_from (whole seconds)
+    def __init__(self):
+        self.ticks = np.zeros(0, dtype=RAW_DTYPE)
+
+    def add(self, time_msc, bid):
+        tick = np.zeros(1, dtype=RAW_DTYPE)
+        tick['time_msc'], tick['time'] = time_msc, time_msc // 1000
+        tick['bid'], tick['ask'] = bid, bid + 0.0002
+        self.ticks = np.concatenate([self.ticks, tick])
+
+    def fetch(self, symbol, date_from, count):
+        first = int(np.searchsorted(self.ticks['time_msc'], date_from * 1000, side='left'))
+        return self.ticks[first:first + count]
+
+
+def test_incremental_updates_keep_every_tick_once():
+    terminal = Terminal()
+    stream = TickStream(terminal.fetch, clock=lambda symbol: 1_700_000_000, fast=2, slow=3)
+    bids = iter(np.arange(1.1000, 1.2, 0.0001))
+    # Two ticks share 1_700_000_000_500; the second lands only after the first update
+    for msc in (1_699_999_999_900, 1_700_000_000_100, 1_700_000_000_500):
+        terminal.add(msc, next(bids))
+    stream.update('EURUSD')
+    for msc in (1_700_000_000_500, 1_700_000_000_500, 1_700_000_001_200):
+        terminal.add(msc, next(bids))
+    stream.update('EURUSD')
+    stream.update('EURUSD')  # nothing new
+
+    ticks = stream.ticks('EURUSD')
+    assert ticks['time_msc'].tolist() == terminal.ticks['time_msc'].tolist()
+    assert ticks['bid'].tolist() == terminal.ticks['bid'].tolist()
+
+    stats = stream.stats('EURUSD')
+    mids = terminal.ticks['bid'] + 0.0001
+    assert stats.ticks == 6
+    assert stats.price == pytest.approx(mids[-1])
+    assert stats.ma_fast == pytest.approx(mids[-2:].mean())
+    assert stats.ma_slow == pytest.approx(mids[-3:].mean())
+    assert stats.efficiency == pytest.approx(1.0)
+    assert stats.spread == pytest.approx(0.0002)
+
+
+def test_ring_keeps_the_newest_ticks():
+    terminal = Terminal()
+    stream = TickStream(terminal.fetch, clock=lambda symbol: 1_700_000_000, capacity=4, fast=2, slow=3)
+    for i in range(10):
+        terminal.add(1_700_000_000_000 + i * 10, 1.1 + i * 1e-4)
+        stream.update('EURUSD')
+    assert stream.ticks('EURUSD')['time_msc'].tolist() == [1_700_000_000_000 + i * 10 for i in range(6, 10)]
+    assert stream.stats('EURUSD').ticks == 4
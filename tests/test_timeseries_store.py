@@ -0,0 +1,26 @@
+from timeseries_store import EquityCurve
+
+
+def test_exclusive_paging_visits_each_point_once():
+    curve = EquityCurve(raw_capacity=8)
+    for i in range(20):
+        curve.append(1_700_000_000 + i, 10_000.0 + i)
+    expected = curve.points('raw', None, 100)
+    for limit in (1, 3, 8):
+        # Page the way /data's next_after cursor does, starting before the oldest point
+        seen, after = [], expected[0][0] - 1
+        for _ in range(len(expected) + 1):
+            points = curve.points('raw', after, limit, inclusive=False)
+            if not points:
+                break
+            seen.extend(points)
+            after = points[-1][0]
+        assert seen == expected
+
+
+def test_inclusive_since_resends_the_open_bucket():
+    curve = EquityCurve()
+    curve.append(1_700_000_000, 100.0)
+    first = curve.points('1m', None, 10)
+    curve.append(1_700_000_010, 105.0)
+    assert curve.points('1m', first[-1][0], 10) == [[first[-1][0], 105.0]]
@@ -0,0 +1,20 @@
+from broker_simulator import SimulatorBackend
+from mt5_manager import MT5Manager
+from economic_calendar import EconomicCalendar
+from trade_executor import TradeExecutor
+
+
+def test_batch_reports_failed_intents_and_sends_the_rest():
+    manager = MT5Manager(0, '', '', backend=SimulatorBackend(speed=0, history_bars=500))
+    executor = TradeExecutor(manager, None, EconomicCalendar(auto_refresh=False))
+    tick = manager.get_symbol_tick('EURUSD')
+    point = manager.get_symbol_spec('EURUSD').point
+    intents = [
+        {'symbol': 'GBPUSD', 'direction': 'BUY', 'price': 1.0, 'error': "get_symbol_spec: circuit open"},
+        {'symbol': 'EURUSD', 'direction': 'BUY', 'price': tick.ask, 'sl': tick.ask - 300 * point,
+         'tp': tick.ask + 600 * point},
+    ]
+    reports = executor.submit_batch(intents, notify=False)
+    assert [r['status'] for r in reports] == ['rejected', 'filled']
+    assert reports[0]['error'] == "get_symbol_spec: circuit open"
+    assert len(manager.positions_get()) == 1
@@ -0,0 +1,58 @@
+from collections import namedtuple
+import mt5_constants as mt5
+from trade_logger import TradeLogger
+
+Account = namedtuple('Account', ['balance'])
+Deal = namedtuple('Deal', ['ticket', 'time', 'type', 'profit', 'symbol'])
+
+
+class FakeManager:
+    def __init__(self, deals):
+        self.deals = deals
+
+    def get_account_info(self):
+        return Account(10_000.0)
+
+    def history_deals_get(self, from_time, to_time, symbol=None):
+        return self.deals
+
+
+def test_logs_buy_and_sell_deals_only(tmp_path):
+    balance_deal = 2  # DEAL_TYPE_BALANCE
+    manager = FakeManager([Deal(1, 1_700_000_000, mt5.DEAL_TYPE_BUY, 10.0, 'EURUSD'),
+                           Deal(2, 1_700_000_001, mt5.DEAL_TYPE_SELL, -5.0, 'EURUSD'),
+                           Deal(3, 1_700_000_002, balance_deal, 1000.0, '')])
+    trade_logger = TradeLogger(manager, log_dir=str(tmp_path), legacy_log_file=None)
+    trade_logger.log_closed_trades()
+    assert trade_logger.store.read()['ticket'].tolist() == [1, 2]
+
+
+def test_metrics_count_closed_trades_at_net_profit(tmp_path):
+    # One round trip: the entry deal carries only commission, the exit deal the P&L
+    deal = namedtuple('Deal', ['ticket', 'time', 'type', 'entry', 'position_id', 'profit', 'commission', 'swap',
+                               'fee', 'symbol'])
+    manager = FakeManager([
+        deal(1, 1_700_000_000, mt5.DEAL_TYPE_BUY, mt5.DEAL_ENTRY_IN, 7, 0.0, -1.0, 0.0, 0.0, 'EURUSD'),
+        deal(2, 1_700_000_100, mt5.DEAL_TYPE_SELL, mt5.DEAL_ENTRY_OUT, 7, 10.0, -1.0, -0.5, 0.0, 'EURUSD'),
+    ])
+    trade_logger = TradeLogger(manager, log_dir=str(tmp_path), legacy_log_file=None)
+    trade_logger.log_closed_trades()
+    metrics = trade_logger.calculate_performance_metrics()
+    assert metrics['trades'] == 1
+    assert metrics['win_rate'] == 100.0
+    assert metrics['net_profit'] == 7.5
+    assert metrics['avg_loss'] is None
+
+    # Replayed from the store on restart, with the same result
+    assert TradeLogger(manager, log_dir=str(tmp_path), legacy_log_file=None).calculate_performance_metrics() == metrics
+
+
+def test_legacy_csv_is_imported_with_epoch_seconds(tmp_path):
+    legacy = tmp_path / 'trade_history.csv'
+    legacy.write_text("ticket,time,type,profit,symbol\n"
+                      "1,2023-11-14 22:13:20,0,10.0,EURUSD\n"
+                      "2,2023-11-14 22:15:00,1,-5.0,GBPUSD\n")
+    trade_logger = TradeLogger(FakeManager([]), log_dir=str(tmp_path / 'store'), legacy_log_file=str(legacy))
+    stored = trade_logger.store.read()
+    assert stored['ticket'].tolist() == [1, 2]
+    assert stored['time'].tolist() == [1_700_000_000, 1_700_000_100]
@@ -0,0 +1,87 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from trade_store import TradeStore, records_from_rows
+
+
+def deals(*tickets):
+    return records_from_rows([{'ticket': t, 'time': 1_700_000_000 + t, 'profit': float(t), 'symbol': 'EURUSD'}
+                              for t in tickets])
+
+
+def test_append_skips_known_tickets(tmp_path):
+    store = TradeStore(str(tmp_path))
+    assert len(store.append(deals(1, 2))) == 2
+    assert store.append(deals(2, 3))['ticket'].tolist() == [3]
+    assert TradeStore(str(tmp_path)).read()['ticket'].tolist() == [1, 2, 3]
+
+
+def test_recovers_from_stale_state_after_interrupted_append(tmp_path):
+    # Crash between writing a segment and saving state.json: the older state must not make
+    # the next append reuse (and overwrite) the newest segment
+    store = TradeStore(str(tmp_path))
+    store.append(deals(1, 2))
+    shutil.copy(store.state_file, tmp_path / 'state.old')
+    store.append(deals(3))
+    os.replace(tmp_path / 'state.old', store.state_file)
+
+    reopened = TradeStore(str(tmp_path))
+    reopened.append(deals(4))
+    assert reopened.read()['ticket'].tolist() == [1, 2, 3, 4]
+    assert len(reopened) == 4
+
+
+def test_recovers_when_index_missed_the_last_segment(tmp_path):
+    store = TradeStore(str(tmp_path))
+    store.append(deals(1, 2))
+    state = open(store.state_file).read()
+    index = np.fromfile(store.index_file, dtype='<i8')
+    store.append(deals(3))
+    # Segment 1 landed, neither the index nor the state caught up
+    index.tofile(store.index_file)
+    open(store.state_file, 'w').write(state)
+
+    reopened = TradeStore(str(tmp_path))
+    assert len(reopened.append(deals(3))) == 0
+    reopened.append(deals(4))
+    assert reopened.read()['ticket'].tolist() == [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize('crash_at', ['replace', 'remove'])
+def test_interrupted_compaction_is_finished_on_load(tmp_path, monkeypatch, crash_at):
+    # Crash before the merged file replaced the newest segment, or before the old ones were removed
+    store = TradeStore(str(tmp_path))
+    for ticket in (1, 2, 3):
+        store.append(deals(ticket))
+
+    real = getattr(os, crash_at)
+
+    def crash(path, *args):
+        # state.json is still written; only the merged segment's rename or the removals fail
+        if str(path).endswith('.json.tmp'):
+            return real(path, *args)
+        raise OSError("killed")
+
+    monkeypatch.setattr(os, crash_at, crash)
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.undo()
+
+    reopened = TradeStore(str(tmp_path))
+    assert reopened.read()['ticket'].tolist() == [1, 2, 3]
+    assert len(reopened) == 3
+    assert len(reopened.segments()) == 1
+    assert not any(name.endswith('.compact') for name in os.listdir(tmp_path))
+    reopened.append(deals(4))
+    assert TradeStore(str(tmp_path)).read()['ticket'].tolist() == [1, 2, 3, 4]
+
+
+def test_merged_file_from_an_unrecorded_compaction_is_discarded(tmp_path):
+    store = TradeStore(str(tmp_path))
+    store.append(deals(1))
+    store.append(deals(2))
+    open(store.segments()[-1] + '.compact', 'wb').close()
+    reopened = TradeStore(str(tmp_path))
+    assert reopened.read()['ticket'].tolist() == [1, 2]
+    assert not any(name.endswith('.compact') for name in os.listdir(tmp_path))
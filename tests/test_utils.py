@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+from utils import CircuitBreaker, CircuitOpenError, RetryError, get_breaker, retry
+
+
+def test_breaker_opens_after_threshold_and_recovers_through_half_open():
+    breaker = CircuitBreaker('test.transitions', failure_threshold=2, reset_timeout=60)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # Reset timeout passed: one trial at a time
+    breaker.opened_at -= 60
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # A failed trial re-opens straight away, a successful one closes
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    breaker.opened_at -= 60
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+    breaker.before_call()
+
+
+def test_retry_gives_up_with_the_last_error_as_cause():
+    calls = []
+
+    @retry(max_retries=3, delay=0, endpoint='test.gives_up', breaker=False)
+    def flaky():
+        calls.append(1)
+        raise OSError(f"attempt {len(calls)}")
+
+    with pytest.raises(RetryError) as excinfo:
+        flaky()
+    assert len(calls) == 3
+    assert excinfo.value.attempts == 3
+    assert str(excinfo.value.__cause__) == "attempt 3"
+
+
+def test_retry_stops_once_the_circuit_opens():
+    calls = []
+
+    @retry(max_retries=5, delay=0, endpoint='test.opens')
+    def down():
+        calls.append(1)
+        raise OSError("down")
+
+    breaker = get_breaker('test.opens')
+    breaker.failure_threshold = 2
+    with pytest.raises(RetryError):
+        down()
+    assert len(calls) == 2
+    with pytest.raises(CircuitOpenError):
+        down()
+    assert len(calls) == 2
+
+
+def test_half_open_trial_is_released_by_errors_outside_retry_on():
+    outcomes = [ValueError("bad input"), 'ok']
+
+    @retry(max_retries=1, delay=0, endpoint='test.trial', retry_on=(OSError,))
+    def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    breaker = get_breaker('test.trial')
+    breaker.state, breaker.opened_at = CircuitBreaker.OPEN, 0.0
+    with pytest.raises(ValueError):
+        call()
+    assert not breaker.trial_in_flight
+    assert call() == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_async_trial_is_released():
+    @retry(max_retries=1, delay=0, endpoint='test.cancelled')
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def run():
+        task = asyncio.ensure_future(slow())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    breaker = get_breaker('test.cancelled')
+    breaker.state, breaker.opened_at = CircuitBreaker.OPEN, 0.0
+    asyncio.run(run())
+    assert not breaker.trial_in_flight
+
+
+def test_sync_retry_on_the_event_loop_makes_one_attempt():
+    calls = []
+
+    @retry(max_retries=3, delay=0, endpoint='test.on_loop', breaker=False)
+    def blocking():
+        calls.append(1)
+        raise OSError("down")
+
+    async def run():
+        with pytest.raises(RetryError):
+            blocking()
+
+    asyncio.run(run())
+    assert len(calls) == 1